@@ -0,0 +1,12 @@
+"""
+Бенчмарки сценариев бота на фейковых Telegram API, GAS и Яндекс Музыке.
+
+    python -m benchmarks.run                  # прогон и отчёт
+    python -m benchmarks.run --save-baseline  # записать benchmarks/baseline.json
+    python -m benchmarks.run --compare        # сравнить с baseline.json, код 1 при регрессии
+
+Хендлеры логируют как обычно (в stderr) — отчёт идёт в stdout: `2>/dev/null`, чтобы видеть только его.
+Задержки фейков — --telegram-latency/--gas-latency/--yandex-latency, мс.
+
+    python -m benchmarks.load                 # нагрузка через настоящий polling и фейковый Bot API по HTTP
+"""
@@ -0,0 +1,95 @@
+import json
+import threading
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict
+from urllib.parse import parse_qsl, urlsplit
+
+from benchmarks.fakes import FakeTelegramApi
+
+
+def _form_params(content_type: str, body: bytes) -> Dict[str, Any]:
+    """
+    Параметры из тела запроса: TeleBot шлёт их в query string,
+    AsyncTeleBot — формой (urlencoded или multipart), кто-то — JSON.
+    """
+    if not body:
+        return {}
+    if content_type.startswith("application/json"):
+        return json.loads(body)
+    if content_type.startswith("application/x-www-form-urlencoded"):
+        return dict(parse_qsl(body.decode("utf-8"), keep_blank_values=True))
+    if content_type.startswith("multipart/form-data"):
+        message = BytesParser(policy=HTTP).parsebytes(
+            f"Content-Type: {content_type}\r\n\r\n".encode("utf-8") + body
+        )
+        return {
+            part.get_param("name", header="content-disposition"): part.get_content()
+            for part in message.iter_parts()
+        }
+    return {}
+
+
+class _BotApiHandler(BaseHTTPRequestHandler):
+    # keep-alive, как у api.telegram.org: requests.Session переиспользует соединения
+    protocol_version = "HTTP/1.1"
+    # заголовки и тело уходят разными send(): без TCP_NODELAY каждый ответ ждёт delayed ACK (~40 мс)
+    disable_nagle_algorithm = True
+
+    server: "FakeBotApiServer"
+
+    def _handle(self) -> None:
+        url = urlsplit(self.path)
+        # /bot<token>/<method>
+        parts = url.path.strip("/").split("/")
+        if len(parts) != 2 or not parts[0].startswith("bot"):
+            self._reply(404, {"ok": False, "error_code": 404, "description": "Not Found"})
+            return
+
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        params = dict(parse_qsl(url.query, keep_blank_values=True))
+        params.update(_form_params(self.headers.get("Content-Type", ""), body))
+
+        response = self.server.api(self.command.lower(), parts[1], params=params)
+        self._reply(response.status_code, response.json())
+
+    def _reply(self, status: int, data: Dict[str, Any]) -> None:
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = _handle
+    do_POST = _handle
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+class FakeBotApiServer(ThreadingHTTPServer):
+    """
+    FakeTelegramApi по HTTP: бот ходит сюда через telegram.api_url, как в настоящий Bot API.
+    Каждый запрос (в том числе долгий getUpdates) обслуживается в своём потоке.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, api: FakeTelegramApi, host: str = "127.0.0.1", port: int = 0) -> None:
+        """
+        :param api: состояние Bot API: сообщения, очередь апдейтов, ожидания
+        :param port: 0 — любой свободный
+        """
+        super().__init__((host, port), _BotApiHandler)
+        self.api = api
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> None:
+        threading.Thread(target=self.serve_forever, name="fake-bot-api", daemon=True).start()
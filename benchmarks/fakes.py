@@ -0,0 +1,259 @@
+import itertools
+import json
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional
+
+
+BOT_USER = {"id": 123456, "is_bot": True, "first_name": "bench_bot", "username": "bench_bot"}
+
+
+class _Response:
+    """То, что telebot.apihelper ждёт от requests.Response"""
+
+    def __init__(self, result: Any = None, *, status_code: int = 200, description: str = "", retry_after: int = 0) -> None:
+        self.status_code = status_code
+        if status_code == 200:
+            self._data = {"ok": True, "result": result}
+        else:
+            self._data = {"ok": False, "error_code": status_code, "description": description}
+            if retry_after:
+                self._data["parameters"] = {"retry_after": retry_after}
+        self.text = json.dumps(self._data, ensure_ascii=False)
+
+    def json(self) -> Dict[str, Any]:
+        return self._data
+
+
+class _ApiError(Exception):
+    def __init__(self, status_code: int, description: str) -> None:
+        super().__init__(description)
+        self.response = _Response(status_code=status_code, description=description)
+
+
+# методы, на которых не имитируются сбои: без них бот не запустится или не получит апдейты
+NO_FAULTS = frozenset({"getMe", "getUpdates", "setMyCommands", "deleteWebhook"})
+
+
+class FakeTelegramApi:
+    """
+    Bot API в памяти процесса: подключается через telebot.apihelper.CUSTOM_REQUEST_SENDER.
+    Помнит отправленные сообщения, чтобы сценарий мог нажимать кнопки настоящих клавиатур.
+    """
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0, flood_rate: float = 0.0, seed: Optional[int] = None) -> None:
+        """
+        :param latency: задержка каждого запроса, сек
+        :param error_rate: доля запросов, на которые отвечать 500
+        :param flood_rate: доля запросов, на которые отвечать 429 с retry_after=1
+        :param seed: seed для выбора запросов со сбоем
+        """
+        self.latency = latency
+        self.error_rate = error_rate
+        self.flood_rate = flood_rate
+        self.calls: Counter[str] = Counter()
+        self.errors: Counter[str] = Counter()
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+        self._ids = itertools.count(1_000_000)
+        self._messages: Dict[tuple[int, int], Dict[str, Any]] = {}
+        self._last: Dict[int, Dict[str, Any]] = {}
+        self._expectations: List[tuple[str, Callable[[dict, Any], bool], Future]] = []
+        # очередь getUpdates: апдейты живут, пока бот не подтвердит их offset'ом
+        self._updates: List[Dict[str, Any]] = []
+        self._updates_cond = threading.Condition()
+        self._update_ids = itertools.count(1)
+
+    def __call__(self, method: str, url: str, params: Optional[dict] = None, **kwargs) -> _Response:
+        name = url.rsplit("/", 1)[-1]
+        params = params or {}
+        if name == "getUpdates":
+            with self._lock:
+                self.calls[name] += 1
+            return _Response(self._get_updates(params))
+
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.calls[name] += 1
+            fault = self._fault(name)
+            if fault:
+                self.errors[f"{name}:{fault.status_code}"] += 1
+                return fault
+            handler = getattr(self, f"_{name}", None)
+            try:
+                result = handler(params) if handler else True
+            except _ApiError as e:
+                self.errors[f"{name}:{e.response.status_code}"] += 1
+                return e.response
+            self._fulfil(name, params, result)
+            return _Response(result)
+
+    def _fault(self, name: str) -> Optional[_Response]:
+        if name in NO_FAULTS:
+            return None
+        roll = self._random.random()
+        if roll < self.flood_rate:
+            return _Response(status_code=429, description="Too Many Requests: retry after 1", retry_after=1)
+        if roll < self.flood_rate + self.error_rate:
+            return _Response(status_code=500, description="Internal Server Error")
+        return None
+
+    def push_update(self, update: Dict[str, Any]) -> int:
+        """
+        Поставить апдейт в очередь getUpdates.
+
+        :param update: апдейт без update_id
+        :return: присвоенный update_id
+        """
+        with self._updates_cond:
+            update["update_id"] = next(self._update_ids)
+            self._updates.append(update)
+            self._updates_cond.notify_all()
+        return update["update_id"]
+
+    def _get_updates(self, params: dict) -> List[Dict[str, Any]]:
+        offset = int(params.get("offset") or 0)
+        limit = int(params.get("limit") or 100)
+        deadline = time.monotonic() + float(params.get("timeout") or 0)
+        with self._updates_cond:
+            if offset < 0:
+                # skip_pending: бот просит последние -offset апдейтов, чтобы подтвердить всё до них
+                return self._updates[offset:]
+            self._updates = [u for u in self._updates if u["update_id"] >= offset]
+            while not self._updates:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._updates_cond.wait(remaining)
+            return self._updates[:limit]
+
+    def expect(self, method: str, match: Callable[[dict, Any], bool]) -> Future:
+        """
+        Дождаться ответа бота: future завершится (perf_counter, result) первого вызова method,
+        для которого match(params, result) истинно. Регистрировать до отправки апдейта.
+        """
+        future: Future = Future()
+        with self._lock:
+            self._expectations.append((method, match, future))
+        return future
+
+    def forget(self, future: Future) -> None:
+        """Снять ожидание, которое не дождались"""
+        with self._lock:
+            self._expectations = [e for e in self._expectations if e[2] is not future]
+
+    def _fulfil(self, name: str, params: dict, result: Any) -> None:
+        for item in self._expectations:
+            method, match, future = item
+            if method == name and match(params, result):
+                self._expectations.remove(item)
+                future.set_result((time.perf_counter(), result))
+                return
+
+    def last_message(self, chat_id: int) -> Dict[str, Any]:
+        with self._lock:
+            return self._last[chat_id]
+
+    def _store(self, message: Dict[str, Any], edited: bool = False) -> Dict[str, Any]:
+        chat_id = message["chat"]["id"]
+        self._messages[(chat_id, message["message_id"])] = message
+        # запоздавшая правка старой клавиатуры не должна подменять последнее сообщение
+        last = self._last.get(chat_id)
+        if not edited or last is None or last["message_id"] == message["message_id"]:
+            self._last[chat_id] = message
+        return message
+
+    def _getMe(self, params: dict) -> Dict[str, Any]:
+        return BOT_USER
+
+    def _sendMessage(self, params: dict) -> Dict[str, Any]:
+        chat_id = int(params["chat_id"])
+        message = {
+            "message_id": next(self._ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private" if chat_id > 0 else "supergroup"},
+            "from": BOT_USER,
+            "text": params.get("text", ""),
+        }
+        if params.get("reply_markup"):
+            message["reply_markup"] = json.loads(params["reply_markup"])
+        return self._store(message)
+
+    def _edit(self, params: dict) -> Dict[str, Any]:
+        key = (int(params["chat_id"]), int(params["message_id"]))
+        old = self._messages.get(key) or {
+            "message_id": key[1],
+            "date": int(time.time()),
+            "chat": {"id": key[0], "type": "private"},
+            "from": BOT_USER,
+            "text": "",
+        }
+        message = dict(old)
+        if "text" in params:
+            message["text"] = params["text"]
+        if params.get("reply_markup"):
+            message["reply_markup"] = json.loads(params["reply_markup"])
+        if message == old and key in self._messages:
+            # как настоящий Bot API: правка без изменений — ошибка
+            raise _ApiError(400, "Bad Request: message is not modified: specified new message content "
+                                 "and reply markup are exactly the same as a current content and reply markup of the message")
+        return self._store(message, edited=True)
+
+    _editMessageText = _edit
+    _editMessageReplyMarkup = _edit
+
+
+class FakeGasClient:
+    """GasClient без сети: тот же интерфейс, ответы ok, задержка на каждый запрос."""
+
+    def __init__(self, latency: float = 0.0) -> None:
+        self.latency = latency
+        self.calls: Counter[str] = Counter()
+        self._lock = threading.Lock()
+
+    def post(self, payload: Dict[str, Any], timeout: Optional[float] = None) -> Dict[str, Any]:
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.calls[payload.get("action", "")] += 1
+        if payload.get("action") == "batch":
+            return {"ok": True, "results": [{"ok": True} for _ in payload.get("ops") or []]}
+        return {"ok": True}
+
+    def exists(self, *, user: str, msg_id: int, timeout: Optional[float] = None) -> bool:
+        return bool(self.post({"action": "exists"}).get("ok"))
+
+    def list_ids(self, *, user: str, timeout: Optional[float] = None) -> Optional[List[int]]:
+        self.post({"action": "list_ids"})
+        return []
+
+    def upsert_note(self, *, user: str, timeout: Optional[float] = None, **kwargs) -> Dict[str, Any]:
+        return self.post({"action": "upsert_note"})
+
+    def add_tracks(self, *, user: str, msg_id: int, items: List[dict], timeout: Optional[float] = None) -> Dict[str, Any]:
+        return self.post({"action": "add_track"})
+
+    def batch(self, *, user: str, ops: List[dict], timeout: Optional[float] = None) -> Dict[str, Any]:
+        return self.post({"action": "batch", "ops": ops})
+
+
+class FakeYandexClient:
+    """yandex_music.Client.tracks() без сети: трек id -> "Artist {id}" - "Track {id}"."""
+
+    def __init__(self, latency: float = 0.0) -> None:
+        self.latency = latency
+        self.calls = 0
+
+    def tracks(self, track_ids: List[int]) -> List[SimpleNamespace]:
+        if self.latency:
+            time.sleep(self.latency)
+        self.calls += 1
+        return [
+            SimpleNamespace(id=track_id, title=f"Track {track_id}", artists=[SimpleNamespace(name=f"Artist {track_id}")])
+            for track_id in track_ids
+        ]
@@ -0,0 +1,104 @@
+"""
+Отчёт по времени импорта: что тормозит старт бота (и каждый перезапуск после падения).
+
+    python -m benchmarks.importtime                                  # src.infra.telegram
+    python -m benchmarks.importtime src.infra.telegram.aio --top 30
+    python -m benchmarks.importtime --forbid yandex_music,aiohttp     # код 1, если они грузятся при старте
+
+По умолчанию запрещены pydantic и yaml: конфиг читается при первом обращении, а не при импорте.
+
+Под капотом — `python -X importtime -c "import <module>"` в отдельном процессе, несколько прогонов, берётся медиана.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+
+ROOT = Path(__file__).parent.parent
+
+# импорт бота не должен читать конфиг (_LazyConfig): без config.yaml он не падает
+DEFAULT_FORBID = "pydantic,yaml"
+
+
+def _parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Время импорта модулей бота")
+    parser.add_argument("modules", nargs="*", default=["src.infra.telegram"], help="Что импортировать")
+    parser.add_argument("--runs", type=int, default=5, help="Сколько прогонов; в отчёте медиана")
+    parser.add_argument("--top", type=int, default=20, help="Сколько самых медленных модулей показать")
+    parser.add_argument(
+        "--forbid", default=DEFAULT_FORBID,
+        help=f"Пакеты через запятую, которые не должны импортироваться (по умолчанию {DEFAULT_FORBID})",
+    )
+    return parser.parse_args(argv)
+
+
+def measure(module: str) -> List[Tuple[str, int, int]]:
+    """
+    :return: [(модуль, собственное время мкс, с вложенными мкс)] в порядке импорта
+    """
+    env = dict(os.environ, PYTHONPATH=str(ROOT))
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    if proc.returncode:
+        raise SystemExit(f"import {module} failed:\n{proc.stderr[-2000:]}")
+
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def report(module: str, runs: int, top: int) -> set[str]:
+    """
+    :return: импортированные модули
+    """
+    totals: List[int] = []
+    self_times: Dict[str, List[int]] = defaultdict(list)
+    for _ in range(runs):
+        rows = measure(module)
+        totals.append(sum(self_us for _, self_us, _ in rows))
+        for name, self_us, _ in rows:
+            self_times[name].append(self_us)
+
+    median = {name: statistics.median(values) for name, values in self_times.items()}
+    packages: Dict[str, float] = defaultdict(float)
+    for name, value in median.items():
+        packages[name.split(".")[0]] += value
+
+    print(f"import {module}: {statistics.median(totals) / 1000:.1f} ms (median of {runs}), {len(median)} modules")
+    print(f"\n{'package':<30}{'ms':>10}")
+    for name, value in sorted(packages.items(), key=lambda kv: -kv[1])[:top]:
+        print(f"{name:<30}{value / 1000:>10.1f}")
+    print(f"\n{'module (self time)':<50}{'ms':>10}")
+    for name, value in sorted(median.items(), key=lambda kv: -kv[1])[:top]:
+        print(f"{name:<50}{value / 1000:>10.1f}")
+    print()
+    return set(median)
+
+
+def main(argv: List[str] | None = None) -> int:
+    args = _parse_args(sys.argv[1:] if argv is None else argv)
+    forbidden = [p for p in args.forbid.split(",") if p]
+
+    failed = False
+    for module in args.modules:
+        imported = report(module, args.runs, args.top)
+        leaked = sorted({name.split(".")[0] for name in imported} & set(forbidden))
+        if leaked:
+            print(f"FORBIDDEN import {module} loads: {', '.join(leaked)}")
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
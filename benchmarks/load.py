@@ -0,0 +1,404 @@
+"""
+Нагрузочный прогон через настоящий polling: бот из src.infra.telegram.main() ходит по HTTP
+в локальный фейковый Bot API, генератор кладёт в getUpdates апдейты многих чатов
+(записи целиком и reply с плейлистом) с заданной частотой и меряет, когда бот ответил.
+
+    python -m benchmarks.load --notes 500 --rate 20
+    python -m benchmarks.load --save-trace trace.jsonl   # записать сгенерированный поток
+    python -m benchmarks.load --trace trace.jsonl        # повторить его
+    python -m benchmarks.load --external --port 8081     # бот запущен отдельно с telegram.api_url: http://127.0.0.1:8081
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+
+HERE = Path(__file__).parent
+
+USER_FOLDER = "load_user"
+EMOTIONS = [f"Эмоция {i}" for i in range(40)]
+TAGS = [f"Тег {i}" for i in range(30)]
+FIRST_CHAT = 10_000
+
+STEPS = ["text", "emotion", "done_emotions", "tag", "done_tags", "reply"]
+
+
+@dataclass
+class NotePlan:
+    """Одна запись в потоке: когда начать, в каком чате, что нажать"""
+    at: float
+    chat_id: int
+    emotions: List[int] = field(default_factory=list)
+    tags: List[int] = field(default_factory=list)
+    links: int = 0
+
+
+class StepTimeout(Exception):
+    pass
+
+
+def _parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Нагрузочный прогон бота через фейковый Bot API")
+    parser.add_argument("--notes", type=int, default=500, help="Сколько записей сгенерировать")
+    parser.add_argument("--rate", type=float, default=20, help="Новых записей в секунду (пуассоновский поток); 0 — все сразу")
+    parser.add_argument("--chats", type=int, default=200, help="Сколько разных чатов; в одном чате записи идут по очереди")
+    parser.add_argument("--concurrency", type=int, default=100, help="Сколько записей вести одновременно")
+    parser.add_argument("--toggles", type=int, default=3, help="Сколько эмоций и тегов выбирать в каждой записи")
+    parser.add_argument("--reply-share", type=float, default=0.5, help="Доля записей, к которым потом приходит reply со ссылками")
+    parser.add_argument("--think", type=float, default=100, help="Пауза пользователя между шагами, мс")
+    parser.add_argument("--timeout", type=float, default=15, help="Сколько ждать ответа бота на шаг, сек")
+    parser.add_argument("--seed", type=int, default=1, help="Seed генератора потока и сбоев")
+    parser.add_argument("--trace", type=Path, help="Повторить поток из JSONL вместо генерации")
+    parser.add_argument("--save-trace", type=Path, help="Записать поток в JSONL")
+    parser.add_argument("--speed", type=float, default=1.0, help="Ускорение при повторе --trace")
+    parser.add_argument("--host", default="127.0.0.1", help="Адрес фейкового Bot API")
+    parser.add_argument("--port", type=int, default=0, help="Порт фейкового Bot API; 0 — любой свободный")
+    parser.add_argument("--external", action="store_true", help="Не запускать бота в этом процессе, ждать внешнего")
+    parser.add_argument("--telegram-latency", type=float, default=0, help="Задержка ответа Bot API, мс")
+    parser.add_argument("--gas-latency", type=float, default=0, help="Задержка запроса к GAS, мс")
+    parser.add_argument("--yandex-latency", type=float, default=0, help="Задержка запроса к Яндекс Музыке, мс")
+    parser.add_argument("--error-rate", type=float, default=0, help="Доля ответов Bot API с 500")
+    parser.add_argument("--flood-rate", type=float, default=0, help="Доля ответов Bot API с 429 retry_after=1")
+    parser.add_argument("--json", type=Path, help="Записать результат в JSON")
+    return parser.parse_args(argv)
+
+
+def synthesise(args: argparse.Namespace) -> List[NotePlan]:
+    rnd = random.Random(args.seed)
+    plans = []
+    at = 0.0
+    for i in range(args.notes):
+        if args.rate > 0:
+            at += rnd.expovariate(args.rate)
+        plans.append(NotePlan(
+            at=round(at, 4),
+            chat_id=FIRST_CHAT + i % args.chats,
+            # кнопки первой страницы клавиатуры
+            emotions=rnd.sample(range(min(24, len(EMOTIONS))), args.toggles),
+            tags=rnd.sample(range(min(24, len(TAGS))), args.toggles),
+            links=rnd.randint(1, 3) if rnd.random() < args.reply_share else 0,
+        ))
+    return plans
+
+
+def read_trace(path: Path, speed: float) -> List[NotePlan]:
+    plans = []
+    with path.open(encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                plan = NotePlan(**json.loads(line))
+                plan.at /= speed
+                plans.append(plan)
+    return plans
+
+
+def write_trace(path: Path, plans: List[NotePlan]) -> None:
+    with path.open("w", encoding="utf-8") as f:
+        for plan in plans:
+            f.write(json.dumps(asdict(plan)) + "\n")
+
+
+class LoadGenerator:
+    """
+    Ведёт записи по плану: кладёт апдейт в очередь getUpdates и ждёт характерного ответа бота
+    (клавиатура, answerCallbackQuery, итог, правка записи). Задержка шага — от апдейта до этого ответа.
+    """
+
+    def __init__(self, api, *, think: float, timeout: float, concurrency: int) -> None:
+        """
+        :param api: FakeTelegramApi, за которым стоит бот
+        :param think: пауза между шагами, сек
+        :param timeout: сколько ждать ответа на шаг, сек
+        """
+        self.api = api
+        self.think = think
+        self.timeout = timeout
+        self.concurrency = concurrency
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Counter[str] = Counter()
+        self.completed = 0
+        self.failed = 0
+        self.updates = 0
+        self._lock = threading.Lock()
+        self._chat_locks: Dict[int, threading.Lock] = defaultdict(threading.Lock)
+        self._message_ids = itertools.count(1)
+        self._tracks = itertools.count(1)
+
+    def _user(self, chat_id: int) -> Dict[str, Any]:
+        return {"id": chat_id, "is_bot": False, "first_name": "Load", "username": USER_FOLDER}
+
+    def _message(self, chat_id: int, text: str, **extra) -> Dict[str, Any]:
+        return {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": self._user(chat_id),
+            "text": text,
+            **extra,
+        }
+
+    def _step(self, name: str, update: Dict[str, Any], method: str, match) -> Any:
+        """
+        :return: результат ответа бота, которого ждали (например, отправленное сообщение)
+        """
+        future = self.api.expect(method, match)
+        started = time.perf_counter()
+        self.api.push_update(update)
+        try:
+            answered, result = future.result(self.timeout)
+        except FutureTimeout:
+            self.api.forget(future)
+            with self._lock:
+                self.updates += 1
+                self.errors[f"{name}:timeout"] += 1
+            raise StepTimeout(name)
+        with self._lock:
+            self.updates += 1
+            self.latencies[name].append(answered - started)
+        return result
+
+    def _keyboard_step(self, name: str, chat_id: int, update: Dict[str, Any]) -> Dict[str, Any]:
+        return self._step(
+            name, update, "sendMessage",
+            lambda params, result: int(params["chat_id"]) == chat_id and "reply_markup" in result,
+        )
+
+    def _press(self, name: str, keyboard: Dict[str, Any], action: str, arg: str = "") -> None:
+        chat_id = keyboard["chat"]["id"]
+        data = next(
+            b["callback_data"]
+            for row in keyboard["reply_markup"]["inline_keyboard"]
+            for b in row
+            if b["callback_data"].split(":")[2:] == [action, arg]
+        )
+        query_id = f"{chat_id}-{next(self._message_ids)}"
+        self._step(
+            name,
+            {"callback_query": {
+                "id": query_id,
+                "from": self._user(chat_id),
+                "message": keyboard,
+                "chat_instance": str(chat_id),
+                "data": data,
+            }},
+            "answerCallbackQuery",
+            lambda params, result: params.get("callback_query_id") == query_id,
+        )
+
+    def _done(self, name: str, keyboard: Dict[str, Any], next_keyboard: bool) -> Dict[str, Any]:
+        chat_id = keyboard["chat"]["id"]
+        data = next(
+            b["callback_data"]
+            for row in keyboard["reply_markup"]["inline_keyboard"]
+            for b in row
+            if b["callback_data"].split(":")[2] == "d"
+        )
+        return self._step(
+            name,
+            {"callback_query": {
+                "id": f"{chat_id}-{next(self._message_ids)}",
+                "from": self._user(chat_id),
+                "message": keyboard,
+                "chat_instance": str(chat_id),
+                "data": data,
+            }},
+            "sendMessage",
+            lambda params, result: int(params["chat_id"]) == chat_id and ("reply_markup" in result) == next_keyboard,
+        )
+
+    def _pause(self) -> None:
+        if self.think:
+            time.sleep(self.think)
+
+    def run_note(self, plan: NotePlan) -> None:
+        chat_id = plan.chat_id
+        # в одном чате — одна незавершённая запись за раз, как у живого пользователя
+        with self._chat_locks[chat_id]:
+            try:
+                keyboard = self._keyboard_step("text", chat_id, {"message": self._message(chat_id, f"Запись в чате {chat_id}")})
+                for idx in plan.emotions:
+                    self._pause()
+                    self._press("emotion", keyboard, "x", str(idx))
+                self._pause()
+                keyboard = self._done("done_emotions", keyboard, next_keyboard=True)
+                for idx in plan.tags:
+                    self._pause()
+                    self._press("tag", keyboard, "x", str(idx))
+                self._pause()
+                note = self._done("done_tags", keyboard, next_keyboard=False)
+                if plan.links:
+                    self._pause()
+                    self._reply(chat_id, note, plan.links)
+            except StepTimeout:
+                with self._lock:
+                    self.failed += 1
+                return
+        with self._lock:
+            self.completed += 1
+
+    def _reply(self, chat_id: int, note: Dict[str, Any], links: int) -> None:
+        text = " ".join(f"https://music.yandex.ru/album/1/track/{next(self._tracks)}" for _ in range(links))
+        self._step(
+            "reply",
+            {"message": self._message(chat_id, text, reply_to_message=note)},
+            "editMessageText",
+            lambda params, result: int(params["message_id"]) == note["message_id"],
+        )
+
+    def run(self, plans: List[NotePlan]) -> float:
+        """
+        Запускает записи в моменты plan.at (открытая модель: не ждёт, пока бот справится).
+
+        :return: длительность прогона, сек
+        """
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="load") as pool:
+            for plan in plans:
+                delay = plan.at - (time.perf_counter() - started)
+                if delay > 0:
+                    time.sleep(delay)
+                pool.submit(self.run_note, plan)
+        return time.perf_counter() - started
+
+
+def _start_bot(api_url: str) -> None:
+    """
+    Бот в этом же процессе, но по-настоящему: main() -> run_polling() -> getUpdates по HTTP.
+    GAS и Яндекс Музыка — фейки из benchmarks.fakes.
+    """
+    from src.config import DATA, config
+    from src.infra.telegram import main
+
+    user_dir = DATA / USER_FOLDER
+    user_dir.mkdir(parents=True, exist_ok=True)
+    (user_dir / "emotions.txt").write_text("".join(f"{v}\n" for v in EMOTIONS), encoding="utf-8")
+    (user_dir / "tags.txt").write_text("".join(f"{v}\n" for v in TAGS), encoding="utf-8")
+
+    config.telegram.api_url = api_url
+    config.telegram.mode = "polling"
+    threading.Thread(target=main, name="bot", daemon=True).start()
+
+
+def _wait_for_bot(api, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    while not api.calls["getUpdates"]:
+        if time.monotonic() > deadline:
+            raise SystemExit("bot did not start polling")
+        time.sleep(0.05)
+    # первый getUpdates — skip_pending, дальше бот переходит к долгому polling
+    time.sleep(0.2)
+
+
+def _percentile(values: List[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    from benchmarks.fake_api import FakeBotApiServer
+    from benchmarks.fakes import FakeGasClient, FakeTelegramApi, FakeYandexClient
+
+    api = FakeTelegramApi(
+        latency=args.telegram_latency / 1000,
+        error_rate=args.error_rate,
+        flood_rate=args.flood_rate,
+        seed=args.seed,
+    )
+    server = FakeBotApiServer(api, host=args.host, port=args.port)
+    server.start()
+
+    if args.external:
+        print(f"fake Bot API: {server.url} — set telegram.api_url and start the bot", file=sys.stderr)
+    else:
+        from src.infra.yandex_music import get_info
+        from src.integrations import gas_client
+
+        gas_client._client = FakeGasClient(latency=args.gas_latency / 1000)
+        get_info._client = FakeYandexClient(latency=args.yandex_latency / 1000)
+        _start_bot(server.url)
+    _wait_for_bot(api, timeout=3600 if args.external else 60)
+
+    plans = read_trace(args.trace, args.speed) if args.trace else synthesise(args)
+    if args.save_trace:
+        write_trace(args.save_trace, plans)
+
+    generator = LoadGenerator(api, think=args.think / 1000, timeout=args.timeout, concurrency=args.concurrency)
+    duration = generator.run(plans)
+
+    result = {
+        "notes": len(plans),
+        "completed": generator.completed,
+        "failed": generator.failed,
+        "duration_s": duration,
+        "updates": generator.updates,
+        "updates_per_sec": generator.updates / duration if duration else 0.0,
+        "notes_per_sec": generator.completed / duration if duration else 0.0,
+        "steps": {
+            name: {
+                "n": len(generator.latencies[name]),
+                "p50_ms": _percentile(generator.latencies[name], 0.5) * 1000,
+                "p95_ms": _percentile(generator.latencies[name], 0.95) * 1000,
+                "p99_ms": _percentile(generator.latencies[name], 0.99) * 1000,
+                "max_ms": max(generator.latencies[name], default=0.0) * 1000,
+            }
+            for name in STEPS
+        },
+        "timeouts": dict(generator.errors),
+        "api_calls": dict(api.calls),
+        "api_errors": dict(api.errors),
+    }
+    if not args.external:
+        from src.infra import metrics
+        if metrics.enabled():
+            result["bot_metrics"] = metrics.get_registry().summary()
+    return result
+
+
+def report(result: Dict[str, Any]) -> None:
+    print(
+        f"notes: {result['completed']}/{result['notes']} completed, {result['failed']} failed "
+        f"in {result['duration_s']:.1f}s"
+    )
+    print(f"throughput: {result['updates_per_sec']:.1f} updates/s, {result['notes_per_sec']:.2f} notes/s")
+    print(f"{'step':<15}{'n':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for name, step in result["steps"].items():
+        print(
+            f"{name:<15}{step['n']:>7}{step['p50_ms']:>10.1f}{step['p95_ms']:>10.1f}"
+            f"{step['p99_ms']:>10.1f}{step['max_ms']:>10.1f}"
+        )
+    updates = result["updates"] or 1
+    timeouts = sum(result["timeouts"].values())
+    print(f"timeouts: {timeouts} ({timeouts / updates:.2%}) {result['timeouts']}")
+    print(f"api calls: {json.dumps(result['api_calls'])}")
+    print(f"api errors: {json.dumps(result['api_errors'])}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = _parse_args(sys.argv[1:] if argv is None else argv)
+
+    # бот — daemon-поток и может ещё писать в каталог, когда его удаляют
+    with tempfile.TemporaryDirectory(prefix="tgbotnotes-load-", ignore_cleanup_errors=True) as data_dir:
+        os.environ.setdefault("TGBOTNOTES_CONFIG", str(HERE / "load.yaml"))
+        os.environ["TGBOTNOTES_DATA"] = data_dir
+        result = run(args)
+
+    report(result)
+    if args.json:
+        args.json.write_text(json.dumps(result, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+    return 1 if result["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
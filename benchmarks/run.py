@@ -0,0 +1,297 @@
+import argparse
+import itertools
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+
+HERE = Path(__file__).parent
+BASELINE_PATH = HERE / "baseline.json"
+
+USER_FOLDER = "bench_user"
+EMOTIONS = [f"Эмоция {i}" for i in range(40)]
+TAGS = [f"Тег {i}" for i in range(30)]
+
+# шаги одной записи в порядке выполнения
+STEPS = ["text", "emotion", "done_emotions", "tag", "done_tags", "reply", "search"]
+
+# насколько медленнее baseline можно быть, прежде чем считать это регрессией
+TOLERANCE = 0.25
+# шумовой порог: разница p50 меньше этого не считается регрессией, мс
+MIN_DIFF_MS = 0.05
+
+
+def _parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Бенчмарк сценариев записи и плейлиста")
+    parser.add_argument("--notes", type=int, default=200, help="Сколько записей прогнать")
+    parser.add_argument("--warmup", type=int, default=10, help="Сколько записей прогнать до замеров")
+    parser.add_argument("--toggles", type=int, default=5, help="Сколько эмоций и тегов выбирать в каждой записи")
+    parser.add_argument("--alloc-notes", type=int, default=20, help="Сколько записей прогнать под tracemalloc")
+    parser.add_argument("--telegram-latency", type=float, default=0, help="Задержка запроса к Bot API, мс")
+    parser.add_argument("--gas-latency", type=float, default=0, help="Задержка запроса к GAS, мс")
+    parser.add_argument("--yandex-latency", type=float, default=0, help="Задержка запроса к Яндекс Музыке, мс")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH, help="Файл baseline")
+    parser.add_argument("--save-baseline", action="store_true", help="Записать результат как baseline")
+    parser.add_argument("--compare", action="store_true", help="Сравнить с baseline; код выхода 1 при регрессии")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="Допустимое замедление относительно baseline (0.25 = 25%%)")
+    return parser.parse_args(argv)
+
+
+def _setup(args: argparse.Namespace):
+    """
+    Подменяет внешние сервисы фейками и собирает настоящего бота через build_bot().
+    Импорты src — только здесь: TGBOTNOTES_CONFIG/TGBOTNOTES_DATA должны быть выставлены раньше.
+    """
+    from telebot import apihelper
+
+    from benchmarks.fakes import FakeGasClient, FakeTelegramApi, FakeYandexClient
+    from src.config import DATA
+    from src.infra.yandex_music import get_info
+    from src.integrations import gas_client
+
+    api = FakeTelegramApi(latency=args.telegram_latency / 1000)
+    gas = FakeGasClient(latency=args.gas_latency / 1000)
+    yandex = FakeYandexClient(latency=args.yandex_latency / 1000)
+
+    apihelper.CUSTOM_REQUEST_SENDER = api
+    gas_client._client = gas
+    get_info._client = yandex
+
+    user_dir = DATA / USER_FOLDER
+    user_dir.mkdir(parents=True, exist_ok=True)
+    (user_dir / "emotions.txt").write_text("".join(f"{v}\n" for v in EMOTIONS), encoding="utf-8")
+    (user_dir / "tags.txt").write_text("".join(f"{v}\n" for v in TAGS), encoding="utf-8")
+
+    from src.infra.telegram import build_bot
+
+    bot = build_bot()
+    # апдейт обрабатывается в вызывающем потоке — так время шага меряется целиком
+    bot.threaded = False
+    return bot, api, gas, yandex
+
+
+class Scenario:
+    """
+    Одна запись: текст -> эмоции -> теги -> итог -> reply со ссылками -> /search по ней.
+    Кнопки берутся из клавиатур, которые бот на самом деле отправил в FakeTelegramApi.
+    """
+
+    def __init__(self, bot, api, toggles: int) -> None:
+        from telebot import types
+
+        self.bot = bot
+        self.api = api
+        self.toggles = toggles
+        self._types = types
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._tracks = itertools.count(1)
+
+    def _user(self, chat_id: int) -> Dict[str, Any]:
+        return {"id": chat_id, "is_bot": False, "first_name": "Bench", "username": USER_FOLDER}
+
+    def _message(self, chat_id: int, text: str, **extra) -> Dict[str, Any]:
+        return {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": self._user(chat_id),
+            "text": text,
+            **extra,
+        }
+
+    def _process(self, update: Dict[str, Any]) -> None:
+        update["update_id"] = next(self._update_ids)
+        self.bot.process_new_updates([self._types.Update.de_json(update)])
+
+    def _press(self, chat_id: int, action: str, n: int = 0) -> None:
+        keyboard = self.api.last_message(chat_id)
+        buttons = [
+            b["callback_data"]
+            for row in keyboard["reply_markup"]["inline_keyboard"]
+            for b in row
+            if b["callback_data"].split(":")[2] == action
+        ]
+        self._process({
+            "callback_query": {
+                "id": str(next(self._update_ids)),
+                "from": self._user(chat_id),
+                "message": keyboard,
+                "chat_instance": str(chat_id),
+                "data": buttons[n % len(buttons)],
+            }
+        })
+
+    def steps(self, chat_id: int) -> List[tuple[str, Callable[[], None]]]:
+        """
+        :return: [(имя шага, вызов)] одной записи в чате chat_id
+        """
+        steps: List[tuple[str, Callable[[], None]]] = [
+            ("text", lambda: self._process({"message": self._message(chat_id, f"Запись в чате {chat_id}")})),
+        ]
+        steps += [("emotion", lambda n=n: self._press(chat_id, "x", n)) for n in range(self.toggles)]
+        steps.append(("done_emotions", lambda: self._press(chat_id, "d")))
+        steps += [("tag", lambda n=n: self._press(chat_id, "x", n)) for n in range(self.toggles)]
+        steps.append(("done_tags", lambda: self._press(chat_id, "d")))
+        steps.append(("reply", lambda: self._reply(chat_id)))
+        steps.append(("search", lambda: self._process({"message": self._message(chat_id, f"/search чате {chat_id}")})))
+        return steps
+
+    def _reply(self, chat_id: int) -> None:
+        note = self.api.last_message(chat_id)
+        links = " ".join(
+            f"https://music.yandex.ru/album/1/track/{next(self._tracks)}" for _ in range(3)
+        )
+        self._process({"message": self._message(chat_id, links, reply_to_message=note)})
+
+
+def _percentile(values: List[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+def _run_timed(scenario: Scenario, notes: int, first_chat: int) -> tuple[Dict[str, List[float]], float, int]:
+    """
+    :return: ({шаг: [длительности, сек]}, общее время, число апдейтов)
+    """
+    durations: Dict[str, List[float]] = defaultdict(list)
+    updates = 0
+    started = time.perf_counter()
+    for chat_id in range(first_chat, first_chat + notes):
+        for name, step in scenario.steps(chat_id):
+            t0 = time.perf_counter()
+            step()
+            durations[name].append(time.perf_counter() - t0)
+            updates += 1
+    return durations, time.perf_counter() - started, updates
+
+
+def _run_allocations(scenario: Scenario, notes: int, first_chat: int) -> Dict[str, float]:
+    """
+    :return: {шаг: средний пик выделенной памяти за шаг, КБ}
+    """
+    peaks: Dict[str, List[int]] = defaultdict(list)
+    tracemalloc.start()
+    try:
+        for chat_id in range(first_chat, first_chat + notes):
+            for name, step in scenario.steps(chat_id):
+                tracemalloc.reset_peak()
+                before, _ = tracemalloc.get_traced_memory()
+                step()
+                _, peak = tracemalloc.get_traced_memory()
+                peaks[name].append(peak - before)
+    finally:
+        tracemalloc.stop()
+    return {name: sum(values) / len(values) / 1024 for name, values in peaks.items()}
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    bot, api, gas, yandex = _setup(args)
+    scenario = Scenario(bot, api, toggles=args.toggles)
+
+    chat = 1
+    _run_timed(scenario, args.warmup, chat)
+    chat += args.warmup
+
+    durations, total, updates = _run_timed(scenario, args.notes, chat)
+    chat += args.notes
+
+    allocations = _run_allocations(scenario, args.alloc_notes, chat) if args.alloc_notes else {}
+
+    from src.integrations.gas_writer import get_gas_writer
+    get_gas_writer().stop()
+
+    return {
+        "params": {
+            "notes": args.notes,
+            "toggles": args.toggles,
+            "telegram_latency_ms": args.telegram_latency,
+            "gas_latency_ms": args.gas_latency,
+            "yandex_latency_ms": args.yandex_latency,
+        },
+        "updates_per_sec": updates / total if total else 0.0,
+        "steps": {
+            name: {
+                "n": len(durations[name]),
+                "p50_ms": _percentile(durations[name], 0.5) * 1000,
+                "p95_ms": _percentile(durations[name], 0.95) * 1000,
+                "alloc_peak_kb": allocations.get(name, 0.0),
+            }
+            for name in STEPS
+        },
+        "calls": {
+            "telegram": dict(api.calls),
+            "gas": dict(gas.calls),
+            "yandex": yandex.calls,
+        },
+    }
+
+
+def report(result: Dict[str, Any]) -> None:
+    print(f"updates/sec: {result['updates_per_sec']:.1f}")
+    print(f"{'step':<15}{'n':>7}{'p50 ms':>10}{'p95 ms':>10}{'alloc KB':>11}")
+    for name, step in result["steps"].items():
+        print(f"{name:<15}{step['n']:>7}{step['p50_ms']:>10.3f}{step['p95_ms']:>10.3f}{step['alloc_peak_kb']:>11.1f}")
+    print(f"calls: {json.dumps(result['calls'], ensure_ascii=False)}")
+
+
+def compare(result: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """
+    :return: описания регрессий; пусто — всё в пределах tolerance
+    """
+    regressions = []
+    if baseline["params"] != result["params"]:
+        regressions.append(f"params differ from baseline: {baseline['params']} != {result['params']}")
+        return regressions
+
+    base_ups = baseline["updates_per_sec"]
+    if result["updates_per_sec"] < base_ups * (1 - tolerance):
+        regressions.append(f"updates/sec {result['updates_per_sec']:.1f} < baseline {base_ups:.1f}")
+
+    for name, step in result["steps"].items():
+        base = baseline["steps"].get(name)
+        if not base:
+            continue
+        diff = step["p50_ms"] - base["p50_ms"]
+        if diff > MIN_DIFF_MS and step["p50_ms"] > base["p50_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p50 {step['p50_ms']:.3f}ms > baseline {base['p50_ms']:.3f}ms")
+        if base["alloc_peak_kb"] and step["alloc_peak_kb"] > base["alloc_peak_kb"] * (1 + tolerance):
+            regressions.append(f"{name}: alloc {step['alloc_peak_kb']:.1f}KB > baseline {base['alloc_peak_kb']:.1f}KB")
+    return regressions
+
+
+def main(argv: List[str] | None = None) -> int:
+    args = _parse_args(sys.argv[1:] if argv is None else argv)
+
+    with tempfile.TemporaryDirectory(prefix="tgbotnotes-bench-") as data_dir:
+        os.environ.setdefault("TGBOTNOTES_CONFIG", str(HERE / "config.yaml"))
+        os.environ["TGBOTNOTES_DATA"] = data_dir
+        result = run(args)
+
+    report(result)
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(result, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+        print(f"baseline saved: {args.baseline}")
+
+    if args.compare:
+        if not args.baseline.exists():
+            print(f"no baseline at {args.baseline}; run with --save-baseline first")
+            return 1
+        regressions = compare(result, json.loads(args.baseline.read_text(encoding="utf-8")), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            return 1
+        print("no regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,10 @@
+import json
 from pathlib import Path
-from pydantic._internal._model_construction import ModelMetaclass
-import yaml
+from typing import TYPE_CHECKING, Any, Iterator, Optional, TextIO
+
+if TYPE_CHECKING:
+    # pydantic и yaml нужны только для чтения конфига — txt_read/txt_add без них
+    from pydantic._internal._model_construction import ModelMetaclass
 
 def _check_file(file_path: Path | str, expected_type: str) -> Path:
     """
@@ -22,13 +26,15 @@ def _check_file(file_path: Path | str, expected_type: str) -> Path:
 
     return Path(file_path)
 
-def yaml_read(file_path: Path | str, schema: ModelMetaclass):
+def yaml_read(file_path: Path | str, schema: "ModelMetaclass"):
     """
     Загружает и валидирует данные из YAML-файла согласно указанной схеме.
 
     :param file_path: Путь к YAML-файлу.
     :param schema: Схема для валидации данных.
     """
+    import yaml
+
     file_path = _check_file(file_path, "yaml")
 
     with open(file_path, encoding="utf-8") as f:
@@ -52,19 +58,101 @@ def txt_read(file_path: Path | str) -> list[str]:
         data = f.read()
     return data.splitlines()
 
-def txt_add(file_path: Path | str, data: str):
+_DECODER = json.JSONDecoder()
+
+class _JsonStream:
+    """
+    JSON-текст, который дочитывается из файла кусками по мере разбора:
+    в памяти — текущий кусок и недоразобранное значение, а не весь файл.
     """
-    Добавляет данные в текстовый файл.
 
-    :param file_path: Путь к файлу.
-    :param data: Данные для записи.
+    def __init__(self, f: TextIO, chunk_size: int) -> None:
+        self._f = f
+        self._chunk_size = chunk_size
+        self._buf = ""
+        self._pos = 0
+
+    def _more(self) -> bool:
+        chunk = self._f.read(self._chunk_size)
+        if not chunk:
+            return False
+        # разобранное начало буфера больше не нужно
+        self._buf = self._buf[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Следующий значащий символ (пробелы пропускаются); "" — конец файла."""
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos] in " \t\r\n":
+                self._pos += 1
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._more():
+                return ""
+
+    def take(self, expected: str) -> str:
+        ch = self.peek()
+        if not ch or ch not in expected:
+            raise ValueError(f"Ожидался один из символов {expected!r}, а не {ch!r}")
+        self._pos += 1
+        return ch
+
+    def value(self) -> Any:
+        self.peek()
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError:
+                # значение оборвалось на границе куска
+                if not self._more():
+                    raise
+                continue
+            # число в конце буфера могло оборваться: 12|34
+            if end == len(self._buf) and self._more():
+                continue
+            self._pos = end
+            return value
+
+def json_array_items(
+    file_path: Path | str,
+    key: str,
+    header: Optional[dict] = None,
+    chunk_size: int = 1 << 20,
+) -> Iterator[Any]:
     """
-    file_path = _check_file(file_path, "txt")
+    Элементы массива key из объекта верхнего уровня JSON-файла — по одному, не загружая файл целиком
+    (например, messages из экспорта чата Telegram).
 
-    old_data = txt_read(file_path)
-    if len(old_data) > 0:
-        data = "\n" + data
+    :param file_path: Путь к JSON-файлу.
+    :param key: Ключ массива.
+    :param header: Сюда складываются ключи верхнего уровня, которые идут в файле до массива.
+    :param chunk_size: Сколько символов читать за раз.
 
-    with open(file_path, "a", encoding="utf-8") as f:
-        f.write(data)
+    :raises ValueError: Если файл — не JSON-объект или в нём нет массива key.
+    """
+    file_path = _check_file(file_path, "json")
 
+    with open(file_path, encoding="utf-8") as f:
+        stream = _JsonStream(f, chunk_size)
+        stream.take("{")
+        if stream.peek() == "}":
+            raise ValueError(f"В файле {file_path} нет ключа {key!r}")
+        while True:
+            name = stream.value()
+            stream.take(":")
+            if name == key:
+                break
+            value = stream.value()
+            if header is not None:
+                header[name] = value
+            if stream.take(",}") == "}":
+                raise ValueError(f"В файле {file_path} нет ключа {key!r}")
+
+        stream.take("[")
+        if stream.peek() == "]":
+            return
+        while True:
+            yield stream.value()
+            if stream.take(",]") == "]":
+                return
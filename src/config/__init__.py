@@ -1,10 +1,79 @@
+import os
+import threading
 from pathlib import Path
+from typing import TYPE_CHECKING, Any, Optional, cast
 from src.infra import logger
-from src.config.shemas import Config
-from src.common import readers
+
+if TYPE_CHECKING:
+    from src.config.shemas import Config
 
 log = logger.setup.Simple(name='TgBotNotes')
 
 ROOT: Path = Path(__file__).parent.parent.parent
 
-config: Config = readers.yaml_read(ROOT / 'config.yaml', Config)
\ No newline at end of file
+# другой конфиг и каталог данных — для бенчмарков и второго экземпляра бота
+CONFIG_PATH: Path = Path(os.environ.get('TGBOTNOTES_CONFIG') or ROOT / 'config.yaml')
+DATA: Path = Path(os.environ.get('TGBOTNOTES_DATA') or ROOT / 'data')
+
+
+def worker_id() -> Optional[int]:
+    """
+    Номер процесса-воркера (его задаёт супервизор src.infra.telegram.sharding); None — обычный запуск.
+    """
+    value = os.environ.get('TGBOTNOTES_WORKER')
+    return int(value) if value else None
+
+
+class _LazyConfig:
+    """
+    config.yaml читается и валидируется при первом обращении к полю, а не при импорте src.config:
+    pydantic и yaml не грузятся, пока конфиг никому не нужен.
+    """
+
+    def __init__(self) -> None:
+        object.__setattr__(self, "_value", None)
+        object.__setattr__(self, "_lock", threading.Lock())
+
+    def load(self) -> "Config":
+        value = self._value
+        if value is None:
+            with self._lock:
+                value = self._value
+                if value is None:
+                    value = _read_config()
+                    object.__setattr__(self, "_value", value)
+        return value
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.load(), name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        setattr(self.load(), name, value)
+
+    def __repr__(self) -> str:
+        return repr(self._value) if self._value is not None else f"<config {CONFIG_PATH}, not loaded>"
+
+
+def _read_config() -> "Config":
+    from src.common import readers
+    from src.config.shemas import Config
+
+    value: Config = readers.yaml_read(CONFIG_PATH, Config)
+
+    logger.setup.configure(
+        log,
+        queue=value.logging.queue,
+        json_format=value.logging.format == "json",
+        sampling=value.logging.sampling,
+    )
+    return value
+
+
+config: "Config" = cast("Config", _LazyConfig())
+
+
+def load_config() -> "Config":
+    """
+    Прочитать конфиг сейчас — чтобы ошибка в config.yaml всплыла при старте, а не на первом апдейте.
+    """
+    return cast(_LazyConfig, config).load()
@@ -1,3 +1,5 @@
+from typing import Literal, Optional
+
 from pydantic import BaseModel, Field
 
 class TelegramConfig(BaseModel):
@@ -6,12 +8,123 @@ class TelegramConfig(BaseModel):
         """Конфигурация бота телеграм"""
         name: str = Field(..., description="Название бота")
         token: str = Field(..., description="Токен бота")
+    class WebhookConfig(BaseModel):
+        """Конфигурация webhook-режима"""
+        url: Optional[str] = Field(None, description="Публичный https URL, который регистрируется в Telegram; None — не регистрировать")
+        host: str = Field("0.0.0.0", description="Адрес локального HTTP-сервера")
+        port: int = Field(8443, description="Порт локального HTTP-сервера")
+        path: str = Field("/telegram/webhook", description="Путь, на который Telegram присылает апдейты")
+        secret_token: Optional[str] = Field(None, description="Секрет из заголовка X-Telegram-Bot-Api-Secret-Token; None при заданном url — случайный на каждый запуск (для нескольких экземпляров за одним url задайте явно); без url обязателен")
+        max_connections: int = Field(40, description="Сколько параллельных соединений разрешить Telegram")
+        drop_pending_updates: bool = Field(False, description="Выбрасывать апдейты, накопившиеся, пока бот был остановлен")
+    class RateLimitConfig(BaseModel):
+        """Ограничение исходящих запросов к Bot API"""
+        enabled: bool = Field(True, description="Пропускать запросы к Bot API через ограничитель")
+        global_rate: float = Field(30, description="Запросов в секунду на бота")
+        private_rate: float = Field(1, description="Запросов в секунду в личный чат")
+        private_burst: int = Field(5, description="Сколько запросов в личный чат можно сделать подряд без ожидания")
+        group_rate: float = Field(20 / 60, description="Запросов в секунду в группу")
+        group_burst: int = Field(20, description="Сколько запросов в группу можно сделать подряд без ожидания")
+        max_retries: int = Field(3, description="Сколько раз повторять запрос после 429")
+        max_block: float = Field(3.0, description="Сколько поток хендлера может ждать лимит чата и retry_after на один send_message или правку, сек; ответы на нажатия и удаления после 429 повторяются из таймера")
     bot: BotConfig = Field(..., description="Конфигурация бота")
+    api_url: Optional[str] = Field(None, description="Адрес Bot API, например локального сервера из benchmarks.load; None — https://api.telegram.org")
+    background_commands: bool = Field(True, description="Регистрировать команды меню в фоне, не задерживая старт polling")
+    mode: Literal["polling", "webhook"] = Field("polling", description="Как получать апдейты")
+    webhook: WebhookConfig = Field(default_factory=WebhookConfig, description="Конфигурация webhook-режима")
+    edit_debounce: float = Field(0.4, description="Сколько ждать следующего нажатия, прежде чем обновить клавиатуру, сек")
+    edit_max_delay: float = Field(2.0, description="Максимальная задержка обновления клавиатуры при непрерывных нажатиях, сек")
+    rate_limit: RateLimitConfig = Field(default_factory=RateLimitConfig, description="Ограничение исходящих запросов к Bot API")
 
 class GoogleAppScriptsConfig(BaseModel):
+    class WriterConfig(BaseModel):
+        """Фоновая запись в GAS через журнал"""
+        batch_size: int = Field(50, description="Сколько операций отправлять одним batch-запросом")
+        flush_interval: float = Field(1.0, description="Как часто проверять очередь, сек")
+        max_attempts: int = Field(10, description="Сколько раз повторять отклонённую GAS операцию перед dead-letter")
+        fsync: bool = Field(True, description="fsync журнала после каждой записи")
     token: str = Field(..., description="Токен Google App Scripts")
+    timeout: float = Field(15, description="Таймаут запроса по умолчанию, сек")
+    pool_size: int = Field(10, description="Размер пула keep-alive соединений на хост")
+    retries: int = Field(3, description="Сколько раз повторять идемпотентные запросы")
+    backoff: float = Field(0.5, description="Базовая пауза между повторами, сек (растёт экспоненциально)")
+    backoff_max: float = Field(8, description="Максимальная пауза между повторами, сек")
+    writer: WriterConfig = Field(default_factory=WriterConfig, description="Фоновая запись в GAS")
+
+class YandexMusicConfig(BaseModel):
+    """Конфигурация Яндекс Музыки"""
+    class CacheConfig(BaseModel):
+        """Конфигурация кеша метаданных треков"""
+        memory_size: int = Field(1024, description="Сколько треков держать в памяти (LRU)")
+        disk_size: int = Field(50_000, description="Сколько треков держать на диске")
+        ttl: int = Field(30 * 24 * 3600, description="Время жизни записи, сек")
+        collections_ttl: int = Field(24 * 3600, description="Сколько помнить состав раскрытого альбома/плейлиста/артиста, сек")
+    token: Optional[str] = Field(None, description="Токен Яндекс Музыки (необязателен)")
+    expand_limit: int = Field(200, description="Сколько треков брать из одной ссылки на альбом, плейлист или артиста")
+    cache: CacheConfig = Field(default_factory=CacheConfig, description="Кеш метаданных треков")
+
+class NotesIndexConfig(BaseModel):
+    """Локальный индекс id записей"""
+    warmup: bool = Field(False, description="Загружать id записей из GAS при старте")
+    users: list[str] = Field(default_factory=list, description="Чьи id загружать; пусто — все папки из ROOT/data")
+
+class SearchConfig(BaseModel):
+    """Локальный полнотекстовый поиск по записям (/search)"""
+    page_size: int = Field(5, description="Сколько записей показывать на странице результатов")
+    backfill: bool = Field(False, description="Догружать при старте записи из GAS, сделанные до появления индекса")
+    backfill_page: int = Field(500, description="Сколько строк таблицы запрашивать у GAS за раз")
+    users: list[str] = Field(default_factory=list, description="Чьи записи догружать; пусто — все папки из ROOT/data")
+
+class StatsConfig(BaseModel):
+    """Отчёт /stats по эмоциям и тегам"""
+    window: Literal["day", "week", "month"] = Field("week", description="Окно отчёта, если в /stats его не указали")
+    top: int = Field(10, description="Сколько самых частых эмоций и тегов показывать")
+    pairs: int = Field(5, description="Сколько самых частых пар эмоция+тег показывать")
+
+class SessionsConfig(BaseModel):
+    """Хранилище незавершённых записей"""
+    backend: Literal["memory", "sqlite"] = Field("memory", description="memory — в процессе; sqlite — переживает рестарт, общий для процессов")
+    ttl: int = Field(24 * 3600, description="Через сколько секунд бездействия сессия удаляется")
+    max_size: int = Field(10_000, description="Максимум сессий")
+    path: Optional[str] = Field(None, description="Путь к SQLite-файлу; по умолчанию ROOT/data/cache/sessions.sqlite3")
+
+class ConstantsConfig(BaseModel):
+    """Эмоции/теги пользователей"""
+    recheck_interval: float = Field(30, description="Как часто проверять emotions.txt/tags.txt на диске, сек")
+
+class LoggingConfig(BaseModel):
+    """Логирование"""
+    queue: bool = Field(False, description="Форматировать и писать логи в фоновом потоке")
+    format: Literal["text", "json"] = Field("text", description="text — как раньше; json — одна JSON-строка на запись")
+    sampling: dict[str, float] = Field(default_factory=dict, description="Доля сообщений по первому слову шаблона, например {HANDLE: 0.1}; WARNING и выше пишутся всегда")
+
+class MetricsConfig(BaseModel):
+    """Замеры времени и счётчики"""
+    enabled: bool = Field(True, description="Собирать метрики; False — декораторы и таймеры ничего не делают")
+    reservoir: int = Field(1024, description="По скольким последним замерам считать перцентили")
+    host: str = Field("127.0.0.1", description="Адрес HTTP /metrics")
+    port: Optional[int] = Field(None, description="Порт HTTP /metrics; None — не поднимать (в webhook-режиме /metrics есть на сервере вебхука). При sharding здесь метрики супервизора, воркер N — на port + N + 1")
+    log_interval: float = Field(0, description="Как часто писать сводку метрик в лог, сек; 0 — не писать")
+
+class ShardingConfig(BaseModel):
+    """Несколько процессов-воркеров: апдейты распределяются по chat_id"""
+    workers: int = Field(1, description="Сколько процессов-воркеров; 1 — всё в одном процессе, как раньше; 0 — по числу ядер")
+    threads: int = Field(4, description="Сколько потоков обрабатывают апдейты в каждом воркере; апдейты одного чата — всё равно по очереди")
+    replicas: int = Field(64, description="Сколько точек у каждого воркера на кольце consistent hashing")
+    max_pending: int = Field(1000, description="Сколько неподтверждённых апдейтов воркера хранить, чтобы переотправить после его падения")
+    restart_delay: float = Field(1.0, description="Пауза перед перезапуском упавшего воркера, сек; растёт, если он падает сразу после старта")
+    stats_interval: float = Field(60, description="Как часто писать статистику воркеров в лог, сек; 0 — не писать")
 
 class Config(BaseModel):
     """Конфигурация приложения"""
     telegram: TelegramConfig = Field(..., description="Конфигурация Telegram")
-    gas: GoogleAppScriptsConfig = Field(..., description="Конфигурация Google App Scripts")
\ No newline at end of file
+    gas: GoogleAppScriptsConfig = Field(..., description="Конфигурация Google App Scripts")
+    yandex_music: YandexMusicConfig = Field(default_factory=YandexMusicConfig, description="Конфигурация Яндекс Музыки")
+    constants: ConstantsConfig = Field(default_factory=ConstantsConfig, description="Эмоции/теги пользователей")
+    sessions: SessionsConfig = Field(default_factory=SessionsConfig, description="Хранилище незавершённых записей")
+    notes_index: NotesIndexConfig = Field(default_factory=NotesIndexConfig, description="Локальный индекс id записей")
+    search: SearchConfig = Field(default_factory=SearchConfig, description="Локальный полнотекстовый поиск по записям")
+    stats: StatsConfig = Field(default_factory=StatsConfig, description="Отчёт /stats по эмоциям и тегам")
+    logging: LoggingConfig = Field(default_factory=LoggingConfig, description="Логирование")
+    metrics: MetricsConfig = Field(default_factory=MetricsConfig, description="Замеры времени и счётчики")
+    sharding: ShardingConfig = Field(default_factory=ShardingConfig, description="Несколько процессов-воркеров")
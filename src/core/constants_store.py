@@ -0,0 +1,187 @@
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from src.config import log, DATA
+from src.core.user_constants import FileSignature, constants_paths, file_signature
+
+
+class ConstantsStore:
+    """
+    Упорядоченный набор уникальных значений в txt-файле (одно значение на строку).
+
+    - add() дописывает в конец только новые значения: O(кол-ва новых), файл не перечитывается
+    - проверка на дубли — по множеству в памяти
+    - remove()/move() меняют порядок и переписывают файл целиком (compaction)
+    - если файл изменили руками, это заметно по (mtime, size), и он перечитывается перед записью
+    """
+
+    def __init__(self, path: Path | str) -> None:
+        """
+        :param path: путь к txt-файлу; создаётся при первой записи
+        """
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._values: List[str] = []
+        self._index: set[str] = set()
+        self._ends_with_newline = True
+        self._signature: FileSignature = None
+        self._load()
+
+    @property
+    def values(self) -> tuple[str, ...]:
+        return tuple(self._values)
+
+    def __contains__(self, value: str) -> bool:
+        return value.strip() in self._index
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def add(self, values: Iterable[str]) -> List[str]:
+        """
+        :return: значения, которых ещё не было (в порядке добавления)
+        """
+        with self._lock:
+            self._reload_if_changed()
+
+            added: List[str] = []
+            for value in values:
+                value = value.strip()
+                if not value or value in self._index:
+                    continue
+                self._index.add(value)
+                self._values.append(value)
+                added.append(value)
+
+            if not added:
+                return added
+
+            payload = "\n".join(added) + "\n"
+            if not self._ends_with_newline:
+                payload = "\n" + payload
+
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(payload)
+            self._ends_with_newline = True
+            self._signature = file_signature(self.path)
+            return added
+
+    def remove(self, value: str) -> bool:
+        with self._lock:
+            self._reload_if_changed()
+            value = value.strip()
+            if value not in self._index:
+                return False
+            self._index.remove(value)
+            self._values.remove(value)
+            self._compact()
+            return True
+
+    def move(self, value: str, position: int) -> bool:
+        """
+        Переставляет значение на позицию position (как list.insert).
+        """
+        with self._lock:
+            self._reload_if_changed()
+            value = value.strip()
+            if value not in self._index:
+                return False
+            self._values.remove(value)
+            self._values.insert(position, value)
+            self._compact()
+            return True
+
+    def compact(self) -> None:
+        with self._lock:
+            self._reload_if_changed()
+            self._compact()
+
+    def _load(self) -> None:
+        self._values = []
+        self._index = set()
+        self._ends_with_newline = True
+        self._signature = file_signature(self.path)
+        if self._signature is None:
+            return
+
+        with open(self.path, encoding="utf-8") as f:
+            raw = f.read()
+
+        for line in raw.splitlines():
+            value = line.strip()
+            if value and value not in self._index:
+                self._index.add(value)
+                self._values.append(value)
+        self._ends_with_newline = not raw or raw.endswith("\n")
+
+    def _reload_if_changed(self) -> None:
+        if file_signature(self.path) != self._signature:
+            self._load()
+
+    def _compact(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write("".join(f"{v}\n" for v in self._values))
+        os.replace(tmp, self.path)
+        self._ends_with_newline = True
+        self._signature = file_signature(self.path)
+
+
+_stores: Dict[Path, ConstantsStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_constants_store(path: Path | str) -> ConstantsStore:
+    """Один ConstantsStore на файл в пределах процесса."""
+    path = Path(path)
+    store = _stores.get(path)
+    if store is None:
+        with _stores_lock:
+            store = _stores.get(path)
+            if store is None:
+                store = _stores[path] = ConstantsStore(path)
+    return store
+
+
+def _needs_migration(path: Path) -> bool:
+    with open(path, encoding="utf-8") as f:
+        raw = f.read()
+    lines = raw.splitlines()
+    values = [line.strip() for line in lines]
+    return (
+        (raw != "" and not raw.endswith("\n"))
+        or any(not v for v in values)
+        or values != lines
+        or len(set(values)) != len(values)
+    )
+
+
+def migrate(base: Optional[Path] = None) -> List[Path]:
+    """
+    Приводит существующие DATA/<user>/emotions.txt и tags.txt к формату ConstantsStore:
+    без дублей и пустых строк, по значению на строку, с переводом строки в конце.
+
+    :return: файлы, которые были переписаны
+    """
+    base = base or DATA
+    if not base.exists():
+        return []
+
+    migrated: List[Path] = []
+    for user_dir in sorted(p for p in base.iterdir() if p.is_dir()):
+        for path in constants_paths(user_dir.name).values():
+            path = user_dir / path.name
+            if not path.exists() or not _needs_migration(path):
+                continue
+            get_constants_store(path).compact()
+            migrated.append(path)
+            log.info(f"Constants migrated: {path}")
+    return migrated
+
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,264 @@
+import sqlite3
+import threading
+from dataclasses import dataclass
+from datetime import date, timedelta
+from itertools import product
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from src.config import log, DATA
+
+
+EMOTION = "e"
+TAG = "t"
+
+# окна отчёта: название -> сколько дней, считая сегодняшний
+WINDOWS: Dict[str, int] = {"day": 1, "week": 7, "month": 30}
+
+
+@dataclass
+class AggregateStats:
+    notes: int = 0
+    duplicates: int = 0
+    reports: int = 0
+    rebuilds: int = 0
+    errors: int = 0
+
+
+@dataclass(frozen=True)
+class Count:
+    label: str
+    count: int
+    previous: int  # то же значение за предыдущее окно такой же длины
+
+
+@dataclass(frozen=True)
+class StatsReport:
+    start: date
+    end: date
+    notes: int
+    previous_notes: int
+    emotions: List[Count]
+    tags: List[Count]
+    pairs: List[Tuple[str, str, int]]  # (эмоция, тег, сколько записей с обоими)
+
+
+def _day(when: str) -> Optional[str]:
+    """
+    :param when: "YYYY-MM-DD HH:MM:SS" (_format_dt), время в часовом поясе бота
+    :return: "YYYY-MM-DD"; None — дату не разобрать
+    """
+    try:
+        return date.fromisoformat((when or "")[:10]).isoformat()
+    except ValueError:
+        return None
+
+
+class NoteAggregates:
+    """
+    Счётчики эмоций, тегов и пар эмоция+тег по дням, для /stats.
+
+    - _finish прибавляет каждую новую запись (одна транзакция, несколько строк)
+    - отчёт за окно суммирует строки по дням и не читает сами записи: годы истории — это
+      сотни дней на метку, а не тысячи записей
+    - rebuild() пересчитывает пользователя с нуля из полной истории (например, после backfill из GAS)
+    """
+
+    def __init__(self, path: Optional[Path | str] = None) -> None:
+        """
+        :param path: путь к SQLite-файлу; None — только память
+        """
+        self.stats = AggregateStats()
+
+        self._lock = threading.Lock()
+        if path is None:
+            target = ":memory:"
+        else:
+            path = Path(path)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            target = str(path)
+        self._db = sqlite3.connect(target, check_same_thread=False, timeout=5)
+        if path is not None:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            # счётчики пересобираются rebuild(): fsync на каждую запись не нужен
+            self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS counted (
+                user TEXT NOT NULL, msg_id INTEGER NOT NULL, PRIMARY KEY (user, msg_id)
+            );
+            CREATE TABLE IF NOT EXISTS note_days (
+                user TEXT NOT NULL, day TEXT NOT NULL, count INTEGER NOT NULL,
+                PRIMARY KEY (user, day)
+            );
+            CREATE TABLE IF NOT EXISTS label_days (
+                user TEXT NOT NULL, day TEXT NOT NULL, kind TEXT NOT NULL, label TEXT NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (user, day, kind, label)
+            );
+            CREATE TABLE IF NOT EXISTS pair_days (
+                user TEXT NOT NULL, day TEXT NOT NULL, emotion TEXT NOT NULL, tag TEXT NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (user, day, emotion, tag)
+            );
+            """
+        )
+        self._db.commit()
+
+    def _count(self, user: str, msg_id: int, when: str, emotions: List[str], tags: List[str]) -> bool:
+        """
+        :return: False — запись уже посчитана или без даты
+        """
+        day = _day(when)
+        if day is None:
+            return False
+        cur = self._db.execute("INSERT OR IGNORE INTO counted (user, msg_id) VALUES (?, ?)", (user, msg_id))
+        if cur.rowcount == 0:
+            return False
+
+        emotions = list(dict.fromkeys(emotions))
+        tags = list(dict.fromkeys(tags))
+        self._db.execute(
+            "INSERT INTO note_days (user, day, count) VALUES (?, ?, 1)"
+            " ON CONFLICT (user, day) DO UPDATE SET count = count + 1",
+            (user, day),
+        )
+        self._db.executemany(
+            "INSERT INTO label_days (user, day, kind, label, count) VALUES (?, ?, ?, ?, 1)"
+            " ON CONFLICT (user, day, kind, label) DO UPDATE SET count = count + 1",
+            [(user, day, EMOTION, e) for e in emotions] + [(user, day, TAG, t) for t in tags],
+        )
+        self._db.executemany(
+            "INSERT INTO pair_days (user, day, emotion, tag, count) VALUES (?, ?, ?, ?, 1)"
+            " ON CONFLICT (user, day, emotion, tag) DO UPDATE SET count = count + 1",
+            [(user, day, e, t) for e, t in product(emotions, tags)],
+        )
+        return True
+
+    def add_note(self, *, user: str, msg_id: int, when: str, emotions: List[str], tags: List[str]) -> None:
+        """
+        Новая запись из _finish. Повтор того же msg_id не считается;
+        ошибка SQLite пишется в лог и не прерывает хендлер.
+        """
+        try:
+            with self._lock:
+                counted = self._count(user, msg_id, when, emotions, tags)
+                self._db.commit()
+        except sqlite3.Error as e:
+            self.stats.errors += 1
+            log.warning(f"NoteAggregates: can't count note {user}/{msg_id}: {e}")
+            return
+        if counted:
+            self.stats.notes += 1
+        else:
+            self.stats.duplicates += 1
+
+    def add_notes(self, user: str, notes: Iterable[Tuple[int, str, List[str], List[str]]]) -> int:
+        """
+        Много записей одной транзакцией (импорт истории); уже посчитанные msg_id пропускаются.
+
+        :param notes: [(msg_id, когда "YYYY-MM-DD HH:MM:SS", эмоции, теги)]
+        :return: сколько записей посчитано
+        """
+        count = total = 0
+        try:
+            with self._lock:
+                for msg_id, when, emotions, tags in notes:
+                    total += 1
+                    count += self._count(user, msg_id, when, emotions, tags)
+                self._db.commit()
+        except sqlite3.Error as e:
+            self._db.rollback()
+            self.stats.errors += 1
+            log.warning(f"NoteAggregates: can't count notes of {user}: {e}")
+            return 0
+        self.stats.notes += count
+        self.stats.duplicates += total - count
+        return count
+
+    def rebuild(self, user: str, notes: Iterable[Tuple[int, str, List[str], List[str]]]) -> int:
+        """
+        Пересчитывает счётчики пользователя из полной истории одной транзакцией:
+        до commit отчёты видят прежние значения.
+
+        :param notes: [(msg_id, когда "YYYY-MM-DD HH:MM:SS", эмоции, теги)]
+        :return: сколько записей посчитано
+        """
+        count = 0
+        with self._lock:
+            try:
+                for table in ("counted", "note_days", "label_days", "pair_days"):
+                    self._db.execute(f"DELETE FROM {table} WHERE user = ?", (user,))
+                for msg_id, when, emotions, tags in notes:
+                    count += self._count(user, msg_id, when, emotions, tags)
+                self._db.commit()
+            except BaseException:
+                self._db.rollback()
+                raise
+        self.stats.rebuilds += 1
+        log.info(f"NoteAggregates: rebuilt {user} from {count} notes")
+        return count
+
+    def _labels(self, user: str, kind: str, start: str, end: str) -> Dict[str, int]:
+        return dict(self._db.execute(
+            "SELECT label, SUM(count) FROM label_days"
+            " WHERE user = ? AND day >= ? AND day <= ? AND kind = ? GROUP BY label",
+            (user, start, end, kind),
+        ))
+
+    def _notes(self, user: str, start: str, end: str) -> int:
+        return self._db.execute(
+            "SELECT COALESCE(SUM(count), 0) FROM note_days WHERE user = ? AND day >= ? AND day <= ?",
+            (user, start, end),
+        ).fetchone()[0]
+
+    def report(self, user: str, today: date, days: int, top: int = 10, pairs: int = 5) -> StatsReport:
+        """
+        :param today: последний день окна (в часовом поясе бота)
+        :param days: длина окна в днях, считая today
+        :param top: сколько эмоций и тегов показать
+        :param pairs: сколько пар эмоция+тег показать
+        """
+        start = today - timedelta(days=days - 1)
+        prev_start, prev_end = start - timedelta(days=days), start - timedelta(days=1)
+        window = (start.isoformat(), today.isoformat())
+        previous = (prev_start.isoformat(), prev_end.isoformat())
+
+        def counts(kind: str) -> List[Count]:
+            current = self._labels(user, kind, *window)
+            before = self._labels(user, kind, *previous)
+            ranked = sorted(current.items(), key=lambda kv: (-kv[1], kv[0]))[:top]
+            return [Count(label=label, count=n, previous=before.get(label, 0)) for label, n in ranked]
+
+        self.stats.reports += 1
+        with self._lock:
+            return StatsReport(
+                start=start,
+                end=today,
+                notes=self._notes(user, *window),
+                previous_notes=self._notes(user, *previous),
+                emotions=counts(EMOTION),
+                tags=counts(TAG),
+                pairs=self._db.execute(
+                    "SELECT emotion, tag, SUM(count) AS n FROM pair_days"
+                    " WHERE user = ? AND day >= ? AND day <= ?"
+                    " GROUP BY emotion, tag ORDER BY n DESC, emotion, tag LIMIT ?",
+                    (user, *window, pairs),
+                ).fetchall(),
+            )
+
+
+_aggregates: Optional[NoteAggregates] = None
+_aggregates_lock = threading.Lock()
+
+
+def get_note_aggregates() -> NoteAggregates:
+    """
+    Общие на процесс счётчики: DATA/cache/notes_stats.sqlite3
+    """
+    global _aggregates
+    if _aggregates is None:
+        with _aggregates_lock:
+            if _aggregates is None:
+                _aggregates = NoteAggregates(path=DATA / "cache" / "notes_stats.sqlite3")
+    return _aggregates
@@ -0,0 +1,177 @@
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Iterable, Optional
+
+from src.config import config, log, DATA
+
+
+# chat_id для id, полученных из GAS: в таблице чата нет, id уникален в пределах пользователя
+ANY_CHAT = 0
+
+
+class NoteIndex:
+    """
+    Локальный индекс id записей (user, chat_id, message_id).
+
+    - _finish добавляет каждую новую запись
+    - warmup() загружает все id пользователя из GAS и помечает индекс пользователя полным
+    - для полного индекса промах означает "не запись" без запроса в GAS
+    - ответы GAS "не запись" запоминаются в памяти (ограниченный LRU)
+    - промах в памяти перепроверяется в SQLite: файл общий с воркерами и history_import,
+      их записи и полные индексы появляются там без перезапуска бота
+    """
+
+    def __init__(self, path: Optional[Path | str] = None, negative_size: int = 10_000) -> None:
+        """
+        :param path: путь к SQLite-файлу; None — только память
+        :param negative_size: сколько отрицательных ответов GAS помнить
+        """
+        self.negative_size = negative_size
+
+        self._lock = threading.Lock()
+        self._notes: set[tuple[str, int, int]] = set()
+        self._complete: set[str] = set()
+        self._negative: OrderedDict[tuple[str, int, int], None] = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+
+        if path is not None:
+            path = Path(path)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(path), check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS notes ("
+                " user TEXT NOT NULL,"
+                " chat_id INTEGER NOT NULL,"
+                " msg_id INTEGER NOT NULL,"
+                " PRIMARY KEY (user, chat_id, msg_id))"
+            )
+            self._db.execute("CREATE TABLE IF NOT EXISTS complete_users (user TEXT PRIMARY KEY)")
+            self._db.commit()
+
+            self._notes.update(self._db.execute("SELECT user, chat_id, msg_id FROM notes"))
+            self._complete.update(u for (u,) in self._db.execute("SELECT user FROM complete_users"))
+
+    def __len__(self) -> int:
+        return len(self._notes)
+
+    def add(self, user: str, chat_id: int, msg_id: int) -> None:
+        self.add_many(user, [msg_id], chat_id=chat_id)
+
+    def add_many(self, user: str, msg_ids: Iterable[int], chat_id: int = ANY_CHAT) -> None:
+        keys = [(user, chat_id, int(mid)) for mid in msg_ids]
+        with self._lock:
+            self._notes.update(keys)
+            for key in keys:
+                self._negative.pop(key, None)
+                self._negative.pop((user, ANY_CHAT, key[2]), None)
+            if self._db is not None:
+                self._db.executemany("INSERT OR IGNORE INTO notes (user, chat_id, msg_id) VALUES (?, ?, ?)", keys)
+                self._db.commit()
+
+    def mark_complete(self, user: str) -> None:
+        """В индексе есть все записи пользователя: промахи можно не проверять в GAS."""
+        with self._lock:
+            self._complete.add(user)
+            if self._db is not None:
+                self._db.execute("INSERT OR IGNORE INTO complete_users (user) VALUES (?)", (user,))
+                self._db.commit()
+
+    def mark_missing(self, user: str, chat_id: int, msg_id: int) -> None:
+        """GAS ответил, что такой записи нет."""
+        key = (user, chat_id, msg_id)
+        with self._lock:
+            self._negative[key] = None
+            self._negative.move_to_end(key)
+            while len(self._negative) > self.negative_size:
+                self._negative.popitem(last=False)
+
+    def lookup(self, user: str, chat_id: int, msg_id: int) -> Optional[bool]:
+        """
+        :return: True — запись есть; False — точно не запись; None — неизвестно, надо спросить GAS
+        """
+        if (user, chat_id, msg_id) in self._notes or (user, ANY_CHAT, msg_id) in self._notes:
+            return True
+        if (user, chat_id, msg_id) in self._negative:
+            return False
+        if self._db is not None and self._load_stored(user, chat_id, msg_id):
+            return True
+        if user in self._complete:
+            return False
+        return None
+
+    def _load_stored(self, user: str, chat_id: int, msg_id: int) -> bool:
+        """
+        Ищет запись в SQLite (по первичному ключу) и заодно подхватывает отметку "индекс полный",
+        сделанную другим процессом.
+
+        :return: True — запись есть (теперь и в памяти)
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT chat_id FROM notes WHERE user = ? AND chat_id IN (?, ?) AND msg_id = ? LIMIT 1",
+                (user, chat_id, ANY_CHAT, msg_id),
+            ).fetchone()
+            if row is not None:
+                self._notes.add((user, row[0], msg_id))
+                return True
+            if user not in self._complete and self._db.execute(
+                "SELECT 1 FROM complete_users WHERE user = ?", (user,)
+            ).fetchone():
+                self._complete.add(user)
+        return False
+
+
+def warmup(index: NoteIndex, users: Iterable[str]) -> None:
+    """
+    Загружает id записей пользователей из GAS (action=list_ids).
+    """
+    from src.integrations.gas_client import get_gas_client
+
+    gas = get_gas_client()
+    for user in users:
+        ids = gas.list_ids(user=user)
+        if ids is None:
+            log.warning(f"NoteIndex warmup: can't load ids for {user}")
+            continue
+        index.add_many(user, ids)
+        index.mark_complete(user)
+        log.info(f"NoteIndex warmup: {user} -> {len(ids)} ids")
+
+
+def known_users() -> list[str]:
+    """Пользователи, у которых есть папка DATA/<user_folder>."""
+    base = DATA
+    if not base.exists():
+        return []
+    return sorted(p.name for p in base.iterdir() if p.is_dir() and p.name != "cache")
+
+
+_index: Optional[NoteIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_note_index() -> NoteIndex:
+    """
+    Общий на процесс индекс: DATA/cache/notes_index.sqlite3
+    """
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = NoteIndex(path=DATA / "cache" / "notes_index.sqlite3")
+    return _index
+
+
+def start_warmup() -> None:
+    """Фоновая загрузка id из GAS, если включена в конфиге."""
+    if not config.notes_index.warmup:
+        return
+    threading.Thread(
+        target=warmup,
+        args=(get_note_index(), config.notes_index.users or known_users()),
+        name="NoteIndexWarmup",
+        daemon=True,
+    ).start()
@@ -0,0 +1,423 @@
+import html
+import re
+import sqlite3
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from src.config import config, log, DATA
+from src.core.note_index import ANY_CHAT, known_users
+
+
+# границы совпадения в snippet(): символы, которых не бывает в тексте записи
+_MARK_START = "\x02"
+_MARK_END = "\x03"
+
+_WORD_RE = re.compile(r"\w+", flags=re.UNICODE)
+
+# форматы колонки "Когда": как пишет бот (_format_dt) и как отдаёт GAS
+_WHEN_FORMATS = ("%Y-%m-%d %H:%M:%S", "%d.%m.%Y %H:%M:%S")
+
+
+@dataclass(frozen=True)
+class SearchHit:
+    msg_id: int
+    chat_id: int
+    when: str
+    emotions: List[str]
+    tags: List[str]
+    snippet: str  # HTML: совпадения в <b>, остальное экранировано
+
+
+@dataclass(frozen=True)
+class SearchPage:
+    query: str
+    total: int
+    offset: int
+    hits: List[SearchHit]
+
+
+@dataclass
+class NoteSearchStats:
+    queries: int = 0
+    notes: int = 0
+    tracks: int = 0
+    backfilled: int = 0
+    errors: int = 0
+
+
+@dataclass
+class _Note:
+    user: str
+    msg_id: int
+    when: str
+    text: str
+    chat_id: int = ANY_CHAT
+    emotions: List[str] = field(default_factory=list)
+    tags: List[str] = field(default_factory=list)
+    tracks: List[str] = field(default_factory=list)
+
+
+def normalize_when(value: str) -> str:
+    """
+    "Когда" в виде "YYYY-MM-DD HH:MM:SS": такие строки сортируются как даты.
+    Неизвестный формат возвращается как есть.
+    """
+    value = (value or "").strip()
+    for fmt in _WHEN_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).strftime(_WHEN_FORMATS[0])
+        except ValueError:
+            continue
+    return value
+
+
+def match_expression(query: str) -> str:
+    """
+    Запрос пользователя -> выражение FTS5: все слова обязательны, последнее — префиксом.
+    Слова берутся в кавычки, поэтому операторы FTS5 (OR, NEAR, -, *) в запросе — просто текст.
+
+    :return: "" — в запросе нет ни одного слова
+    """
+    words = _WORD_RE.findall(query or "")
+    if not words:
+        return ""
+    terms = [f'"{w}"' for w in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+def _split(value: str) -> List[str]:
+    return [v for v in (value or "").split("\n") if v]
+
+
+def _render_snippet(raw: str) -> str:
+    return html.escape(raw).replace(_MARK_START, "<b>").replace(_MARK_END, "</b>")
+
+
+class NoteSearch:
+    """
+    Локальная копия записей для полнотекстового поиска (SQLite FTS5, ранжирование bm25).
+
+    - _finish добавляет каждую новую запись, on_reply — добавленные треки
+    - backfill() догружает записи, сделанные до появления индекса, из GAS (action=list_notes)
+    - search() работает только с локальной базой: GAS и Telegram не трогает
+    """
+
+    # веса колонок bm25: text, emotions, tags, tracks
+    WEIGHTS = (1.0, 2.0, 2.0, 0.5)
+
+    def __init__(self, path: Optional[Path | str] = None) -> None:
+        """
+        :param path: путь к SQLite-файлу; None — только память
+        """
+        self.stats = NoteSearchStats()
+
+        self._lock = threading.Lock()
+        if path is None:
+            target = ":memory:"
+        else:
+            path = Path(path)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            target = str(path)
+        # timeout: файл делят процессы-воркеры (sharding), запись другого процесса ждём, а не падаем
+        self._db = sqlite3.connect(target, check_same_thread=False, timeout=5)
+        if path is not None:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            # индекс восстановим из GAS: fsync на каждую запись из _finish не нужен
+            self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS notes (
+                user TEXT NOT NULL,
+                msg_id INTEGER NOT NULL,
+                chat_id INTEGER NOT NULL DEFAULT 0,
+                "when" TEXT NOT NULL,
+                text TEXT NOT NULL,
+                emotions TEXT NOT NULL DEFAULT '',
+                tags TEXT NOT NULL DEFAULT '',
+                tracks TEXT NOT NULL DEFAULT '',
+                PRIMARY KEY (user, msg_id)
+            );
+            CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(
+                text, emotions, tags, tracks,
+                content='notes', content_rowid='rowid',
+                tokenize='unicode61 remove_diacritics 2'
+            );
+            CREATE TRIGGER IF NOT EXISTS notes_ai AFTER INSERT ON notes BEGIN
+                INSERT INTO notes_fts (rowid, text, emotions, tags, tracks)
+                VALUES (new.rowid, new.text, new.emotions, new.tags, new.tracks);
+            END;
+            CREATE TRIGGER IF NOT EXISTS notes_ad AFTER DELETE ON notes BEGIN
+                INSERT INTO notes_fts (notes_fts, rowid, text, emotions, tags, tracks)
+                VALUES ('delete', old.rowid, old.text, old.emotions, old.tags, old.tracks);
+            END;
+            CREATE TRIGGER IF NOT EXISTS notes_au AFTER UPDATE ON notes BEGIN
+                INSERT INTO notes_fts (notes_fts, rowid, text, emotions, tags, tracks)
+                VALUES ('delete', old.rowid, old.text, old.emotions, old.tags, old.tracks);
+                INSERT INTO notes_fts (rowid, text, emotions, tags, tracks)
+                VALUES (new.rowid, new.text, new.emotions, new.tags, new.tracks);
+            END;
+            CREATE TABLE IF NOT EXISTS backfill (user TEXT PRIMARY KEY, next_row INTEGER NOT NULL);
+            """
+        )
+        self._db.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT count(*) FROM notes").fetchone()[0]
+
+    def _upsert(self, notes: Iterable[_Note]) -> int:
+        rows = [
+            (n.user, n.msg_id, n.chat_id, normalize_when(n.when), n.text,
+             "\n".join(n.emotions), "\n".join(n.tags), "\n".join(n.tracks))
+            for n in notes
+        ]
+        # chat_id из GAS неизвестен (0): не затираем им настоящий; пустой плейлист из GAS — треки из on_reply
+        self._db.executemany(
+            'INSERT INTO notes (user, msg_id, chat_id, "when", text, emotions, tags, tracks)'
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT (user, msg_id) DO UPDATE SET"
+            "  chat_id = CASE WHEN excluded.chat_id != 0 THEN excluded.chat_id ELSE notes.chat_id END,"
+            '  "when" = excluded."when", text = excluded.text,'
+            "  emotions = excluded.emotions, tags = excluded.tags,"
+            "  tracks = CASE WHEN excluded.tracks != '' THEN excluded.tracks ELSE notes.tracks END",
+            rows,
+        )
+        return len(rows)
+
+    def add_note(
+        self,
+        *,
+        user: str,
+        chat_id: int,
+        msg_id: int,
+        when: str,
+        text: str,
+        emotions: List[str],
+        tags: List[str],
+    ) -> None:
+        """
+        Новая запись из _finish. Ошибка SQLite пишется в лог и не прерывает хендлер.
+        """
+        note = _Note(user=user, msg_id=msg_id, chat_id=chat_id, when=when, text=text, emotions=emotions, tags=tags)
+        try:
+            with self._lock:
+                self._upsert([note])
+                self._db.commit()
+            self.stats.notes += 1
+        except sqlite3.Error as e:
+            self.stats.errors += 1
+            log.warning(f"NoteSearch: can't index note {user}/{msg_id}: {e}")
+
+    def add_notes(self, user: str, chat_id: int, notes: Iterable[Tuple[int, str, str, List[str], List[str]]]) -> int:
+        """
+        Много записей одной транзакцией (импорт истории).
+
+        :param notes: [(msg_id, когда, текст, эмоции, теги)]
+        :return: сколько записей принято; 0 — ошибка SQLite (в логе)
+        """
+        batch = [
+            _Note(user=user, msg_id=msg_id, chat_id=chat_id, when=when, text=text, emotions=emotions, tags=tags)
+            for msg_id, when, text, emotions, tags in notes
+        ]
+        try:
+            with self._lock:
+                count = self._upsert(batch)
+                self._db.commit()
+        except sqlite3.Error as e:
+            self.stats.errors += 1
+            log.warning(f"NoteSearch: can't index {len(batch)} notes of {user}: {e}")
+            return 0
+        self.stats.notes += count
+        return count
+
+    def add_tracks(self, *, user: str, msg_id: int, titles: List[str]) -> None:
+        """
+        Треки из on_reply ("Исполнитель - Название"), дубли пропускаются.
+        Записи нет в индексе (старая, ещё не загруженная backfill) — треки придут вместе с ней из GAS.
+        """
+        try:
+            with self._lock:
+                row = self._db.execute(
+                    "SELECT tracks FROM notes WHERE user = ? AND msg_id = ?", (user, msg_id)
+                ).fetchone()
+                if row is None:
+                    return
+                tracks = _split(row[0])
+                new = [t for t in dict.fromkeys(titles) if t and t not in tracks]
+                if not new:
+                    return
+                self._db.execute(
+                    "UPDATE notes SET tracks = ? WHERE user = ? AND msg_id = ?",
+                    ("\n".join(tracks + new), user, msg_id),
+                )
+                self._db.commit()
+            self.stats.tracks += len(new)
+        except sqlite3.Error as e:
+            self.stats.errors += 1
+            log.warning(f"NoteSearch: can't index tracks {user}/{msg_id}: {e}")
+
+    def add_from_gas(self, user: str, records: Iterable[Dict[str, Any]], next_row: int) -> int:
+        """
+        Записи из GAS list_notes и позиция, с которой продолжить, — одной транзакцией:
+        после падения backfill продолжит с последней сохранённой страницы.
+
+        :return: сколько записей принято
+        """
+        notes = []
+        for rec in records:
+            try:
+                msg_id = int(rec.get("id"))
+            except (TypeError, ValueError):
+                continue
+            notes.append(_Note(
+                user=user,
+                msg_id=msg_id,
+                when=str(rec.get("when") or ""),
+                text=str(rec.get("what") or ""),
+                emotions=[str(v) for v in rec.get("emotions") or []],
+                tags=[str(v) for v in rec.get("tags") or []],
+                tracks=[str(v) for v in rec.get("tracks") or []],
+            ))
+        with self._lock:
+            count = self._upsert(notes)
+            self._db.execute(
+                "INSERT INTO backfill (user, next_row) VALUES (?, ?)"
+                " ON CONFLICT (user) DO UPDATE SET next_row = excluded.next_row",
+                (user, next_row),
+            )
+            self._db.commit()
+        self.stats.backfilled += count
+        return count
+
+    def backfill_position(self, user: str) -> int:
+        """С какой строки таблицы пользователя продолжить backfill."""
+        with self._lock:
+            row = self._db.execute("SELECT next_row FROM backfill WHERE user = ?", (user,)).fetchone()
+        return row[0] if row else 0
+
+    def history(self, user: str) -> List[Tuple[int, str, List[str], List[str]]]:
+        """
+        Все записи пользователя в индексе: [(msg_id, когда, эмоции, теги)] по времени.
+        """
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT msg_id, "when", emotions, tags FROM notes WHERE user = ? ORDER BY "when", msg_id', (user,)
+            ).fetchall()
+        return [(msg_id, when, _split(emotions), _split(tags)) for msg_id, when, emotions, tags in rows]
+
+    def search(self, user: str, query: str, offset: int = 0, limit: int = 5) -> SearchPage:
+        """
+        Записи пользователя, в тексте, эмоциях, тегах или треках которых есть все слова запроса.
+        Сначала самые релевантные (bm25), при равенстве — более новые.
+        """
+        expression = match_expression(query)
+        if not expression:
+            return SearchPage(query=query, total=0, offset=offset, hits=[])
+
+        weights = ", ".join(str(w) for w in self.WEIGHTS)
+        self.stats.queries += 1
+        # CROSS JOIN: сначала совпадения FTS, потом их строки notes; иначе SQLite перебирает все записи пользователя
+        with self._lock:
+            total = self._db.execute(
+                "SELECT count(*) FROM notes_fts CROSS JOIN notes ON notes.rowid = notes_fts.rowid"
+                " WHERE notes_fts MATCH ? AND notes.user = ?",
+                (expression, user),
+            ).fetchone()[0]
+            rows = self._db.execute(
+                'SELECT notes.msg_id, notes.chat_id, notes."when", notes.emotions, notes.tags,'
+                f" snippet(notes_fts, -1, '{_MARK_START}', '{_MARK_END}', '…', 12)"
+                " FROM notes_fts CROSS JOIN notes ON notes.rowid = notes_fts.rowid"
+                " WHERE notes_fts MATCH ? AND notes.user = ?"
+                f' ORDER BY bm25(notes_fts, {weights}), notes."when" DESC'
+                " LIMIT ? OFFSET ?",
+                (expression, user, limit, offset),
+            ).fetchall()
+
+        hits = [
+            SearchHit(
+                msg_id=msg_id,
+                chat_id=chat_id,
+                when=when,
+                emotions=_split(emotions),
+                tags=_split(tags),
+                snippet=_render_snippet(snippet),
+            )
+            for msg_id, chat_id, when, emotions, tags, snippet in rows
+        ]
+        return SearchPage(query=query, total=total, offset=offset, hits=hits)
+
+
+def backfill(search: NoteSearch, users: Iterable[str], page_size: int = 500) -> Dict[str, int]:
+    """
+    Догружает записи пользователей из GAS страницами (action=list_notes), начиная с сохранённой позиции.
+    Уже загруженные строки повторно не запрашиваются; сбой GAS — продолжим при следующем запуске.
+
+    :return: {пользователь: сколько записей загружено}
+    """
+    from src.integrations.gas_client import get_gas_client
+
+    gas = get_gas_client()
+    result: Dict[str, int] = {}
+    for user in users:
+        position = search.backfill_position(user)
+        loaded = 0
+        while True:
+            page = gas.list_notes(user=user, offset=position, limit=page_size)
+            if page is None:
+                log.warning(f"NoteSearch backfill: can't load notes for {user} from row {position}")
+                break
+            records, next_row = page
+            loaded += search.add_from_gas(user, records, next_row)
+            # записей может быть меньше page_size и в середине листа: GAS пропускает строки без id;
+            # конец — когда позиция не сдвинулась или пустой оказалась неполная страница
+            if next_row <= position or (not records and next_row - position < page_size):
+                break
+            position = next_row
+        log.info(f"NoteSearch backfill: {user} -> {loaded} notes")
+        result[user] = loaded
+    return result
+
+
+def _backfill_job(users: List[str], page_size: int) -> None:
+    from src.core.note_aggregates import get_note_aggregates
+
+    search = get_note_search()
+    loaded = backfill(search, users, page_size)
+    # в индексе появилась история: счётчики /stats пересчитываются из неё целиком
+    aggregates = get_note_aggregates()
+    for user, count in loaded.items():
+        if count:
+            aggregates.rebuild(user, search.history(user))
+
+
+_search: Optional[NoteSearch] = None
+_search_lock = threading.Lock()
+
+
+def get_note_search() -> NoteSearch:
+    """
+    Общий на процесс индекс: DATA/cache/notes_search.sqlite3
+    """
+    global _search
+    if _search is None:
+        with _search_lock:
+            if _search is None:
+                _search = NoteSearch(path=DATA / "cache" / "notes_search.sqlite3")
+    return _search
+
+
+def start_backfill() -> None:
+    """Фоновая загрузка старых записей из GAS, если включена в конфиге."""
+    cfg = config.search
+    if not cfg.backfill:
+        return
+    threading.Thread(
+        target=_backfill_job,
+        args=(cfg.users or known_users(), cfg.backfill_page),
+        name="NoteSearchBackfill",
+        daemon=True,
+    ).start()
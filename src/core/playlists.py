@@ -0,0 +1,241 @@
+import html
+import sqlite3
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from src.config import DATA
+
+
+# Telegram ограничивает текст сообщения 4096 символами (после разбора HTML, в UTF-16)
+MAX_MESSAGE_LENGTH = 4096
+
+PLAYLIST_HEADER = "\n\nПлейлист:"
+CONTINUATION_HEADER = "Плейлист (продолжение):"
+
+
+def visible_length(text: str) -> int:
+    """Длина текста так, как её считает Telegram: в единицах UTF-16."""
+    return len(text.encode("utf-16-le")) // 2
+
+
+@dataclass(frozen=True)
+class Track:
+    track_id: int
+    link: str
+    title: str  # "Исполнитель - Название"
+
+    @property
+    def html(self) -> str:
+        return f'<a href="{html.escape(self.link)}">{html.escape(self.title, quote=False)}</a>'
+
+
+@dataclass
+class PlaylistPart:
+    """
+    Одно сообщение плейлиста: part 0 — сама запись, дальше — сообщения-продолжения.
+    """
+    part: int
+    message_id: Optional[int]  # None — продолжение ещё не отправлено
+    text: str  # HTML целиком, как его надо отправить в edit_message_text/send_message
+    length: int  # видимая длина text
+
+
+class PlaylistStore:
+    """
+    Плейлисты записей: какие треки уже добавлены и текущий текст каждого сообщения.
+
+    - дубли отсекаются по id трека до запроса в Яндекс Музыку
+    - новые треки дописываются в конец последнего сообщения, старый текст не перестраивается
+    - не влезает в MAX_MESSAGE_LENGTH — начинается сообщение-продолжение
+    - добавление в два шага: prepare_append считает новые тексты, commit_append сохраняет их,
+      когда сообщения в Telegram уже изменены — иначе не показанные треки считались бы показанными;
+      между шагами запись держат под editing(), чтобы два ответа не дописали в один и тот же текст
+    """
+
+    def __init__(self, path: Optional[Path | str] = None) -> None:
+        """
+        :param path: путь к SQLite-файлу; None — только память
+        """
+        self._lock = threading.Lock()
+        # (chat_id, note_id) -> [блокировка записи, сколько потоков её держат или ждут]
+        self._editing: Dict[tuple[int, int], list] = {}
+        if path is None:
+            target = ":memory:"
+        else:
+            path = Path(path)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            target = str(path)
+        self._db = sqlite3.connect(target, check_same_thread=False, timeout=5)
+        if path is not None:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            # WAL + NORMAL: без fsync на каждую правку, файл не портится и при падении процесса
+            self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS playlist_parts (
+                chat_id INTEGER NOT NULL,
+                note_id INTEGER NOT NULL,
+                part INTEGER NOT NULL,
+                message_id INTEGER,
+                text TEXT NOT NULL,
+                length INTEGER NOT NULL,
+                PRIMARY KEY (chat_id, note_id, part)
+            );
+            CREATE TABLE IF NOT EXISTS playlist_tracks (
+                chat_id INTEGER NOT NULL,
+                note_id INTEGER NOT NULL,
+                track_id INTEGER NOT NULL,
+                link TEXT NOT NULL,
+                title TEXT NOT NULL,
+                PRIMARY KEY (chat_id, note_id, track_id)
+            );
+            """
+        )
+        self._db.commit()
+
+    def is_started(self, chat_id: int, note_id: int) -> bool:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT 1 FROM playlist_parts WHERE chat_id = ? AND note_id = ? AND part = 0", (chat_id, note_id)
+            ).fetchone()
+        return row is not None
+
+    def start(self, chat_id: int, note_id: int, text: str, length: int, track_ids: Iterable[int] = ()) -> None:
+        """
+        Первое обращение к записи: её текущий текст и треки, которые в ней уже есть
+        (записи, дополненные до появления этого хранилища). Повторный вызов ничего не меняет.
+
+        :param text: HTML записи, уже с заголовком PLAYLIST_HEADER
+        :param length: видимая длина text
+        """
+        with self._lock:
+            self._db.execute(
+                "INSERT OR IGNORE INTO playlist_parts (chat_id, note_id, part, message_id, text, length)"
+                " VALUES (?, ?, 0, ?, ?, ?)",
+                (chat_id, note_id, note_id, text, length),
+            )
+            self._db.executemany(
+                "INSERT OR IGNORE INTO playlist_tracks (chat_id, note_id, track_id, link, title) VALUES (?, ?, ?, '', '')",
+                [(chat_id, note_id, track_id) for track_id in track_ids],
+            )
+            self._db.commit()
+
+    def _known(self, chat_id: int, note_id: int, track_ids: List[int]) -> set[int]:
+        placeholders = ",".join("?" * len(track_ids))
+        return {
+            track_id for (track_id,) in self._db.execute(
+                f"SELECT track_id FROM playlist_tracks WHERE chat_id = ? AND note_id = ? AND track_id IN ({placeholders})",
+                (chat_id, note_id, *track_ids),
+            )
+        }
+
+    def new_track_ids(self, chat_id: int, note_id: int, track_ids: List[int]) -> List[int]:
+        """
+        :return: id из track_ids, которых ещё нет в плейлисте (без повторов, в том же порядке)
+        """
+        track_ids = list(dict.fromkeys(track_ids))
+        if not track_ids:
+            return []
+        with self._lock:
+            known = self._known(chat_id, note_id, track_ids)
+        return [track_id for track_id in track_ids if track_id not in known]
+
+    @contextmanager
+    def editing(self, chat_id: int, note_id: int) -> Iterator[None]:
+        """
+        Один поток на запись от prepare_append до commit_append: иначе второй ответ посчитал бы текст
+        от того же последнего сообщения, и его commit_append затёр бы треки первого.
+        """
+        key = (chat_id, note_id)
+        with self._lock:
+            entry = self._editing.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._editing[key]
+
+    def prepare_append(
+        self, chat_id: int, note_id: int, tracks: List[Track],
+    ) -> tuple[List[PlaylistPart], List[Track]]:
+        """
+        Тексты сообщений плейлиста с треками, дописанными в конец. Ничего не сохраняет: после правки
+        сообщений вызовите commit_append, при ошибке — ничего (плейлист останется прежним).
+        Вызывать под editing(chat_id, note_id) вместе с правкой и commit_append.
+
+        :return: (изменённые сообщения по порядку, добавленные треки — без тех, что уже были)
+        """
+        with self._lock:
+            known = self._known(chat_id, note_id, [t.track_id for t in tracks]) if tracks else set()
+            added: List[Track] = []
+            for track in tracks:
+                if track.track_id not in known:
+                    known.add(track.track_id)
+                    added.append(track)
+            if not added:
+                return [], []
+
+            row = self._db.execute(
+                "SELECT part, message_id, text, length FROM playlist_parts"
+                " WHERE chat_id = ? AND note_id = ? ORDER BY part DESC LIMIT 1",
+                (chat_id, note_id),
+            ).fetchone()
+            last = PlaylistPart(*row)
+            changed = [last]
+            for track in added:
+                line_length = 1 + visible_length(track.title)
+                if last.length + line_length > MAX_MESSAGE_LENGTH:
+                    last = PlaylistPart(
+                        part=last.part + 1,
+                        message_id=None,
+                        text=CONTINUATION_HEADER,
+                        length=visible_length(CONTINUATION_HEADER),
+                    )
+                    changed.append(last)
+                last.text += "\n" + track.html
+                last.length += line_length
+        # последнее сообщение не менялось, если все треки ушли в продолжения
+        if changed[0].text == row[2]:
+            changed = changed[1:]
+        return changed, added
+
+    def commit_append(self, chat_id: int, note_id: int, parts: List[PlaylistPart], added: List[Track]) -> None:
+        """
+        Сообщения из prepare_append изменены в Telegram: сохранить их тексты и треки.
+
+        :param parts: из prepare_append; у отправленных продолжений — уже с message_id
+        """
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO playlist_parts (chat_id, note_id, part, message_id, text, length)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                [(chat_id, note_id, p.part, p.message_id, p.text, p.length) for p in parts],
+            )
+            self._db.executemany(
+                "INSERT OR IGNORE INTO playlist_tracks (chat_id, note_id, track_id, link, title) VALUES (?, ?, ?, ?, ?)",
+                [(chat_id, note_id, t.track_id, t.link, t.title) for t in added],
+            )
+            self._db.commit()
+
+
+_store: Optional[PlaylistStore] = None
+_store_lock = threading.Lock()
+
+
+def get_playlist_store() -> PlaylistStore:
+    """
+    Общее на процесс хранилище: DATA/cache/playlists.sqlite3
+    """
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = PlaylistStore(path=DATA / "cache" / "playlists.sqlite3")
+    return _store
@@ -0,0 +1,265 @@
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import List, Optional, Set
+
+from src.config import config, DATA
+
+
+@dataclass
+class UserSession:
+    text: str
+    first_message_ts: int  # message.date (unix)
+    emotions_idx: Set[int] = field(default_factory=set)
+    tags_idx: Set[int] = field(default_factory=set)
+    step: str = "emotions"  # emotions | tags
+    keyboard_message_id: Optional[int] = None
+    thread_id: Optional[int] = None
+
+    # ВАЖНО: теперь значения зависят от юзера
+    emotions_values: List[str] = field(default_factory=list)
+    tags_values: List[str] = field(default_factory=list)
+
+    # полезно для логов/отладки
+    user_folder: str = ""
+
+    # версия констант, из которых взяты *_values (ключ кеша клавиатур)
+    constants_version: int = 0
+
+    # что сейчас показано на клавиатуре текущего шага
+    page: int = 0
+    letter: str = ""  # фильтр по первой букве
+    picking_letter: bool = False
+
+    def reset_view(self) -> None:
+        self.page = 0
+        self.letter = ""
+        self.picking_letter = False
+
+    def to_json(self) -> str:
+        data = asdict(self)
+        data["emotions_idx"] = sorted(self.emotions_idx)
+        data["tags_idx"] = sorted(self.tags_idx)
+        return json.dumps(data, ensure_ascii=False)
+
+    @classmethod
+    def from_json(cls, raw: str) -> "UserSession":
+        data = json.loads(raw)
+        data["emotions_idx"] = set(data.get("emotions_idx") or [])
+        data["tags_idx"] = set(data.get("tags_idx") or [])
+        return cls(**data)
+
+
+# (chat_id, user_id, thread_id): двое в одной группе/теме не перетирают сессии друг друга
+SessionKey = tuple[int, int, Optional[int]]
+
+
+@dataclass
+class SessionStats:
+    """Счётчики хранилища сессий"""
+    hits: int = 0
+    misses: int = 0
+    expired: int = 0
+    evicted: int = 0
+
+
+class SessionStore(ABC):
+    """
+    Хранилище незавершённых записей.
+
+    Сессия — обычный объект: после изменения её надо сохранить через set(),
+    иначе SQLite-бэкенд изменений не увидит.
+    """
+
+    def __init__(self, ttl: int, max_size: int) -> None:
+        """
+        :param ttl: через сколько секунд без изменений сессия удаляется
+        :param max_size: максимум сессий; лишние удаляются начиная с самых давно изменённых
+        """
+        self.ttl = ttl
+        self.max_size = max_size
+        self.stats = SessionStats()
+
+    @abstractmethod
+    def get(self, key: SessionKey) -> Optional[UserSession]:
+        ...
+
+    @abstractmethod
+    def set(self, key: SessionKey, sess: UserSession) -> None:
+        ...
+
+    @abstractmethod
+    def delete(self, key: SessionKey) -> None:
+        ...
+
+    @abstractmethod
+    def __len__(self) -> int:
+        ...
+
+
+class MemorySessionStore(SessionStore):
+    """Сессии в памяти процесса: TTL + LRU."""
+
+    def __init__(self, ttl: int = 24 * 3600, max_size: int = 10_000) -> None:
+        super().__init__(ttl=ttl, max_size=max_size)
+        self._lock = threading.Lock()
+        self._items: OrderedDict[SessionKey, tuple[float, UserSession]] = OrderedDict()
+
+    def get(self, key: SessionKey) -> Optional[UserSession]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self.stats.misses += 1
+                return None
+            touched_at, sess = item
+            if time.time() - touched_at >= self.ttl:
+                del self._items[key]
+                self.stats.expired += 1
+                self.stats.misses += 1
+                return None
+            self.stats.hits += 1
+            return sess
+
+    def set(self, key: SessionKey, sess: UserSession) -> None:
+        now = time.time()
+        with self._lock:
+            self._items[key] = (now, sess)
+            self._items.move_to_end(key)
+            self._evict(now)
+
+    def delete(self, key: SessionKey) -> None:
+        with self._lock:
+            self._items.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def _evict(self, now: float) -> None:
+        # самые давно изменённые — в начале
+        while self._items:
+            key, (touched_at, _) = next(iter(self._items.items()))
+            if now - touched_at >= self.ttl:
+                self.stats.expired += 1
+            elif len(self._items) > self.max_size:
+                self.stats.evicted += 1
+            else:
+                break
+            del self._items[key]
+
+
+class SqliteSessionStore(SessionStore):
+    """
+    Сессии в SQLite: переживают рестарт, файл можно делить между несколькими процессами.
+    """
+
+    # чистка просроченных не на каждую запись
+    TRIM_EVERY = 100
+
+    def __init__(self, path: Path | str, ttl: int = 24 * 3600, max_size: int = 10_000) -> None:
+        super().__init__(ttl=ttl, max_size=max_size)
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._db = sqlite3.connect(str(path), check_same_thread=False, timeout=10)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " key TEXT PRIMARY KEY,"
+            " data TEXT NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS sessions_updated_at ON sessions(updated_at)")
+        self._db.commit()
+
+    @staticmethod
+    def _key(key: SessionKey) -> str:
+        chat_id, user_id, thread_id = key
+        return f"{chat_id}:{user_id}:{'' if thread_id is None else thread_id}"
+
+    def get(self, key: SessionKey) -> Optional[UserSession]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT data, updated_at FROM sessions WHERE key = ?", (self._key(key),)
+            ).fetchone()
+            if row is None:
+                self.stats.misses += 1
+                return None
+            data, updated_at = row
+            if time.time() - updated_at >= self.ttl:
+                self._db.execute("DELETE FROM sessions WHERE key = ?", (self._key(key),))
+                self._db.commit()
+                self.stats.expired += 1
+                self.stats.misses += 1
+                return None
+            self.stats.hits += 1
+        return UserSession.from_json(data)
+
+    def set(self, key: SessionKey, sess: UserSession) -> None:
+        data = sess.to_json()
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO sessions (key, data, updated_at) VALUES (?, ?, ?)",
+                (self._key(key), data, now),
+            )
+            self._db.commit()
+            self._writes += 1
+            if self._writes >= self.TRIM_EVERY:
+                self._writes = 0
+                self._trim(now)
+
+    def delete(self, key: SessionKey) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM sessions WHERE key = ?", (self._key(key),))
+            self._db.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            (count,) = self._db.execute("SELECT COUNT(*) FROM sessions").fetchone()
+        return count
+
+    def _trim(self, now: float) -> None:
+        cur = self._db.execute("DELETE FROM sessions WHERE updated_at < ?", (now - self.ttl,))
+        self.stats.expired += cur.rowcount
+
+        (count,) = self._db.execute("SELECT COUNT(*) FROM sessions").fetchone()
+        if count > self.max_size:
+            cur = self._db.execute(
+                "DELETE FROM sessions WHERE key IN "
+                "(SELECT key FROM sessions ORDER BY updated_at LIMIT ?)",
+                (count - self.max_size,),
+            )
+            self.stats.evicted += cur.rowcount
+        self._db.commit()
+
+
+_store: Optional[SessionStore] = None
+_store_lock = threading.Lock()
+
+
+def get_session_store() -> SessionStore:
+    """
+    Общее на процесс хранилище сессий (бэкенд — config.sessions.backend).
+    """
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                cfg = config.sessions
+                if cfg.backend == "sqlite":
+                    _store = SqliteSessionStore(
+                        path=cfg.path or DATA / "cache" / "sessions.sqlite3",
+                        ttl=cfg.ttl,
+                        max_size=cfg.max_size,
+                    )
+                else:
+                    _store = MemorySessionStore(ttl=cfg.ttl, max_size=cfg.max_size)
+    return _store
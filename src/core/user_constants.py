@@ -0,0 +1,133 @@
+import itertools
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from src.config import config, log, DATA
+from src.common.readers import txt_read
+
+
+# (mtime_ns, size) файла или None, если файла нет
+FileSignature = Optional[tuple[int, int]]
+
+# начинаем с текущего времени в мс: версии не повторяются и после рестарта
+# (важно для сессий, переживших рестарт в SQLite)
+_versions = itertools.count(int(time.time() * 1000))
+
+
+@dataclass(frozen=True)
+class UserConstants:
+    """Эмоции/теги пользователя; version меняется при каждой перезагрузке с диска"""
+    emotions: tuple[str, ...]
+    tags: tuple[str, ...]
+    version: int
+
+
+@dataclass
+class _Entry:
+    constants: UserConstants
+    signature: tuple[FileSignature, FileSignature]
+    checked_at: float
+
+
+@dataclass
+class ConstantsCacheStats:
+    """Счётчики кеша констант"""
+    hits: int = 0
+    loads: int = 0
+    disk_checks: int = 0  # сколько раз проверяли файлы на диске
+    invalidations: int = 0
+
+
+def constants_paths(user_folder: str) -> Dict[str, Path]:
+    base = DATA / user_folder
+    return {
+        "Эмоции": base / "emotions.txt",
+        "Теги": base / "tags.txt",
+    }
+
+
+def file_signature(path: Path) -> FileSignature:
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+class UserConstantsCache:
+    """
+    Кеш разобранных emotions.txt/tags.txt по пользователям.
+
+    - пока не прошло recheck_interval секунд, ответ отдаётся без обращения к диску
+    - потом проверяется (mtime, size) файлов; файлы перечитываются, только если изменились
+    - отсутствие файлов тоже кешируется
+    - invalidate() — сброс при записи через бота (edit_constants)
+    """
+
+    def __init__(self, recheck_interval: float = 30.0) -> None:
+        """
+        :param recheck_interval: как часто проверять файлы на диске, сек; 0 — при каждом обращении
+        """
+        self.recheck_interval = recheck_interval
+        self.stats = ConstantsCacheStats()
+        self._lock = threading.Lock()
+        self._entries: Dict[str, _Entry] = {}
+
+    def get(self, user_folder: str) -> UserConstants:
+        now = time.monotonic()
+        entry = self._entries.get(user_folder)
+        if entry is not None and now - entry.checked_at < self.recheck_interval:
+            self.stats.hits += 1
+            return entry.constants
+
+        paths = constants_paths(user_folder)
+        signature = (file_signature(paths["Эмоции"]), file_signature(paths["Теги"]))
+        self.stats.disk_checks += 1
+
+        with self._lock:
+            entry = self._entries.get(user_folder)
+            if entry is not None and entry.signature == signature:
+                entry.checked_at = now
+                self.stats.hits += 1
+                return entry.constants
+
+            constants = UserConstants(
+                emotions=tuple(self._read(paths["Эмоции"], "emotions", signature[0])),
+                tags=tuple(self._read(paths["Теги"], "tags", signature[1])),
+                version=next(_versions),
+            )
+            self._entries[user_folder] = _Entry(constants=constants, signature=signature, checked_at=now)
+            self.stats.loads += 1
+            return constants
+
+    def invalidate(self, user_folder: str) -> None:
+        with self._lock:
+            if self._entries.pop(user_folder, None) is not None:
+                self.stats.invalidations += 1
+
+    @staticmethod
+    def _read(path: Path, kind: str, signature: FileSignature) -> List[str]:
+        if signature is None:
+            log.error(f"Can't read {kind} file: {path} | Файл {path} не найден")
+            return []
+        try:
+            return txt_read(path)
+        except Exception as e:
+            log.error(f"Can't read {kind} file: {path} | {e}")
+            return []
+
+
+_cache: Optional[UserConstantsCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_user_constants_cache() -> UserConstantsCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = UserConstantsCache(recheck_interval=config.constants.recheck_interval)
+    return _cache
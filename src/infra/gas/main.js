@@ -5,6 +5,13 @@
  *  - upsert_note: create/update row by id (message_id)
  *  - add_track: append one/many track links to playlist cell (new line, rich links)
  *  - exists: check row exists by id
+ *  - list_ids: all row ids of the user's sheet
+ *  - list_notes: rows [offset, offset + limit) as records with playlist lines
+ *                ({offset, limit} -> {ok, notes: [{id, when, what, emotions, tags, tracks}], next})
+ *  - batch: run many upsert_note/add_track ops for one user in one request
+ *           ({ops: [{action, op_id?, ...}]} -> {ok, results: [{ok, ...}]});
+ *           an op whose op_id was already applied (resent after a lost response) is skipped
+ *           and answered {ok: true, duplicate: true}
  *
  * Data model (columns):
  * 1 id
@@ -20,6 +27,8 @@ const SPREADSHEET_BY_USER = {
 };
 
 const SHEET_NAME = "Лист1";
+// сколько помнить применённые op_id, сек (максимум CacheService — 6 часов)
+const APPLIED_OPS_TTL = 21600;
 const HEADERS = ["id", "Когда", "Что", "Эмоции", "Теги", "Плейлист"];
 
 function doPost(e) {
@@ -37,87 +46,143 @@ function doPost(e) {
     const sheet = getOrCreateSheet_(ss, SHEET_NAME);
     ensureHeader_(sheet);
 
-    if (action === "exists") {
-      const id = String(payload.id || "");
-      if (!id) return json_({ ok: false, error: "id required" });
-
-      const row = findRowById_(sheet, id);
-      return json_({ ok: true, exists: row !== 0 });
+    if (action === "batch") {
+      const ops = Array.isArray(payload.ops) ? payload.ops : [];
+      const cache = CacheService.getScriptCache();
+      const keyOf = op => (op && op.op_id) ? `op:${user}:${op.op_id}` : "";
+      const keys = ops.map(keyOf).filter(k => k);
+      const applied = keys.length ? cache.getAll(keys) : {};
+      const results = ops.map(op => {
+        const key = keyOf(op);
+        if (key && applied[key]) return { ok: true, duplicate: true };
+        try {
+          const result = runAction_(sheet, (op && op.action) || "", op || {});
+          // сразу, а не в конце: если скрипт оборвётся посреди пачки, применённое уже помечено
+          if (key && result.ok) cache.put(key, "1", APPLIED_OPS_TTL);
+          return result;
+        } catch (err) {
+          return { ok: false, error: String(err) };
+        }
+      });
+      return json_({ ok: true, results: results });
     }
 
-    if (action === "upsert_note") {
-      const rec = payload.record || {};
-      const id = String(rec.id || "");
-      if (!id) return json_({ ok: false, error: "record.id required" });
-
-      const row = findRowById_(sheet, id);
-
-      const whenStr = String(rec.when || formatDateTime_(new Date()));
-      const what = String(rec.what || "");
-      const emotions = Array.isArray(rec.emotions) ? rec.emotions : [];
-      const tags = Array.isArray(rec.tags) ? rec.tags : [];
-
-      const values = [
-        id,
-        whenStr,
-        what,
-        emotions.join(", "),
-        tags.join(", "),
-        "" // playlist untouched here
-      ];
-
-      if (row === 0) {
-        sheet.appendRow(values);
-      } else {
-        // update A-E only; keep playlist (F) as is
-        sheet.getRange(row, 1, 1, 5).setValues([values.slice(0, 5)]);
-      }
+    return json_(runAction_(sheet, action, payload));
+  } catch (err) {
+    return json_({
+      ok: false,
+      error: String(err),
+      stack: (err && err.stack) ? String(err.stack) : ""
+    });
+  }
+}
 
-      return json_({ ok: true });
-    }
+function runAction_(sheet, action, payload) {
+  if (action === "exists") {
+    const id = String(payload.id || "");
+    if (!id) return { ok: false, error: "id required" };
 
-    if (action === "add_track") {
-      const id = String(payload.id || "");
-      if (!id) return json_({ ok: false, error: "id required" });
+    const row = findRowById_(sheet, id);
+    return { ok: true, exists: row !== 0 };
+  }
 
-      const row = findRowById_(sheet, id);
-      if (row === 0) return json_({ ok: false, error: `Row with id=${id} not found` });
+  if (action === "list_ids") {
+    const last = sheet.getLastRow();
+    if (last < 2) return { ok: true, ids: [] };
 
-      // accept items: [{link, text}]
-      let items = [];
-      if (Array.isArray(payload.items)) items = payload.items;
+    const values = sheet.getRange(2, 1, last - 1, 1).getValues();
+    const ids = values.map(v => String(v[0])).filter(id => id);
+    return { ok: true, ids: ids };
+  }
 
-      // если вдруг прилетела одна штука (на будущее)
-      if (!Array.isArray(items) || items.length === 0) {
-        return json_({ ok: false, error: "items[] required" });
-      }
+  if (action === "list_notes") {
+    const offset = Math.max(0, Number(payload.offset) || 0);
+    const limit = Math.max(1, Math.min(1000, Number(payload.limit) || 500));
+    const total = Math.max(0, sheet.getLastRow() - 1);
+    if (offset >= total) return { ok: true, notes: [], next: offset };
+
+    const count = Math.min(limit, total - offset);
+    const values = sheet.getRange(2 + offset, 1, count, HEADERS.length).getDisplayValues();
+    const split = (s, sep) => String(s || "").split(sep).map(v => v.trim()).filter(v => v);
+    const notes = values
+      .filter(v => String(v[0]))
+      .map(v => ({
+        id: String(v[0]),
+        when: String(v[1]),
+        what: String(v[2]),
+        emotions: split(v[3], ","),
+        tags: split(v[4], ","),
+        tracks: split(v[5], "\n"),
+      }));
+    return { ok: true, notes: notes, next: offset + count };
+  }
 
-      // чистим вход
-      items = items
-        .map(it => ({
-          link: String((it && it.link) || "").trim(),
-          text: String((it && it.text) || "").trim(),
-        }))
-        .filter(it => it.link && it.text);
+  if (action === "upsert_note") {
+    const rec = payload.record || {};
+    const id = String(rec.id || "");
+    if (!id) return { ok: false, error: "record.id required" };
+
+    const row = findRowById_(sheet, id);
+
+    const whenStr = String(rec.when || formatDateTime_(new Date()));
+    const what = String(rec.what || "");
+    const emotions = Array.isArray(rec.emotions) ? rec.emotions : [];
+    const tags = Array.isArray(rec.tags) ? rec.tags : [];
+
+    const values = [
+      id,
+      whenStr,
+      what,
+      emotions.join(", "),
+      tags.join(", "),
+      "" // playlist untouched here
+    ];
+
+    if (row === 0) {
+      sheet.appendRow(values);
+    } else {
+      // update A-E only; keep playlist (F) as is
+      sheet.getRange(row, 1, 1, 5).setValues([values.slice(0, 5)]);
+    }
 
-      if (items.length === 0) {
-        return json_({ ok: false, error: "items[] must contain {link,text}" });
-      }
+    return { ok: true };
+  }
+
+  if (action === "add_track") {
+    const id = String(payload.id || "");
+    if (!id) return { ok: false, error: "id required" };
+
+    const row = findRowById_(sheet, id);
+    if (row === 0) return { ok: false, error: `Row with id=${id} not found` };
 
-      const cell = sheet.getRange(row, 6); // F column
-      const added = appendItemsToCell_(cell, items);
+    // accept items: [{link, text}]
+    let items = [];
+    if (Array.isArray(payload.items)) items = payload.items;
 
-      return json_({ ok: true, added: added });
+    // если вдруг прилетела одна штука (на будущее)
+    if (!Array.isArray(items) || items.length === 0) {
+      return { ok: false, error: "items[] required" };
     }
 
-    return json_({ ok: false, error: `Unknown action: ${action}` });
-  } catch (err) {
-    return json_({
-      ok: false,
-      error: String(err),
-      stack: (err && err.stack) ? String(err.stack) : ""
-    });
+    // чистим вход
+    items = items
+      .map(it => ({
+        link: String((it && it.link) || "").trim(),
+        text: String((it && it.text) || "").trim(),
+      }))
+      .filter(it => it.link && it.text);
+
+    if (items.length === 0) {
+      return { ok: false, error: "items[] must contain {link,text}" };
+    }
+
+    const cell = sheet.getRange(row, 6); // F column
+    const added = appendItemsToCell_(cell, items);
+
+    return { ok: true, added: added };
   }
+
+  return { ok: false, error: `Unknown action: ${action}` };
 }
 
 function json_(obj) {
@@ -189,9 +254,10 @@ function appendItemsToCell_(cell, items) {
     }
   }
 
-  // 3) добавляем новые элементы (антидубль по text)
+  // 3) добавляем новые элементы (антидубль по text и по ссылке)
   const lines = oldLines.filter(s => String(s).trim() !== "");
   const seen = new Set(lines);
+  const seenLinks = new Set(Object.keys(linkByText).map(t => linkByText[t]));
 
   let added = 0;
   for (let i = 0; i < items.length; i++) {
@@ -199,8 +265,9 @@ function appendItemsToCell_(cell, items) {
     const text = String((items[i] && items[i].text) || "").trim();
     if (!link || !text) continue;
 
-    if (seen.has(text)) continue;
+    if (seen.has(text) || seenLinks.has(link)) continue;
     seen.add(text);
+    seenLinks.add(link);
 
     lines.push(text);
     linkByText[text] = link;
@@ -1,5 +1,6 @@
 import os
-from typing import Optional
+import threading
+from typing import Dict, Optional
 from pathlib import Path
 import logging
 
@@ -13,5 +14,41 @@ class PathFilter(logging.Filter):
         self.root_path = os.path.normpath(str(root_path))
 
     def filter(self, record: logging.LogRecord) -> bool:
-        record.pathname = record.pathname.replace(self.root_path, "..")
-        return True
\ No newline at end of file
+        if record.pathname.startswith(self.root_path):
+            record.pathname = ".." + record.pathname[len(self.root_path):]
+        return True
+
+class SamplingFilter(logging.Filter):
+    """
+    Пропускает только долю сообщений каждого типа.
+
+    Тип — первое слово шаблона сообщения (например "HANDLE" для log.info("HANDLE | ...", ...)).
+    Счётчики ведутся по типам из rates, а не по тексту: f-строки с данными пользователя
+    не раздувают их. WARNING и выше пропускаются всегда.
+    """
+    def __init__(self, rates: Dict[str, float]) -> None:
+        """
+        :param rates: тип сообщения -> доля от 0 до 1 (0.1 — каждое десятое)
+        """
+        super().__init__()
+        self.rates = rates
+        self._lock = threading.Lock()
+        # тип -> пропускать каждое N-е (0 — все, -1 — ни одного); типов нет в rates — пропускаются все
+        self._every: Dict[str, int] = {
+            kind: 0 if rate >= 1 else (round(1 / rate) if rate > 0 else -1) for kind, rate in rates.items()
+        }
+        self._counters: Dict[str, int] = dict.fromkeys(self._every, 0)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not isinstance(record.msg, str):
+            return True
+        kind = record.msg.split(" ", 1)[0]
+        every = self._every.get(kind, 0)
+        if every == 0:
+            return True
+        if every < 0:
+            return False
+        with self._lock:
+            n = self._counters[kind]
+            self._counters[kind] = n + 1
+        return n % every == 0
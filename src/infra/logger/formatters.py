@@ -1,3 +1,5 @@
+import json
+import logging
 from dataclasses import dataclass
 
 @dataclass(frozen=True)
@@ -11,3 +13,21 @@ class DateFormat:
     """Форматы дат логирования"""
     simple = "%H:%M:%S"
     detailed = "%d-%m-%Y %H:%M:%S"
+
+class JsonFormatter(logging.Formatter):
+    """Одна JSON-строка на запись (для сборщиков логов)"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "module": record.module,
+            "line": record.lineno,
+            "msg": record.getMessage(),
+        }
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        if record.stack_info:
+            data["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
@@ -1,4 +1,5 @@
 import logging
+import logging.handlers
 from typing import Final, Optional
 from pathlib import Path
 
@@ -22,4 +23,13 @@ class ErrorFileHandler(logging.FileHandler):
     """Запись в журнал логов"""
     def __init__(self, file_path: Optional[str | Path] = None) -> None:
         file_path = file_path or Path(__file__).parent.parent.parent
-        super().__init__(filename=Path(file_path) / 'error.log')
\ No newline at end of file
+        super().__init__(filename=Path(file_path) / 'error.log')
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler, который ничего не форматирует в вызывающем потоке:
+    запись уходит в очередь как есть, сообщение собирается из аргументов в потоке QueueListener.
+    Аргументы должны пережить это время без изменений (строки, числа, объекты Telegram).
+    """
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
@@ -1,4 +1,8 @@
+import atexit
 import logging
+import logging.handlers
+from queue import SimpleQueue
+from typing import Optional
 from src.infra.logger import formatters, handlers, filters
 
 class Simple(logging.Logger):
@@ -67,5 +71,59 @@ class Detailed(logging.Logger):
         handler.setLevel(level=level)
         super().addHandler(hdlr=handler)
 
+def _stop_listener(listener: logging.handlers.QueueListener) -> None:
+    # stop() второй раз падает, а listener могли остановить раньше выхода
+    if getattr(listener, "_thread", None) is not None:
+        listener.stop()
 
+def configure(
+    logger: logging.Logger,
+    queue: bool = False,
+    json_format: bool = False,
+    sampling: Optional[dict[str, float]] = None,
+) -> Optional[logging.handlers.QueueListener]:
+    """
+    Донастраивает уже созданный логгер (Simple/Detailed) — модули держат ссылку на него с импорта,
+    поэтому логгер не пересоздаётся, а меняются его обработчики.
+
+    - queue: форматирование и запись уходят в фоновый поток (QueueHandler + QueueListener);
+      фильтры логгера (PathFilter) переезжают на обработчики и тоже выполняются в фоне
+    - json_format: JSON-строки вместо текста (без ANSI-цветов)
+    - sampling: доли сообщений по типам, см. filters.SamplingFilter
+
+    :return: запущенный QueueListener (останавливается при выходе) или None
+    """
+    targets = list(logger.handlers)
+
+    if json_format:
+        for i, handler in enumerate(targets):
+            if isinstance(handler, handlers.ColorStreamHandler):
+                plain = logging.StreamHandler(handler.stream)
+                plain.setLevel(handler.level)
+                logger.removeHandler(handler)
+                logging.Logger.addHandler(logger, plain)
+                targets[i] = handler = plain
+            handler.setFormatter(formatters.JsonFormatter())
+
+    if sampling:
+        logger.addFilter(filters.SamplingFilter(sampling))
+
+    if not queue:
+        return None
+
+    moved = [f for f in logger.filters if not isinstance(f, filters.SamplingFilter)]
+    for f in moved:
+        logger.removeFilter(f)
+    for handler in targets:
+        logger.removeHandler(handler)
+        for f in moved:
+            handler.addFilter(f)
+
+    log_queue = SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, *targets, respect_handler_level=True)
+    listener.start()
+    atexit.register(_stop_listener, listener)
 
+    # мимо addHandler Simple/Detailed: уровень и формат здесь не нужны
+    logging.Logger.addHandler(logger, handlers.DeferredQueueHandler(log_queue))
+    return listener
@@ -0,0 +1,303 @@
+import contextlib
+import dataclasses
+import functools
+import inspect
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from src.config import config, log
+
+
+PREFIX = "tgbotnotes_"
+QUANTILES = (0.5, 0.95, 0.99)
+
+# (имя, ((метка, значение), ...))
+MetricKey = tuple[str, tuple[tuple[str, str], ...]]
+
+
+def _key(name: str, labels: Dict[str, Any]) -> MetricKey:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _labels_text(labels: tuple[tuple[str, str], ...], extra: str = "") -> str:
+    parts = [f'{k}="{v}"' for k, v in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Histogram:
+    """
+    Длительности в секундах: сумма и количество за всё время,
+    перцентили — по последним reservoir замерам.
+    """
+
+    def __init__(self, reservoir: int = 1024) -> None:
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+        self._samples: deque[float] = deque(maxlen=reservoir)
+
+    def observe(self, value: float) -> None:
+        with self._lock:
+            self.count += 1
+            self.sum += value
+            self._samples.append(value)
+
+    def quantiles(self) -> Dict[float, float]:
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return {q: 0.0 for q in QUANTILES}
+        return {q: samples[min(len(samples) - 1, int(q * len(samples)))] for q in QUANTILES}
+
+
+class Registry:
+    """
+    Метрики процесса: гистограммы длительностей, счётчики и снимки *Stats-объектов модулей.
+    """
+
+    def __init__(self, reservoir: int = 1024) -> None:
+        self.reservoir = reservoir
+        self._lock = threading.Lock()
+        self._histograms: Dict[MetricKey, Histogram] = {}
+        self._counters: Dict[MetricKey, float] = {}
+        self._collectors: Dict[str, Callable[[], Any]] = {}
+
+    def histogram(self, name: str, **labels) -> Histogram:
+        key = _key(name, labels)
+        hist = self._histograms.get(key)
+        if hist is None:
+            with self._lock:
+                hist = self._histograms.setdefault(key, Histogram(self.reservoir))
+        return hist
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def register_stats(self, name: str, get_stats: Callable[[], Any]) -> None:
+        """
+        :param name: префикс метрик, например "gas_writer"
+        :param get_stats: возвращает dataclass со счётчиками (WriterStats, CacheStats, ...);
+            вызывается при каждом экспорте, поэтому объект может меняться
+        """
+        with self._lock:
+            self._collectors[name] = get_stats
+
+    def _snapshot(self) -> tuple[list, list, list]:
+        """
+        Копии словарей под блокировкой: хендлеры добавляют в них ключи, пока идёт экспорт,
+        а итерация по меняющемуся dict падает с "dictionary changed size during iteration".
+        """
+        with self._lock:
+            return list(self._histograms.items()), list(self._counters.items()), list(self._collectors.items())
+
+    def _collect(self, collectors: list) -> Dict[str, float]:
+        values: Dict[str, float] = {}
+        for name, get_stats in collectors:
+            try:
+                stats = get_stats()
+            except Exception as e:
+                log.warning(f"Metrics collector {name} failed: {e}")
+                continue
+            fields = [f.name for f in dataclasses.fields(stats)]
+            fields += [n for n, v in vars(type(stats)).items() if isinstance(v, property)]
+            for field in fields:
+                value = getattr(stats, field)
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    values[f"{name}_{field}"] = value
+        return values
+
+    def render_prometheus(self) -> str:
+        lines = []
+        typed = set()
+
+        def declare(metric: str, kind: str) -> None:
+            # TYPE — один раз на семейство, а не на каждый набор меток
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f"# TYPE {metric} {kind}")
+
+        histograms, counters, collectors = self._snapshot()
+        for (name, labels), hist in sorted(histograms):
+            metric = PREFIX + name
+            declare(metric, "summary")
+            for q, value in hist.quantiles().items():
+                quantile = f'quantile="{q}"'
+                lines.append(f"{metric}{_labels_text(labels, quantile)} {value:.6f}")
+            lines.append(f"{metric}_sum{_labels_text(labels)} {hist.sum:.6f}")
+            lines.append(f"{metric}_count{_labels_text(labels)} {hist.count}")
+        for (name, labels), value in sorted(counters):
+            declare(PREFIX + name, "counter")
+            lines.append(f"{PREFIX}{name}{_labels_text(labels)} {value}")
+        for name, value in sorted(self._collect(collectors).items()):
+            declare(PREFIX + name, "gauge")
+            lines.append(f"{PREFIX}{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> str:
+        """Короткая сводка для лога"""
+        parts = []
+        histograms, counters, _ = self._snapshot()
+        for (name, labels), hist in sorted(histograms):
+            if not hist.count:
+                continue
+            q = hist.quantiles()
+            parts.append(
+                f"{name}{_labels_text(labels)} n={hist.count} "
+                f"p50={q[0.5] * 1000:.1f}ms p95={q[0.95] * 1000:.1f}ms p99={q[0.99] * 1000:.1f}ms"
+            )
+        for (name, labels), value in sorted(counters):
+            parts.append(f"{name}{_labels_text(labels)}={value}")
+        return "; ".join(parts)
+
+
+_registry: Optional[Registry] = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> Registry:
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = Registry(reservoir=config.metrics.reservoir)
+    return _registry
+
+
+def enabled() -> bool:
+    return config.metrics.enabled
+
+
+@contextlib.contextmanager
+def _timer(hist: Histogram) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        hist.observe(time.perf_counter() - started)
+
+
+def timer(name: str, **labels) -> contextlib.AbstractContextManager:
+    """
+    with timer("gas_request_seconds", action="exists"): ...
+
+    При выключенных метриках — пустой контекст.
+    """
+    if not enabled():
+        return contextlib.nullcontext()
+    return _timer(get_registry().histogram(name, **labels))
+
+
+def timed(name: str, **labels) -> Callable:
+    """
+    Декоратор: длительность вызова функции (обычной или async).
+    Конфиг читается при первом вызове, а не при декорировании: импорт модуля с @timed не загружает config.
+    При выключенных метриках — только проверка закешированного флага.
+    """
+    def decorator(func):
+        # [гистограмма или None, если метрики выключены] — заполняется при первом вызове
+        state: List[Optional[Histogram]] = []
+
+        def histogram() -> Optional[Histogram]:
+            if not state:
+                state.append(get_registry().histogram(name, **labels) if enabled() else None)
+            return state[0]
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                hist = histogram()
+                if hist is None:
+                    return await func(*args, **kwargs)
+                started = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    hist.observe(time.perf_counter() - started)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            hist = histogram()
+            if hist is None:
+                return func(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                hist.observe(time.perf_counter() - started)
+        return wrapper
+
+    return decorator
+
+
+def inc(name: str, value: float = 1, **labels) -> None:
+    if enabled():
+        get_registry().inc(name, value, **labels)
+
+
+def register_stats(name: str, get_stats: Callable[[], Any]) -> None:
+    if enabled():
+        get_registry().register_stats(name, get_stats)
+
+
+def instrument_bot(bot: Any, methods: Iterable[str]) -> None:
+    """
+    Время каждого запроса к Bot API по методам (telegram_api_seconds{method=...}).
+    Вызывать до install_rate_limiter — тогда ожидание в ограничителе сюда не попадает.
+    """
+    if not enabled():
+        return
+    for method in methods:
+        setattr(bot, method, timed("telegram_api_seconds", method=method)(getattr(bot, method)))
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = get_registry().render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+def _dump_loop(interval: float, title: str) -> None:
+    while True:
+        time.sleep(interval)
+        summary = get_registry().summary()
+        if summary:
+            log.info("%s | %s", title, summary)
+
+
+def start(worker: Optional[int] = None) -> None:
+    """
+    Фоновый экспорт по config.metrics: HTTP /metrics на отдельном порту и/или сводка в лог.
+    В webhook-режиме /metrics отдаёт и сервер вебхука.
+
+    :param worker: номер воркера при sharding: у каждого процесса свои метрики,
+        воркер N отдаёт их на port + N + 1 (port — супервизор)
+    """
+    cfg = config.metrics
+    if not cfg.enabled:
+        return
+    if cfg.port:
+        port = cfg.port if worker is None else cfg.port + worker + 1
+        server = ThreadingHTTPServer((cfg.host, port), _MetricsHandler)
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        log.info(f"Metrics: http://{cfg.host}:{port}/metrics")
+    if cfg.log_interval > 0:
+        title = "METRICS" if worker is None else f"METRICS w{worker}"
+        threading.Thread(target=_dump_loop, args=(cfg.log_interval, title), name="metrics-log", daemon=True).start()
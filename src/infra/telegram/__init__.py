@@ -1,12 +1,28 @@
+import threading
 import time
+from typing import Optional
 import requests.exceptions
-from telebot import TeleBot, types
-
-from src.config import log, config
+from telebot import TeleBot, apihelper, types
+
+from src.config import log, config, load_config
+from src.core.constants_store import migrate
+from src.core.note_aggregates import get_note_aggregates
+from src.core.note_index import start_warmup
+from src.core.note_search import get_note_search, start_backfill
+from src.core.sessions import get_session_store
+from src.core.user_constants import get_user_constants_cache
+from src.infra import metrics
+from src.infra.yandex_music.get_info import get_collection_cache, get_track_cache
+from src.integrations.gas_writer import drain_orphan_journals, get_gas_writer
 
 from src.infra.telegram import msg_handler
 from src.infra.telegram import edit_constants
 from src.infra.telegram import reply_playlist_handler
+from src.infra.telegram import search_handler
+from src.infra.telegram import stats_handler
+from src.infra.telegram.keyboards import get_keyboard_renderer
+from src.infra.telegram.rate_limit import METHOD_PRIORITY, get_rate_limiter, install_rate_limiter
+from src.infra.telegram.webhook import run_webhook
 
 
 def set_commands(bot: TeleBot) -> None:
@@ -15,6 +31,8 @@ def set_commands(bot: TeleBot) -> None:
     """
     commands_private = [
         types.BotCommand("edit_constants", "Константы"),
+        types.BotCommand("search", "Поиск по записям"),
+        types.BotCommand("stats", "Статистика эмоций и тегов"),
     ]
 
     bot.set_my_commands(commands_private, scope=types.BotCommandScopeAllPrivateChats())
@@ -22,20 +40,73 @@ def set_commands(bot: TeleBot) -> None:
     # если надо отдельно для групп — добавь/убери
     commands_group = [
         types.BotCommand("constants", "Константы"),
+        types.BotCommand("search", "Поиск по записям"),
+        types.BotCommand("stats", "Статистика эмоций и тегов"),
     ]
     bot.set_my_commands(commands_group, scope=types.BotCommandScopeAllGroupChats())
 
-def build_bot() -> TeleBot:
+def _set_commands_background(bot: TeleBot) -> None:
+    try:
+        set_commands(bot)
+    except Exception as e:
+        # меню команд — не повод не стартовать: Telegram покажет прежнее
+        log.warning(f"set_commands failed: {e}")
+
+def register_metrics(worker: Optional[int] = None) -> None:
+    """
+    Счётчики модулей-одиночек в /metrics и сводке в логе; сами метрики экспортирует metrics.start().
+
+    :param worker: номер воркера при sharding (см. metrics.start)
+    """
+    metrics.register_stats("gas_writer", lambda: get_gas_writer().stats)
+    metrics.register_stats("track_cache", lambda: get_track_cache().stats)
+    metrics.register_stats("collection_cache", lambda: get_collection_cache().stats)
+    metrics.register_stats("sessions", lambda: get_session_store().stats)
+    metrics.register_stats("user_constants", lambda: get_user_constants_cache().stats)
+    metrics.register_stats("keyboards", lambda: get_keyboard_renderer().stats)
+    metrics.register_stats("note_search", lambda: get_note_search().stats)
+    metrics.register_stats("note_aggregates", lambda: get_note_aggregates().stats)
+    metrics.start(worker=worker)
+
+
+def use_api_url(url: str) -> None:
+    """
+    Слать запросы не в api.telegram.org, а на url (свой Bot API сервер или фейковый из benchmarks.load).
+    """
+    url = url.rstrip("/")
+    apihelper.API_URL = url + "/bot{0}/{1}"
+    apihelper.FILE_URL = url + "/file/bot{0}/{1}"
+
+
+def build_bot(commands: bool = True) -> TeleBot:
+    """
+    :param commands: регистрировать команды меню (воркерам не нужно — это делает супервизор)
+    """
+    if config.telegram.api_url:
+        use_api_url(config.telegram.api_url)
     token = config.telegram.bot.token
     bot = TeleBot(token, parse_mode="HTML")
+    metrics.instrument_bot(bot, METHOD_PRIORITY)
+    if config.telegram.rate_limit.enabled:
+        limiter = get_rate_limiter()
+        install_rate_limiter(bot, limiter)
+        metrics.register_stats("rate_limiter", lambda: limiter.stats)
 
     edit_constants.register(bot)
 
+    # команды /search и /stats — раньше хендлера любого текста в msg_handler
+    search_handler.register(bot)
+    stats_handler.register(bot)
+
     reply_playlist_handler.register(bot)
 
     msg_handler.register(bot)
 
-    set_commands(bot)
+    if commands and config.telegram.background_commands:
+        # два запроса к Bot API не задерживают первый getUpdates
+        threading.Thread(target=_set_commands_background, args=(bot,), name="set-commands", daemon=True).start()
+    elif commands:
+        set_commands(bot)
 
     return bot
 
@@ -46,6 +117,9 @@ def run_polling(bot: TeleBot) -> None:
     """
     while True:
         try:
+            # после работы в webhook-режиме getUpdates отвечает 409, пока webhook не снят;
+            # накопившиеся апдейты при этом не выбрасываются
+            bot.delete_webhook()
             log.info("Bot started. Polling...")
             bot.infinity_polling(skip_pending=True, timeout=30, long_polling_timeout=30)
         except requests.exceptions.ReadTimeout:
@@ -67,8 +141,30 @@ def run_polling(bot: TeleBot) -> None:
 
 
 def main() -> None:
+    started = time.perf_counter()
+    load_config()
+    if config.sharding.workers != 1:
+        from src.infra.telegram.sharding import run_supervisor
+        run_supervisor()
+        return
+    # досылаем в GAS то, что не успели записать до прошлой остановки
+    writer = get_gas_writer()
+    # и то, что осталось в журналах воркеров, если раньше бот работал в несколько процессов
+    threading.Thread(target=drain_orphan_journals, args=(None,), name="drain-journals", daemon=True).start()
+    start_warmup()
+    start_backfill()
+    # старые emotions.txt/tags.txt могли накопить дубли и пустые строки
+    migrate()
+    register_metrics()
     bot = build_bot()
-    run_polling(bot)
+    log.info("Startup took %.3fs", time.perf_counter() - started)
+    try:
+        if config.telegram.mode == "webhook":
+            run_webhook(bot)
+        else:
+            run_polling(bot)
+    finally:
+        writer.stop()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,130 @@
+import asyncio
+import time
+
+from telebot import asyncio_helper, types
+from telebot.async_telebot import AsyncTeleBot
+
+from src.config import log, config, load_config
+from src.core.constants_store import migrate
+from src.core.note_index import start_warmup
+from src.core.note_search import start_backfill
+from src.infra import metrics
+from src.integrations.gas_client_async import get_async_gas_client
+from src.integrations.gas_writer import get_gas_writer
+
+from src.infra.telegram.aio import msg_handler
+from src.infra.telegram.aio import edit_constants
+from src.infra.telegram.aio import reply_playlist_handler
+from src.infra.telegram.aio import search_handler
+from src.infra.telegram.aio import stats_handler
+from src.infra.telegram import register_metrics
+from src.infra.telegram.rate_limit import METHOD_PRIORITY, get_rate_limiter, install_rate_limiter
+
+
+async def set_commands(bot: AsyncTeleBot) -> None:
+    """
+    Команды в выпадающем меню.
+    """
+    commands_private = [
+        types.BotCommand("edit_constants", "Константы"),
+        types.BotCommand("search", "Поиск по записям"),
+        types.BotCommand("stats", "Статистика эмоций и тегов"),
+    ]
+
+    await bot.set_my_commands(commands_private, scope=types.BotCommandScopeAllPrivateChats())
+
+    commands_group = [
+        types.BotCommand("constants", "Константы"),
+        types.BotCommand("search", "Поиск по записям"),
+        types.BotCommand("stats", "Статистика эмоций и тегов"),
+    ]
+    await bot.set_my_commands(commands_group, scope=types.BotCommandScopeAllGroupChats())
+
+
+async def _set_commands_background(bot: AsyncTeleBot) -> None:
+    try:
+        await set_commands(bot)
+    except Exception as e:
+        log.warning(f"set_commands failed: {e}")
+
+
+def use_api_url(url: str) -> None:
+    """
+    Как src.infra.telegram.use_api_url, но для asyncio_helper.
+    """
+    url = url.rstrip("/")
+    asyncio_helper.API_URL = url + "/bot{0}/{1}"
+    asyncio_helper.FILE_URL = url + "/file/bot{0}/{1}"
+
+
+def build_bot() -> AsyncTeleBot:
+    """
+    Тот же бот, что src.infra.telegram.build_bot, но на AsyncTeleBot:
+    медленные HTTP-запросы не занимают потоки, все чаты обслуживает один event loop.
+    """
+    if config.telegram.api_url:
+        use_api_url(config.telegram.api_url)
+    token = config.telegram.bot.token
+    bot = AsyncTeleBot(token, parse_mode="HTML")
+    metrics.instrument_bot(bot, METHOD_PRIORITY)
+    if config.telegram.rate_limit.enabled:
+        limiter = get_rate_limiter(asynchronous=True)
+        install_rate_limiter(bot, limiter)
+        metrics.register_stats("rate_limiter", lambda: limiter.stats)
+
+    edit_constants.register(bot)
+
+    search_handler.register(bot)
+    stats_handler.register(bot)
+
+    reply_playlist_handler.register(bot)
+
+    msg_handler.register(bot)
+
+    return bot
+
+
+async def run_polling(bot: AsyncTeleBot) -> None:
+    """
+    infinity_polling AsyncTeleBot сам переживает сетевые ошибки и перезапускает polling.
+    """
+    commands = None
+    if config.telegram.background_commands:
+        # ссылка на задачу, чтобы её не собрал GC до завершения
+        commands = asyncio.create_task(_set_commands_background(bot))
+    else:
+        await set_commands(bot)
+    log.info("Bot started (asyncio). Polling...")
+    try:
+        # см. run_polling в src.infra.telegram: снимаем webhook, иначе getUpdates отвечает 409
+        await bot.delete_webhook()
+        await bot.infinity_polling(skip_pending=True, timeout=30, request_timeout=60)
+    finally:
+        if commands is not None:
+            commands.cancel()
+        await get_async_gas_client().close()
+        await bot.close_session()
+
+
+def main() -> None:
+    started = time.perf_counter()
+    load_config()
+    # досылаем в GAS то, что не успели записать до прошлой остановки
+    writer = get_gas_writer()
+    start_warmup()
+    start_backfill()
+    # старые emotions.txt/tags.txt могли накопить дубли и пустые строки
+    migrate()
+    register_metrics()
+    bot = build_bot()
+    log.info("Startup took %.3fs", time.perf_counter() - started)
+    try:
+        asyncio.run(run_polling(bot))
+    except KeyboardInterrupt:
+        log.info("Stopped by Ctrl+C.")
+    finally:
+        writer.stop()
+
+
+if __name__ == "__main__":
+    main()
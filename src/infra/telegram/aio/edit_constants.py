@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Dict
+
+from telebot import types
+from telebot.async_telebot import AsyncTeleBot
+
+from src.config import log
+from src.infra.telegram import callbacks
+from src.infra.telegram.callbacks import CallbackData, callback_data, get_router
+from src.infra.telegram.edit_constants import CONSTANTS_TYPES, _save_values, _user_folder_from_user
+
+
+# AsyncTeleBot не умеет register_next_step_handler: ждём ввод значений по ключу (chat_id, user_id)
+PENDING: Dict[tuple[int, int], tuple[str, str]] = {}  # -> (type_name, user_folder)
+
+
+def _is_pending(message: types.Message) -> bool:
+    user = message.from_user
+    return user is not None and (message.chat.id, user.id) in PENDING
+
+
+def register(bot: AsyncTeleBot) -> None:
+
+    @bot.message_handler(commands=["edit_constants"])
+    async def handler(message: types.Message):
+        user = message.from_user
+        user_folder = _user_folder_from_user(user)
+
+        log.info("HANDLE edit_constants | from user: %s | folder=%s", user, user_folder)
+
+        markup = types.InlineKeyboardMarkup()
+        for idx, constant_type in enumerate(CONSTANTS_TYPES):
+            btn = types.InlineKeyboardButton(
+                text=constant_type,
+                callback_data=callback_data(callbacks.EDIT_CONSTANTS, action="s", arg=idx),
+            )
+            markup.add(btn)
+
+        # прибираем команду
+        try:
+            await bot.delete_message(chat_id=message.chat.id, message_id=message.message_id)
+        except Exception:
+            pass
+
+        await bot.send_message(
+            chat_id=message.chat.id,
+            message_thread_id=getattr(message, "message_thread_id", None),
+            text="Что добавить?",
+            reply_markup=markup,
+        )
+
+    @get_router(bot).route(callbacks.EDIT_CONSTANTS)
+    async def ready_to_handle(call: types.CallbackQuery, data: CallbackData):
+        user = call.from_user  # важнее чем call.message.from_user
+        user_folder = _user_folder_from_user(user)
+
+        try:
+            type_name = CONSTANTS_TYPES[int(data.arg)]
+        except (ValueError, IndexError):
+            await bot.answer_callback_query(call.id, callbacks.STALE_TEXT)
+            return
+
+        log.info(
+            "HANDLE ready_to_handle | from user: %s, folder=%s, type_name=%s", user, user_folder, type_name
+        )
+
+        try:
+            await bot.delete_message(chat_id=call.message.chat.id, message_id=call.message.message_id)
+        except Exception:
+            pass
+
+        await bot.send_message(
+            chat_id=call.message.chat.id,
+            message_thread_id=getattr(call.message, "message_thread_id", None),
+            text=f"Введите новые значения для {type_name} через запятую:",
+        )
+
+        PENDING[(call.message.chat.id, user.id)] = (type_name, user_folder)
+
+    # регистрируется раньше обычного текстового хендлера msg_handler
+    @bot.message_handler(content_types=["text"], func=_is_pending)
+    async def handle_values(message: types.Message):
+        user = message.from_user
+        type_name, user_folder = PENDING.pop((message.chat.id, user.id))
+        log.info(
+            "HANDLE handle_values | from user: %s | folder=%s | type=%s", user, user_folder, type_name
+        )
+
+        # запись в файл констант и сброс кешей — в потоке, event loop не ждёт диск
+        await asyncio.to_thread(_save_values, user_folder, type_name, message.text or "")
+
+        # попробуем убрать промпт "Введите новые значения..."
+        try:
+            await bot.delete_message(chat_id=message.chat.id, message_id=message.message_id - 1)
+        except Exception:
+            pass
+
+        # реакция или ответ
+        try:
+            await bot.set_message_reaction(
+                chat_id=message.chat.id,
+                message_id=message.message_id,
+                reaction=[types.ReactionTypeEmoji(emoji="👌")],
+            )
+        except Exception:
+            await bot.reply_to(message, "Принято 👌")
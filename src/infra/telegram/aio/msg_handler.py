@@ -0,0 +1,207 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict
+
+from telebot import types
+from telebot.async_telebot import AsyncTeleBot
+
+from src.config import config, log, DATA
+from src.core.sessions import SessionKey, UserSession, get_session_store
+from src.infra import metrics
+from src.infra.telegram import callbacks
+from src.infra.telegram.callbacks import CallbackData, get_router
+from src.infra.telegram.edit_coalescer import AsyncEditCoalescer
+from src.infra.telegram.msg_handler import (
+    _apply_button,
+    _callback_session_key,
+    _is_stale,
+    _message_session_key,
+    _new_session,
+    _note_summary,
+    _step_markup,
+    _store_note,
+)
+
+
+class _SessionLocks:
+    """
+    asyncio.Lock на ключ сессии. Хранилище сессий читается и пишется в потоке (asyncio.to_thread),
+    поэтому между get и set могут успеть выполниться другие нажатия того же пользователя —
+    без блокировки одно из них потерялось бы.
+    """
+
+    def __init__(self) -> None:
+        self._locks: Dict[SessionKey, tuple[asyncio.Lock, list]] = {}
+
+    @asynccontextmanager
+    async def hold(self, key: SessionKey) -> AsyncIterator[None]:
+        lock, users = self._locks.setdefault(key, (asyncio.Lock(), [0]))
+        users[0] += 1
+        try:
+            async with lock:
+                yield
+        finally:
+            users[0] -= 1
+            if not users[0]:
+                del self._locks[key]
+
+
+def register(bot: AsyncTeleBot) -> None:
+    edits = AsyncEditCoalescer(
+        bot,
+        delay=config.telegram.edit_debounce,
+        max_delay=config.telegram.edit_max_delay,
+    )
+    router = get_router(bot)
+    locks = _SessionLocks()
+    metrics.register_stats("edit_coalescer", lambda: edits.stats)
+
+    @bot.message_handler(content_types=["text"], func=lambda m: True if not getattr(m, "reply_to_message", None) else False)
+    @metrics.timed("handler_seconds", handler="text")
+    async def handler(message: types.Message):
+        chat_id = message.chat.id
+        # файлы эмоций и тегов пользователя (stat, чтение) и SQLite-сессии — в потоке, не в event loop
+        sess = await asyncio.to_thread(_new_session, message)
+
+        log.info("HANDLE | text=%s; from user: %s | folder=%s", sess.text, message.from_user, sess.user_folder)
+
+        key = _message_session_key(message)
+        await asyncio.to_thread(get_session_store().set, key, sess)
+        await bot.delete_message(chat_id=chat_id, message_id=message.message_id)
+        await _send_emotions_step(bot, key, sess)
+
+    @router.route(callbacks.EMOTIONS)
+    @metrics.timed("handler_seconds", handler="cb_emotions")
+    async def cb_emotions(call: types.CallbackQuery, data: CallbackData):
+        chat_id = call.message.chat.id
+        key = _callback_session_key(call)
+        store = get_session_store()
+        async with locks.hold(key):
+            sess = await asyncio.to_thread(store.get, key)
+            if not sess:
+                await bot.answer_callback_query(call.id, "Сессия не найдена. Пришли текст заново.")
+                return
+
+            if _is_stale(sess, data):
+                await bot.answer_callback_query(call.id, callbacks.STALE_TEXT)
+                return
+
+            if data.action == "d":
+                edits.discard(chat_id, call.message.message_id)
+                sess.step = "tags"
+                sess.reset_view()
+                await asyncio.to_thread(store.set, key, sess)
+                await bot.answer_callback_query(call.id, "Ок, к тэгам.")
+                await bot.delete_message(chat_id=chat_id, message_id=call.message.message_id)
+                await _send_tags_step(bot, key, sess)
+                return
+
+            if not _apply_button(sess, data):
+                await bot.answer_callback_query(call.id, "Не понял кнопку.")
+                return
+            await asyncio.to_thread(store.set, key, sess)
+
+        # ответ сразу, а клавиатура обновится одной правкой, когда нажатия затихнут
+        await bot.answer_callback_query(call.id)
+        edits.submit(chat_id, call.message.message_id, _step_markup(sess))
+
+    @router.route(callbacks.TAGS)
+    @metrics.timed("handler_seconds", handler="cb_tags")
+    async def cb_tags(call: types.CallbackQuery, data: CallbackData):
+        chat_id = call.message.chat.id
+        key = _callback_session_key(call)
+        store = get_session_store()
+        async with locks.hold(key):
+            sess = await asyncio.to_thread(store.get, key)
+            if not sess:
+                await bot.answer_callback_query(call.id, "Сессия не найдена. Пришли текст заново.")
+                return
+
+            if _is_stale(sess, data):
+                await bot.answer_callback_query(call.id, callbacks.STALE_TEXT)
+                return
+
+            if data.action == "d":
+                edits.discard(chat_id, call.message.message_id)
+                await bot.answer_callback_query(call.id, "Готово.")
+                await bot.delete_message(chat_id=chat_id, message_id=call.message.message_id)
+                await _finish(bot, key)
+                return
+
+            if not _apply_button(sess, data):
+                await bot.answer_callback_query(call.id, "Не понял кнопку.")
+                return
+            await asyncio.to_thread(store.set, key, sess)
+
+        # ответ сразу, а клавиатура обновится одной правкой, когда нажатия затихнут
+        await bot.answer_callback_query(call.id)
+        edits.submit(chat_id, call.message.message_id, _step_markup(sess))
+
+
+async def _send_emotions_step(bot: AsyncTeleBot, key: SessionKey, sess: UserSession):
+    chat_id = key[0]
+
+    if not sess.emotions_values:
+        await bot.send_message(
+            chat_id=chat_id,
+            message_thread_id=sess.thread_id,
+            text=f"Не нашёл эмоции для пользователя ({sess.user_folder}). "
+                 f"Проверь файл: {DATA / sess.user_folder / 'emotions.txt'}",
+        )
+        return
+
+    markup = _step_markup(sess)
+    msg = await bot.send_message(
+        chat_id=chat_id,
+        message_thread_id=sess.thread_id,
+        text="Эмоции?",
+        reply_markup=markup,
+    )
+    sess.keyboard_message_id = msg.message_id
+    await asyncio.to_thread(get_session_store().set, key, sess)
+
+
+async def _send_tags_step(bot: AsyncTeleBot, key: SessionKey, sess: UserSession):
+    chat_id = key[0]
+
+    if not sess.tags_values:
+        await bot.send_message(
+            chat_id=chat_id,
+            message_thread_id=sess.thread_id,
+            text=f"Не нашёл теги для пользователя ({sess.user_folder}). "
+                 f"Проверь файл: {DATA / sess.user_folder / 'tags.txt'}",
+        )
+        return
+
+    markup = _step_markup(sess)
+    msg = await bot.send_message(
+        chat_id=chat_id,
+        message_thread_id=sess.thread_id,
+        text="Теги?",
+        reply_markup=markup,
+    )
+    sess.keyboard_message_id = msg.message_id
+    await asyncio.to_thread(get_session_store().set, key, sess)
+
+
+@metrics.timed("handler_seconds", handler="finish")
+async def _finish(bot: AsyncTeleBot, key: SessionKey):
+    chat_id = key[0]
+    store = get_session_store()
+    sess = await asyncio.to_thread(store.get, key)
+    if not sess:
+        return
+
+    emotions, tags, summary = _note_summary(sess)
+
+    log.info(
+        "RESULT | folder=%s; text=%r; first_ts=%s; emotions=%s; tags=%s",
+        sess.user_folder, sess.text, sess.first_message_ts, emotions, tags,
+    )
+
+    result_msg = await bot.send_message(chat_id=chat_id, message_thread_id=sess.thread_id, text=summary)
+
+    # журнал GAS (fsync) и локальные индексы (commit SQLite) — в потоке, event loop не ждёт диск
+    await asyncio.to_thread(_store_note, sess, chat_id, result_msg.message_id, emotions, tags)
+
+    await asyncio.to_thread(store.delete, key)
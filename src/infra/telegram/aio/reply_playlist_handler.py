@@ -0,0 +1,115 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List
+
+from telebot import types
+from telebot.async_telebot import AsyncTeleBot
+
+from src.config import log
+from src.core.playlists import PlaylistPart, get_playlist_store
+from src.infra import metrics
+from src.infra.telegram.msg_handler import _user_folder_from_message
+from src.infra.telegram.reply_playlist_handler import (
+    _continuation_kwargs,
+    _link_by_track,
+    _lookup_note,
+    _new_tracks,
+    _remember_note,
+    _start_playlist,
+    _store_tracks,
+    extract_yandex_music_links,
+)
+from src.infra.yandex_music.get_info import expand_links_async, get_tracks_meta_async
+from src.integrations.gas_client_async import get_async_gas_client
+
+
+async def _is_note(message: types.Message, user_folder: str) -> bool:
+    # индекс записей может сходить в SQLite — в потоке, как и всё ниже, что трогает диск
+    known = await asyncio.to_thread(_lookup_note, message, user_folder)
+    if known is not None:
+        return known
+
+    exists = await get_async_gas_client().exists(user=user_folder, msg_id=message.reply_to_message.message_id)
+    return await asyncio.to_thread(_remember_note, message, user_folder, exists)
+
+
+# (chat_id, note_id) -> [блокировка записи, сколько корутин её держат или ждут]; см. PlaylistStore.editing
+_editing: Dict[tuple[int, int], list] = {}
+
+
+@asynccontextmanager
+async def _editing_note(chat_id: int, note_id: int) -> AsyncIterator[None]:
+    key = (chat_id, note_id)
+    entry = _editing.setdefault(key, [asyncio.Lock(), 0])
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            yield
+    finally:
+        entry[1] -= 1
+        if not entry[1]:
+            del _editing[key]
+
+
+async def _apply_parts(bot: AsyncTeleBot, replied: types.Message, parts: List[PlaylistPart]) -> None:
+    chat_id = replied.chat.id
+    for part in parts:
+        if part.message_id is not None:
+            await bot.edit_message_text(chat_id=chat_id, message_id=part.message_id, text=part.text, disable_web_page_preview=True, parse_mode='HTML')
+            continue
+        sent = await bot.send_message(**_continuation_kwargs(replied, part))
+        part.message_id = sent.message_id
+
+
+def register(bot: AsyncTeleBot) -> None:
+    @bot.message_handler(
+        content_types=["text"],
+        func=lambda m: getattr(m, "reply_to_message", None) is not None
+    )
+    @metrics.timed("handler_seconds", handler="on_reply")
+    async def on_reply(message: types.Message):
+        chat_id = message.chat.id
+        replied_mid = message.reply_to_message.message_id
+        text = message.text or ""
+
+        user_folder = _user_folder_from_message(message)
+
+        if not await _is_note(message, user_folder):
+            return
+
+        links = extract_yandex_music_links(text)
+        if not links:
+            await bot.reply_to(message, "Ссылок Яндекс.Музыки не вижу.")
+            return
+
+        # хранилище плейлистов — SQLite: все обращения к нему в потоке, event loop не ждёт диск
+        store = get_playlist_store()
+        await asyncio.to_thread(_start_playlist, message.reply_to_message)
+        link_by_track, metas = _link_by_track(links, await expand_links_async(links))
+        new_ids = await asyncio.to_thread(store.new_track_ids, chat_id, replied_mid, list(link_by_track))
+        if link_by_track and not new_ids:
+            await bot.reply_to(message, "Эти треки уже в плейлисте.")
+            return
+        new_links = {track_id: link_by_track[track_id] for track_id in new_ids}
+
+        unknown = [link for link in new_links.values() if link not in metas]
+        if unknown:
+            metas.update(await get_tracks_meta_async(unknown))
+        tracks = _new_tracks(new_links, metas)
+        if not tracks:
+            await bot.reply_to(message, "Не смог найти эти треки в Яндекс.Музыке.")
+            return
+
+        # одна корутина на запись от prepare_append до commit_append (PlaylistStore.editing блокировал бы loop)
+        async with _editing_note(chat_id, replied_mid):
+            parts, added = await asyncio.to_thread(store.prepare_append, chat_id, replied_mid, tracks)
+            if added:
+                # см. reply_playlist_handler: состояние сохраняется только после правки в Telegram
+                await _apply_parts(bot, message.reply_to_message, parts)
+                await asyncio.to_thread(store.commit_append, chat_id, replied_mid, parts, added)
+        if added:
+            # fsync журнала и commit SQLite
+            await asyncio.to_thread(_store_tracks, user_folder, replied_mid, added)
+        await bot.delete_message(chat_id=chat_id, message_id=message.message_id)
+
+        log.info("PLAYLIST_ADD | chat_id=%s id=%s links=%s added=%s parts=%s", chat_id, replied_mid, links, len(added), len(parts))
@@ -0,0 +1,69 @@
+import asyncio
+
+from telebot import types
+from telebot.async_telebot import AsyncTeleBot
+
+from src.config import log
+from src.infra import metrics
+from src.infra.telegram import callbacks
+from src.infra.telegram.callbacks import CallbackData, get_router
+from src.infra.telegram.edit_constants import _user_folder_from_user
+from src.infra.telegram.msg_handler import _user_folder_from_message
+from src.infra.telegram.search_handler import (
+    USAGE_TEXT,
+    query_from_command,
+    query_from_results,
+    render_results,
+    search_page,
+)
+
+
+def register(bot: AsyncTeleBot) -> None:
+    @bot.message_handler(commands=["search"])
+    @metrics.timed("handler_seconds", handler="search")
+    async def search(message: types.Message):
+        user_folder = _user_folder_from_message(message)
+        query = query_from_command(message.text)
+
+        log.info("HANDLE search | folder=%s; query=%r", user_folder, query)
+
+        if not query:
+            await bot.reply_to(message, USAGE_TEXT)
+            return
+
+        text, markup = render_results(await asyncio.to_thread(search_page, user_folder, query, 0))
+        await bot.send_message(
+            chat_id=message.chat.id,
+            message_thread_id=getattr(message, "message_thread_id", None),
+            text=text,
+            reply_markup=markup,
+            parse_mode="HTML",
+            disable_web_page_preview=True,
+        )
+
+    @get_router(bot).route(callbacks.SEARCH)
+    @metrics.timed("handler_seconds", handler="cb_search")
+    async def cb_search(call: types.CallbackQuery, data: CallbackData):
+        if data.action == "n":
+            await bot.answer_callback_query(call.id)
+            return
+        query = query_from_results(call.message)
+        try:
+            page = int(data.arg)
+        except ValueError:
+            page = -1
+        if not query or data.action != "p" or page < 0:
+            await bot.answer_callback_query(call.id, callbacks.STALE_TEXT)
+            return
+
+        user_folder = _user_folder_from_user(call.from_user)
+        text, markup = render_results(await asyncio.to_thread(search_page, user_folder, query, page))
+        await bot.answer_callback_query(call.id)
+        await bot.edit_message_text(
+            chat_id=call.message.chat.id,
+            message_id=call.message.message_id,
+            text=text,
+            reply_markup=markup,
+            parse_mode="HTML",
+            disable_web_page_preview=True,
+        )
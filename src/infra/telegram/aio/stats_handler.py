@@ -0,0 +1,53 @@
+import asyncio
+
+from telebot import types
+from telebot.async_telebot import AsyncTeleBot
+
+from src.config import log
+from src.core.note_aggregates import WINDOWS
+from src.infra import metrics
+from src.infra.telegram import callbacks
+from src.infra.telegram.callbacks import CallbackData, get_router
+from src.infra.telegram.edit_constants import _user_folder_from_user
+from src.infra.telegram.msg_handler import _user_folder_from_message
+from src.infra.telegram.stats_handler import build_report, render_report, window_from_command
+
+
+def register(bot: AsyncTeleBot) -> None:
+    @bot.message_handler(commands=["stats"])
+    @metrics.timed("handler_seconds", handler="stats")
+    async def stats(message: types.Message):
+        user_folder = _user_folder_from_message(message)
+        window = window_from_command(message.text)
+
+        log.info("HANDLE stats | folder=%s; window=%s", user_folder, window)
+
+        text, markup = render_report(await asyncio.to_thread(build_report, user_folder, window), window)
+        await bot.send_message(
+            chat_id=message.chat.id,
+            message_thread_id=getattr(message, "message_thread_id", None),
+            text=text,
+            reply_markup=markup,
+            parse_mode="HTML",
+        )
+
+    @get_router(bot).route(callbacks.STATS)
+    @metrics.timed("handler_seconds", handler="cb_stats")
+    async def cb_stats(call: types.CallbackQuery, data: CallbackData):
+        if data.action == "n":
+            await bot.answer_callback_query(call.id)
+            return
+        if data.action != "w" or data.arg not in WINDOWS:
+            await bot.answer_callback_query(call.id, callbacks.STALE_TEXT)
+            return
+
+        user_folder = _user_folder_from_user(call.from_user)
+        text, markup = render_report(await asyncio.to_thread(build_report, user_folder, data.arg), data.arg)
+        await bot.answer_callback_query(call.id)
+        await bot.edit_message_text(
+            chat_id=call.message.chat.id,
+            message_id=call.message.message_id,
+            text=text,
+            reply_markup=markup,
+            parse_mode="HTML",
+        )
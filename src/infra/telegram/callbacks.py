@@ -0,0 +1,140 @@
+import sys
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Awaitable, Callable, Dict, Optional
+
+from telebot import TeleBot, types
+
+if TYPE_CHECKING:
+    # telebot.async_telebot тянет aiohttp — синхронному боту он не нужен
+    from telebot.async_telebot import AsyncTeleBot
+
+from src.config import log
+
+
+# id обработчиков — первый сегмент callback_data
+EMOTIONS = "e"
+TAGS = "t"
+EDIT_CONSTANTS = "c"
+SEARCH = "s"
+STATS = "r"
+
+# Telegram ограничивает callback_data 64 байтами
+MAX_CALLBACK_BYTES = 64
+
+STALE_TEXT = "Кнопка устарела. Начни заново."
+
+_B36 = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+
+def _b36(n: int) -> str:
+    if n <= 0:
+        return "0"
+    out = []
+    while n:
+        n, r = divmod(n, 36)
+        out.append(_B36[r])
+    return "".join(reversed(out))
+
+
+@dataclass(frozen=True)
+class CallbackData:
+    """
+    callback_data вида "<handler>:<version>:<action>:<arg>".
+
+    version — версия констант, из которых собрана клавиатура (base36), 0 — не проверяется;
+    по ней отсекаются нажатия на клавиатуры, собранные до правки emotions.txt/tags.txt.
+    """
+    handler: str
+    version: int = 0
+    action: str = ""
+    arg: str = ""
+
+    def encode(self) -> str:
+        data = f"{self.handler}:{_b36(self.version)}:{self.action}:{self.arg}"
+        if len(data.encode("utf-8")) > MAX_CALLBACK_BYTES:
+            raise ValueError(f"callback_data longer than {MAX_CALLBACK_BYTES} bytes: {data!r}")
+        return data
+
+    @classmethod
+    def decode(cls, data: str) -> Optional["CallbackData"]:
+        """
+        :return: None, если data не в этом формате (например, кнопка старой версии бота)
+        """
+        parts = (data or "").split(":", 3)
+        if len(parts) != 4:
+            return None
+        handler, version, action, arg = parts
+        try:
+            return cls(handler=handler, version=int(version, 36), action=action, arg=arg)
+        except ValueError:
+            return None
+
+
+def callback_data(handler: str, version: int = 0, action: str = "", arg: str | int = "") -> str:
+    return CallbackData(handler=handler, version=version, action=action, arg=str(arg)).encode()
+
+
+class CallbackRouter:
+    """
+    Единственный callback_query_handler бота: выбирает обработчик по id из словаря,
+    вместо цепочки предикатов на каждое нажатие.
+    Неизвестные и старые кнопки получают ответ STALE_TEXT.
+    """
+
+    def __init__(self, bot: TeleBot) -> None:
+        self.bot = bot
+        self._routes: Dict[str, Callable[[types.CallbackQuery, CallbackData], None]] = {}
+        bot.register_callback_query_handler(self.dispatch, func=lambda call: True)
+
+    def route(self, handler: str):
+        def decorator(func):
+            if handler in self._routes:
+                raise ValueError(f"Callback handler {handler!r} already registered")
+            self._routes[handler] = func
+            return func
+        return decorator
+
+    def _resolve(self, call: types.CallbackQuery):
+        data = CallbackData.decode(call.data)
+        func = self._routes.get(data.handler) if data else None
+        if func is None:
+            log.info(f"Stale callback: {call.data!r}")
+        return func, data
+
+    def dispatch(self, call: types.CallbackQuery) -> None:
+        func, data = self._resolve(call)
+        if func is None:
+            self.bot.answer_callback_query(call.id, STALE_TEXT)
+            return
+        func(call, data)
+
+
+class AsyncCallbackRouter(CallbackRouter):
+    """CallbackRouter для AsyncTeleBot: обработчики — корутины."""
+
+    bot: "AsyncTeleBot"
+    _routes: Dict[str, Callable[[types.CallbackQuery, CallbackData], Awaitable[None]]]
+
+    async def dispatch(self, call: types.CallbackQuery) -> None:
+        func, data = self._resolve(call)
+        if func is None:
+            await self.bot.answer_callback_query(call.id, STALE_TEXT)
+            return
+        await func(call, data)
+
+
+def _is_async(bot: "TeleBot | AsyncTeleBot") -> bool:
+    # раз AsyncTeleBot создан, его модуль уже загружен; иначе бот точно синхронный
+    module = sys.modules.get("telebot.async_telebot")
+    return module is not None and isinstance(bot, module.AsyncTeleBot)
+
+
+def get_router(bot: "TeleBot | AsyncTeleBot") -> CallbackRouter:
+    """
+    Роутер бота; создаётся при первом обращении из register() любого модуля.
+    """
+    router = getattr(bot, "callback_router", None)
+    if router is None:
+        router = AsyncCallbackRouter(bot) if _is_async(bot) else CallbackRouter(bot)
+        bot.callback_router = router
+    return router
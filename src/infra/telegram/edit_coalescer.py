@@ -0,0 +1,244 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Dict, Optional
+
+from telebot import TeleBot, types
+
+if TYPE_CHECKING:
+    from telebot.async_telebot import AsyncTeleBot
+
+from src.config import log
+from src.infra.telegram.rate_limit import retry_after
+
+
+# (chat_id, message_id)
+EditKey = tuple[int, int]
+
+# сколько последних отправленных клавиатур помнить, чтобы не слать правку без изменений
+SENT_MEMORY = 10_000
+
+
+@dataclass
+class EditStats:
+    """Счётчики правок клавиатур"""
+    submitted: int = 0
+    sent: int = 0
+    dropped: int = 0  # перекрыты более новой правкой, отменены или ничего не меняли
+    failed: int = 0
+    retried: int = 0  # после 429 клавиатура снова ждёт отправки (retry_after)
+
+    @property
+    def saved(self) -> int:
+        """Сколько запросов к Telegram не понадобилось"""
+        return self.dropped
+
+
+@dataclass
+class _Pending:
+    markup: types.JsonSerializable
+    first_at: float
+    handle: Any  # threading.Timer | asyncio.TimerHandle
+    due: bool = False  # таймер сработал, пока шла предыдущая правка этого сообщения
+
+
+def _not_modified(e: Exception) -> bool:
+    return "message is not modified" in str(e)
+
+
+class _CoalescerBase:
+    """
+    Склеивает частые правки клавиатуры одного сообщения.
+
+    Каждое нажатие только запоминает новую клавиатуру; в Telegram уходит последняя,
+    когда нажатия затихли на delay секунд (но не позже max_delay после первого из них).
+    Правки одного сообщения уходят по очереди: пока одна в пути, следующая ждёт её,
+    иначе более старая клавиатура могла бы дойти последней. После 429 клавиатура остаётся
+    неотправленной и уходит через retry_after, если её раньше не заменит более новая.
+    """
+
+    def __init__(self, delay: float = 0.4, max_delay: float = 2.0) -> None:
+        """
+        :param delay: пауза после последнего нажатия, сек
+        :param max_delay: максимальная задержка от первого неотправленного нажатия, сек
+        """
+        self.delay = delay
+        self.max_delay = max_delay
+        self.stats = EditStats()
+        self._lock = threading.Lock()
+        self._pending: Dict[EditKey, _Pending] = {}
+        self._sent: OrderedDict[EditKey, str] = OrderedDict()
+        # сообщения, правка которых сейчас отправляется
+        self._in_flight: set[EditKey] = set()
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def _replace(self, key: EditKey) -> tuple[float, float]:
+        """
+        Отменяет неотправленную правку key.
+
+        :return: (время первого неотправленного нажатия, через сколько отправлять)
+        """
+        now = time.monotonic()
+        self.stats.submitted += 1
+        prev = self._pending.pop(key, None)
+        if prev is None:
+            first_at = now
+        else:
+            prev.handle.cancel()
+            self.stats.dropped += 1
+            first_at = prev.first_at
+        return first_at, max(0.0, min(self.delay, first_at + self.max_delay - now))
+
+    def _discard(self, key: EditKey) -> None:
+        prev = self._pending.pop(key, None)
+        if prev is not None:
+            prev.handle.cancel()
+            self.stats.dropped += 1
+        self._sent.pop(key, None)
+
+    def _take(self, key: EditKey) -> Optional[tuple[types.JsonSerializable, str]]:
+        """
+        :return: (клавиатура, её JSON) к отправке или None, если отправлять нечего
+        """
+        with self._lock:
+            item = self._pending.get(key)
+            if item is None:
+                return None
+            if key in self._in_flight:
+                # отправит поток предыдущей правки, когда та дойдёт (_done)
+                item.due = True
+                return None
+            del self._pending[key]
+            markup_json = item.markup.to_json()
+            if self._sent.get(key) == markup_json:
+                self.stats.dropped += 1
+                return None
+            self._in_flight.add(key)
+        return item.markup, markup_json
+
+    def _schedule(self, key: EditKey, delay: float) -> Any:
+        """Запустить отправку key через delay секунд; возвращает то, что хранится в _Pending.handle"""
+        raise NotImplementedError
+
+    def _done(
+        self, key: EditKey, markup: types.JsonSerializable, markup_json: str, error: Optional[Exception],
+    ) -> bool:
+        """
+        :return: True — пока правка была в пути, подошёл срок следующей: отправить её сейчас
+        """
+        with self._lock:
+            self._in_flight.discard(key)
+            item = self._pending.get(key)
+            again = item is not None and item.due
+            delay = retry_after(error) if error is not None else None
+            if delay is not None:
+                # не дошла: без более новой правки эта снова ждёт; более новая уходит не раньше retry_after
+                self.stats.retried += 1
+                log.warning(f"edit_message_reply_markup: 429 in chat {key[0]}, retry after {delay}s")
+                if item is None:
+                    self._pending[key] = _Pending(
+                        markup=markup, first_at=time.monotonic(), handle=self._schedule(key, delay),
+                    )
+                elif again:
+                    item.due = False
+                    item.handle = self._schedule(key, delay)
+                return False
+            if error is None:
+                self.stats.sent += 1
+            elif _not_modified(error):
+                self.stats.dropped += 1
+            else:
+                self.stats.failed += 1
+                log.warning(f"edit_message_reply_markup failed: {error}")
+                return again
+            self._sent[key] = markup_json
+            self._sent.move_to_end(key)
+            while len(self._sent) > SENT_MEMORY:
+                self._sent.popitem(last=False)
+            return again
+
+
+class EditCoalescer(_CoalescerBase):
+    """Склейка правок для TeleBot: отправка из threading.Timer."""
+
+    def __init__(self, bot: TeleBot, delay: float = 0.4, max_delay: float = 2.0) -> None:
+        super().__init__(delay=delay, max_delay=max_delay)
+        self.bot = bot
+
+    def submit(self, chat_id: int, message_id: int, markup: types.JsonSerializable) -> None:
+        key = (chat_id, message_id)
+        with self._lock:
+            first_at, delay = self._replace(key)
+            self._pending[key] = _Pending(markup=markup, first_at=first_at, handle=self._schedule(key, delay))
+
+    def _schedule(self, key: EditKey, delay: float) -> threading.Timer:
+        timer = threading.Timer(delay, self._flush, args=(key,))
+        timer.daemon = True
+        timer.start()
+        return timer
+
+    def discard(self, chat_id: int, message_id: int) -> None:
+        """Сообщение удаляется — править его больше не нужно."""
+        with self._lock:
+            self._discard((chat_id, message_id))
+
+    def _flush(self, key: EditKey) -> None:
+        while True:
+            taken = self._take(key)
+            if taken is None:
+                return
+            markup, markup_json = taken
+            error = None
+            try:
+                self.bot.edit_message_reply_markup(chat_id=key[0], message_id=key[1], reply_markup=markup)
+            except Exception as e:
+                error = e
+            if not self._done(key, markup, markup_json, error):
+                return
+
+
+class AsyncEditCoalescer(_CoalescerBase):
+    """Склейка правок для AsyncTeleBot: отправка через loop.call_later."""
+
+    def __init__(self, bot: "AsyncTeleBot", delay: float = 0.4, max_delay: float = 2.0) -> None:
+        super().__init__(delay=delay, max_delay=max_delay)
+        self.bot = bot
+        self._tasks: set[asyncio.Task] = set()
+
+    def submit(self, chat_id: int, message_id: int, markup: types.JsonSerializable) -> None:
+        key = (chat_id, message_id)
+        with self._lock:
+            first_at, delay = self._replace(key)
+            self._pending[key] = _Pending(markup=markup, first_at=first_at, handle=self._schedule(key, delay))
+
+    def _schedule(self, key: EditKey, delay: float) -> asyncio.TimerHandle:
+        return asyncio.get_running_loop().call_later(delay, self._spawn, key)
+
+    def discard(self, chat_id: int, message_id: int) -> None:
+        with self._lock:
+            self._discard((chat_id, message_id))
+
+    def _spawn(self, key: EditKey) -> None:
+        task = asyncio.get_running_loop().create_task(self._flush(key))
+        # ссылка на задачу, чтобы её не собрал GC
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _flush(self, key: EditKey) -> None:
+        while True:
+            taken = self._take(key)
+            if taken is None:
+                return
+            markup, markup_json = taken
+            error = None
+            try:
+                await self.bot.edit_message_reply_markup(chat_id=key[0], message_id=key[1], reply_markup=markup)
+            except Exception as e:
+                error = e
+            if not self._done(key, markup, markup_json, error):
+                return
@@ -3,8 +3,11 @@ from __future__ import annotations
 from pathlib import Path
 from telebot import TeleBot, types
 
-from src.config import log, ROOT
-from src.common.readers import txt_add
+from src.config import log, DATA
+from src.core.constants_store import get_constants_store
+from src.core.user_constants import constants_paths, get_user_constants_cache
+from src.infra.telegram import callbacks
+from src.infra.telegram.callbacks import CallbackData, callback_data, get_router
 
 
 CONSTANTS_TYPES = ["Эмоции", "Теги"]
@@ -32,15 +35,26 @@ def _user_folder_from_user(u: types.User) -> str:
 
 def _constants_path_for_user(user_folder: str, type_name: str) -> Path:
     """
-    ROOT/data/<user_folder>/emotions.txt или tags.txt
+    DATA/<user_folder>/emotions.txt или tags.txt
     """
-    base = ROOT / "data" / user_folder
-    if type_name == "Эмоции":
-        return base / "emotions.txt"
-    if type_name == "Теги":
-        return base / "tags.txt"
+    paths = constants_paths(user_folder)
+    if type_name in paths:
+        return paths[type_name]
     # на всякий
-    return base / f"{type_name}.txt"
+    return DATA / user_folder / f"{type_name}.txt"
+
+
+def _save_values(user_folder: str, type_name: str, text: str) -> None:
+    """
+    Дописывает значения "через запятую" в файл констант пользователя.
+    """
+    values = [v.strip() for v in text.split(",") if v.strip()]
+
+    fp = _constants_path_for_user(user_folder, type_name)
+
+    # только новые значения, дубли пропускаются
+    if get_constants_store(fp).add(values):
+        get_user_constants_cache().invalidate(user_folder)
 
 
 def register(bot: TeleBot) -> None:
@@ -50,13 +64,13 @@ def register(bot: TeleBot) -> None:
         user = message.from_user
         user_folder = _user_folder_from_user(user)
 
-        log.info(f"HANDLE edit_constants | from user: {user} | folder={user_folder}")
+        log.info("HANDLE edit_constants | from user: %s | folder=%s", user, user_folder)
 
         markup = types.InlineKeyboardMarkup()
         for idx, constant_type in enumerate(CONSTANTS_TYPES):
             btn = types.InlineKeyboardButton(
                 text=constant_type,
-                callback_data=f"edit_constants:{idx}",
+                callback_data=callback_data(callbacks.EDIT_CONSTANTS, action="s", arg=idx),
             )
             markup.add(btn)
 
@@ -73,16 +87,19 @@ def register(bot: TeleBot) -> None:
             reply_markup=markup,
         )
 
-    @bot.callback_query_handler(func=lambda call: call.data.startswith("edit_constants:"))
-    def ready_to_handle(call: types.CallbackQuery):
+    @get_router(bot).route(callbacks.EDIT_CONSTANTS)
+    def ready_to_handle(call: types.CallbackQuery, data: CallbackData):
         user = call.from_user  # важнее чем call.message.from_user
         user_folder = _user_folder_from_user(user)
 
-        type_idx = int(call.data.split(":")[1])
-        type_name = CONSTANTS_TYPES[type_idx]
+        try:
+            type_name = CONSTANTS_TYPES[int(data.arg)]
+        except (ValueError, IndexError):
+            bot.answer_callback_query(call.id, callbacks.STALE_TEXT)
+            return
 
         log.info(
-            f"HANDLE ready_to_handle | from user: {user}, folder={user_folder}, type_name={type_name}"
+            "HANDLE ready_to_handle | from user: %s, folder=%s, type_name=%s", user, user_folder, type_name
         )
 
         try:
@@ -102,20 +119,10 @@ def register(bot: TeleBot) -> None:
     def handle_values(message: types.Message, type_name: str, user_folder: str):
         user = message.from_user
         log.info(
-            f"HANDLE handle_values | from user: {user} | folder={user_folder} | type={type_name}"
+            "HANDLE handle_values | from user: %s | folder=%s | type=%s", user, user_folder, type_name
         )
 
-        text = message.text or ""
-        values = [v.strip() for v in text.split(",") if v.strip()]
-        payload = "\n".join(values)
-
-        fp = _constants_path_for_user(user_folder, type_name)
-
-        # mkdir надо на папку, а не на файл
-        fp.parent.mkdir(parents=True, exist_ok=True)
-
-        if payload:
-            txt_add(fp, payload)
+        _save_values(user_folder, type_name, message.text or "")
 
         # попробуем убрать промпт "Введите новые значения..."
         try:
@@ -0,0 +1,393 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Deque, Dict, List, Optional, Sequence
+
+from src.common.readers import json_array_items
+from src.config import DATA, load_config, log
+from src.core.note_aggregates import get_note_aggregates
+from src.core.note_index import get_note_index
+from src.core.note_search import get_note_search
+from src.infra.telegram.edit_constants import _user_folder_from_user
+from src.infra.telegram.msg_handler import TZ, _format_dt
+from src.integrations.gas_client import GasClient, backoff_delay, get_gas_client, note_record
+
+
+# итоговое сообщение бота (_note_summary): текст, эмоции, теги, дата; дальше может идти плейлист
+NOTE_RE = re.compile(
+    r"^(?P<text>.*)\nЭмоции: (?P<emotions>.*)\nТеги: (?P<tags>.*)\n"
+    r"(?P<when>\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})(?:\n|$)",
+    flags=re.DOTALL,
+)
+
+
+@dataclass(frozen=True)
+class ExportNote:
+    user: str
+    msg_id: int
+    when: str  # "YYYY-MM-DD HH:MM:SS", как у _format_dt
+    text: str
+    emotions: List[str]
+    tags: List[str]
+
+
+@dataclass
+class ImportStats:
+    messages: int = 0
+    notes: int = 0
+    skipped: int = 0
+    batches: int = 0
+    retries: int = 0
+    failed_batches: int = 0
+
+
+@dataclass
+class _Batch:
+    user: str
+    end: int  # позиция в messages сразу после последнего сообщения пачки
+    notes: List[ExportNote] = field(default_factory=list)
+
+
+def message_text(message: Dict[str, Any]) -> str:
+    """
+    Текст сообщения из экспорта: строка или список из строк и {"type": ..., "text": ...} для разметки.
+    """
+    text = message.get("text") or ""
+    if isinstance(text, list):
+        text = "".join(part if isinstance(part, str) else str(part.get("text", "")) for part in text)
+    return text
+
+
+def message_ts(message: Dict[str, Any]) -> Optional[int]:
+    """
+    Unix-время сообщения. В старых экспортах нет date_unixtime — тогда date,
+    которое Telegram пишет во времени экспортировавшего; считаем, что это часовой пояс бота.
+    """
+    try:
+        if message.get("date_unixtime"):
+            return int(message["date_unixtime"])
+        return int(datetime.fromisoformat(message["date"]).replace(tzinfo=TZ).timestamp())
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _labels(value: str) -> List[str]:
+    value = value.strip()
+    if not value or value == "—":
+        return []
+    return [v.strip() for v in value.split(",") if v.strip()]
+
+
+def note_from_message(
+    message: Dict[str, Any],
+    user: Optional[str] = None,
+    authors: Optional[Sequence[str]] = None,
+) -> Optional[ExportNote]:
+    """
+    Сообщение из экспорта -> запись для upsert_note.
+    Итоговые сообщения бота разбираются обратно в текст, эмоции и теги; остальные — запись без них.
+
+    :param user: папка пользователя; None — по автору сообщения, как у бота (username нет — имя).
+                 Итоговые сообщения пишет бот, их автор — не владелец записи: для них user обязателен
+    :param authors: чьи сообщения брать (from или from_id); пусто — всех
+    :return: None — служебное сообщение, чужой автор, нет текста или даты
+    :raises ValueError: итоговое сообщение бота, а user не задан
+    """
+    if message.get("type") != "message":
+        return None
+    if authors and message.get("from") not in authors and message.get("from_id") not in authors:
+        return None
+    text = message_text(message).strip()
+    ts = message_ts(message)
+    if not text or ts is None:
+        return None
+    try:
+        msg_id = int(message["id"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+    m = NOTE_RE.match(text)
+    if m and user is None:
+        raise ValueError(
+            f"message {msg_id} is a bot note summary: pass the owner's folder explicitly (--user), "
+            f"otherwise it would be written to the folder of {message.get('from')!r}"
+        )
+
+    # в экспорте нет username — остаётся имя автора, как у _user_folder_from_message без username
+    folder = user or _user_folder_from_user(SimpleNamespace(username=None, first_name=message.get("from") or ""))
+
+    if m:
+        return ExportNote(
+            user=folder,
+            msg_id=msg_id,
+            when=m.group("when"),
+            text=m.group("text"),
+            emotions=_labels(m.group("emotions")),
+            tags=_labels(m.group("tags")),
+        )
+    return ExportNote(user=folder, msg_id=msg_id, when=_format_dt(ts), text=text, emotions=[], tags=[])
+
+
+def default_checkpoint(export: Path) -> Path:
+    """DATA/import/<имя экспорта>-<хеш пути>.json: у каждого файла экспорта свой прогресс."""
+    digest = hashlib.blake2b(str(export.resolve()).encode("utf-8"), digest_size=4).hexdigest()
+    return DATA / "import" / f"{export.stem}-{digest}.json"
+
+
+class HistoryImporter:
+    """
+    Импорт записей из экспорта чата Telegram (result.json) в таблицу.
+
+    - файл читается потоково (json_array_items), в памяти — только пачки в полёте
+    - записи уходят в GAS пачками action=batch, одновременно — не больше concurrency запросов
+    - upsert_note идемпотентен: упавшую пачку (и отклонённые GAS операции) можно повторить
+    - после каждой отправленной пачки в checkpoint пишется позиция в messages;
+      пачки завершаются по порядку, поэтому позиция не перескакивает через неотправленное
+    - отправленные записи попадают и в локальные индекс id, поиск (/search) и счётчики (/stats);
+      запущенный бот находит их в индексе id без перезапуска
+    """
+
+    def __init__(
+        self,
+        client: GasClient,
+        checkpoint: Path,
+        *,
+        batch_size: int = 100,
+        concurrency: int = 4,
+        retries: int = 3,
+        timeout: float = 120,
+    ) -> None:
+        """
+        :param checkpoint: файл с прогрессом импорта
+        :param batch_size: сколько записей отправлять одним batch-запросом
+        :param concurrency: сколько batch-запросов держать в полёте
+        :param retries: сколько раз повторять пачку, которую GAS не принял
+        :param timeout: таймаут одного batch-запроса, сек
+        """
+        self.client = client
+        self.checkpoint = Path(checkpoint)
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.retries = retries
+        self.timeout = timeout
+        self.stats = ImportStats()
+
+        self.position = 0  # сколько сообщений из messages уже пройдено
+        self.imported = 0  # сколько записей отправлено за все запуски
+
+        self._header: Dict[str, Any] = {}
+        self._failed = False
+
+    def _load_checkpoint(self, export: Path) -> None:
+        try:
+            with open(self.checkpoint, encoding="utf-8") as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            log.warning(f"Import: can't read checkpoint {self.checkpoint}, starting over: {e}")
+            return
+        if state.get("export") != str(export.resolve()):
+            log.warning(f"Import: checkpoint {self.checkpoint} is for {state.get('export')}, starting over")
+            return
+        self.position = int(state.get("position", 0))
+        self.imported = int(state.get("imported", 0))
+
+    def _save_checkpoint(self, export: Path) -> None:
+        self.checkpoint.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.checkpoint.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"export": str(export.resolve()), "position": self.position, "imported": self.imported}, f)
+        os.replace(tmp, self.checkpoint)
+
+    def _send(self, batch: _Batch) -> bool:
+        """
+        Отправляет пачку (в потоке пула); отклонённые GAS операции повторяются с паузой.
+
+        :return: False — пачка так и не принята
+        """
+        ops = [
+            {
+                "action": "upsert_note",
+                "record": note_record(msg_id=n.msg_id, when=n.when, what=n.text, emotions=n.emotions, tags=n.tags),
+            }
+            for n in batch.notes
+        ]
+        attempt = 0
+        while True:
+            resp = self.client.batch(user=batch.user, ops=ops, timeout=self.timeout)
+            results = resp.get("results")
+            if resp.get("ok") and isinstance(results, list) and len(results) == len(ops):
+                rejected = [(op, r) for op, r in zip(ops, results) if not (isinstance(r, dict) and r.get("ok"))]
+                if not rejected:
+                    return True
+                ops = [op for op, _ in rejected]
+                error = f"{len(rejected)} of {len(results)} ops rejected, first: {rejected[0][1]}"
+            else:
+                error = resp.get("error")
+
+            attempt += 1
+            if attempt > self.retries:
+                log.error(f"Import: batch up to position {batch.end} failed: {error}")
+                return False
+            self.stats.retries += 1
+            delay = backoff_delay(attempt - 1, self.client.backoff, self.client.backoff_max)
+            log.warning(f"Import: batch failed ({error}), retry {attempt}/{self.retries} in {delay:.2f}s")
+            time.sleep(delay)
+
+    def _complete(self, export: Path, batch: _Batch, future: "Future[bool]") -> None:
+        """
+        Старейшая пачка в полёте завершилась: позиция сдвигается, записи — в локальные индексы.
+        После первой неудачной пачки позиция больше не сдвигается.
+        """
+        if self._failed:
+            return
+        if not future.result():
+            self._failed = True
+            self.stats.failed_batches += 1
+            return
+
+        # в пачке записи одного пользователя; id чата — из шапки экспорта
+        chat_id = int(self._header.get("id") or 0)
+        # без этого у пользователя с полным индексом (warmup) reply на импортированную запись — "не запись"
+        get_note_index().add_many(batch.user, [n.msg_id for n in batch.notes])
+        get_note_search().add_notes(
+            batch.user, chat_id, [(n.msg_id, n.when, n.text, n.emotions, n.tags) for n in batch.notes],
+        )
+        get_note_aggregates().add_notes(batch.user, [(n.msg_id, n.when, n.emotions, n.tags) for n in batch.notes])
+
+        self.stats.batches += 1
+        self.imported += len(batch.notes)
+        self.position = batch.end
+        self._save_checkpoint(export)
+        log.info(f"Import: {self.imported} notes sent, position {self.position}")
+
+    def run(
+        self,
+        export: Path | str,
+        *,
+        user: Optional[str] = None,
+        authors: Optional[Sequence[str]] = None,
+        restart: bool = False,
+    ) -> bool:
+        """
+        :param export: result.json из экспорта чата Telegram
+        :param user: в чью папку (таблицу) писать; None — по автору каждого сообщения
+                     (только для экспорта без итоговых сообщений бота, см. note_from_message)
+        :param authors: чьи сообщения импортировать (from или from_id); пусто — всех
+        :param restart: не продолжать с checkpoint, а начать сначала
+        :return: True — файл импортирован до конца
+        """
+        export = Path(export)
+        if not restart:
+            self._load_checkpoint(export)
+        if self.position:
+            log.info(f"Import: resuming {export} from position {self.position} ({self.imported} notes sent)")
+
+        in_flight: Deque[tuple[_Batch, "Future[bool]"]] = deque()
+        batch: Optional[_Batch] = None
+        seen = 0
+        rejected = False
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="import") as pool:
+            def submit(b: _Batch) -> None:
+                # ограничение по памяти и по нагрузке на GAS: ждём старейшую пачку
+                while len(in_flight) >= self.concurrency:
+                    self._complete(export, *in_flight.popleft())
+                in_flight.append((b, pool.submit(self._send, b)))
+
+            for position, message in enumerate(json_array_items(export, "messages", header=self._header)):
+                if self._failed:
+                    break
+                seen = position + 1
+                if position < self.position:
+                    continue
+                self.stats.messages += 1
+                try:
+                    note = note_from_message(message, user=user, authors=authors)
+                except ValueError as e:
+                    # прочитанное до этого сообщения ещё отправляется и попадает в checkpoint
+                    log.error(f"Import: {e}")
+                    rejected = True
+                    break
+                if note is None:
+                    self.stats.skipped += 1
+                    continue
+                self.stats.notes += 1
+                if batch is not None and (batch.user != note.user or len(batch.notes) >= self.batch_size):
+                    submit(batch)
+                    batch = None
+                if batch is None:
+                    batch = _Batch(user=note.user, end=position + 1)
+                batch.notes.append(note)
+                batch.end = position + 1
+
+            if batch is not None and not self._failed:
+                submit(batch)
+            while in_flight:
+                self._complete(export, *in_flight.popleft())
+
+        if self._failed or rejected:
+            log.error(f"Import stopped at position {self.position}; run again to resume: {self.stats}")
+            return False
+        # хвост без записей (служебные сообщения и т.п.) тоже пройден
+        self.position = max(self.position, seen)
+        self._save_checkpoint(export)
+        log.info(f"Import finished: {self.imported} notes sent in total, {self.stats}")
+        return True
+
+
+def _parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Импорт записей из экспорта чата Telegram (result.json) в таблицу.",
+    )
+    parser.add_argument("export", type=Path, help="result.json из экспорта чата (Telegram Desktop, формат JSON)")
+    parser.add_argument(
+        "--user",
+        help="Папка пользователя, в чью таблицу писать; по умолчанию — по автору сообщения. "
+             "Обязательно, если в экспорте есть итоговые сообщения бота: их автор — бот, а не пользователь",
+    )
+    parser.add_argument(
+        "--from", dest="authors", action="append", default=[],
+        help="Импортировать только сообщения этого автора (имя или from_id); можно несколько раз",
+    )
+    parser.add_argument("--batch-size", type=int, default=100, help="Записей в одном batch-запросе к GAS")
+    parser.add_argument("--concurrency", type=int, default=4, help="Сколько batch-запросов отправлять одновременно")
+    parser.add_argument("--retries", type=int, default=3, help="Сколько раз повторять пачку, которую GAS не принял")
+    parser.add_argument("--timeout", type=float, default=120, help="Таймаут batch-запроса, сек")
+    parser.add_argument("--checkpoint", type=Path, help="Файл прогресса; по умолчанию DATA/import/<экспорт>-<хеш>.json")
+    parser.add_argument("--restart", action="store_true", help="Начать сначала, не глядя на checkpoint")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = _parse_args(argv)
+    load_config()
+    importer = HistoryImporter(
+        get_gas_client(),
+        args.checkpoint or default_checkpoint(args.export),
+        batch_size=args.batch_size,
+        concurrency=args.concurrency,
+        retries=args.retries,
+        timeout=args.timeout,
+    )
+    try:
+        done = importer.run(args.export, user=args.user, authors=args.authors, restart=args.restart)
+    except KeyboardInterrupt:
+        # отправленные пачки уже в checkpoint
+        log.info(f"Import interrupted at position {importer.position}; run again to resume")
+        return 1
+    return 0 if done else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,198 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Iterable, List, Optional, Sequence
+
+from telebot import types
+
+from src.infra.telegram.callbacks import callback_data
+
+
+# Telegram принимает не больше ~100 кнопок в одной клавиатуре
+COLS = 3
+PAGE_ROWS = 8
+PAGE_SIZE = COLS * PAGE_ROWS
+
+
+class CachedMarkup(types.JsonSerializable):
+    """
+    Уже сериализованная клавиатура: TeleBot вызывает to_json() и получает готовую строку.
+    """
+
+    def __init__(self, markup_json: str) -> None:
+        self.markup_json = markup_json
+
+    def to_json(self) -> str:
+        return self.markup_json
+
+
+@dataclass
+class KeyboardStats:
+    """Счётчики кеша клавиатур"""
+    hits: int = 0
+    misses: int = 0
+
+
+def selection_mask(selected_idx: Iterable[int]) -> int:
+    mask = 0
+    for idx in selected_idx:
+        mask |= 1 << idx
+    return mask
+
+
+def first_letters(values: Sequence[str]) -> List[str]:
+    """Первые буквы значений (без повторов, по алфавиту) — для страницы поиска."""
+    return sorted({v[0].upper() for v in values if v})
+
+
+def _visible_indexes(values: Sequence[str], letter: str) -> List[int]:
+    if not letter:
+        return list(range(len(values)))
+    return [i for i, v in enumerate(values) if v[:1].upper() == letter]
+
+
+class KeyboardRenderer:
+    """
+    Постраничные клавиатуры выбора эмоций/тегов.
+
+    Готовый JSON кешируется по (версия констант, handler, страница, фильтр, маска выбранных):
+    повторное нажатие той же кнопки или возврат на страницу — попадание в кеш.
+
+    Действия в callback_data (см. callbacks.CallbackData):
+    - x:{idx}    — выбрать/снять значение
+    - p:{page}   — перейти на страницу
+    - s          — страница поиска по первой букве
+    - f:{letter} — показать значения на букву; пустая буква — все значения
+    - d          — готово
+    """
+
+    def __init__(self, max_size: int = 4096, cols: int = COLS, page_size: int = PAGE_SIZE) -> None:
+        self.max_size = max_size
+        self.cols = cols
+        self.page_size = page_size
+        self.stats = KeyboardStats()
+        self._lock = threading.Lock()
+        self._cache: OrderedDict[tuple, CachedMarkup] = OrderedDict()
+
+    def render(
+        self,
+        values: Sequence[str],
+        version: int,
+        selected_idx: Iterable[int],
+        handler: str,
+        page: int = 0,
+        letter: str = "",
+        picking_letter: bool = False,
+    ) -> CachedMarkup:
+        """
+        :param values: все значения (эмоции или теги)
+        :param version: версия констант пользователя — меняется вместе с values; 0 — не кешировать
+        :param selected_idx: выбранные индексы
+        :param handler: id обработчика в callback_data (callbacks.EMOTIONS/TAGS)
+        :param page: номер страницы (выходящий за границы прижимается к ним)
+        :param letter: фильтр по первой букве; "" — без фильтра
+        :param picking_letter: показать страницу выбора буквы
+        """
+        if not version:
+            self.stats.misses += 1
+            return self._build(values, version, selected_idx, handler, page, letter, picking_letter)
+
+        key = (version, handler, page, letter, picking_letter, selection_mask(selected_idx))
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self.stats.hits += 1
+                return cached
+            self.stats.misses += 1
+
+        cached = self._build(values, version, selected_idx, handler, page, letter, picking_letter)
+        with self._lock:
+            self._cache[key] = cached
+            while len(self._cache) > self.max_size:
+                self._cache.popitem(last=False)
+        return cached
+
+    def _build(
+        self,
+        values: Sequence[str],
+        version: int,
+        selected_idx: Iterable[int],
+        handler: str,
+        page: int,
+        letter: str,
+        picking_letter: bool,
+    ) -> CachedMarkup:
+        def cb(action: str, arg: str | int = "") -> str:
+            return callback_data(handler, version, action, arg)
+
+        if picking_letter:
+            markup = self._letters_markup(values, cb)
+        else:
+            markup = self._grid_markup(values, set(selected_idx), cb, page, letter)
+        return CachedMarkup(markup.to_json())
+
+    def _grid_markup(
+        self,
+        values: Sequence[str],
+        selected_idx: set[int],
+        cb: Callable[..., str],
+        page: int,
+        letter: str,
+    ) -> types.InlineKeyboardMarkup:
+        markup = types.InlineKeyboardMarkup()
+
+        visible = _visible_indexes(values, letter)
+        pages = max(1, -(-len(visible) // self.page_size))
+        page = min(max(page, 0), pages - 1)
+        on_page = visible[page * self.page_size:(page + 1) * self.page_size]
+
+        for i in range(0, len(on_page), self.cols):
+            row_btns = []
+            for idx in on_page[i:i + self.cols]:
+                text = values[idx]
+                if idx in selected_idx:
+                    text = f"✅ {text}"
+                row_btns.append(types.InlineKeyboardButton(text=text, callback_data=cb("x", idx)))
+            markup.row(*row_btns)
+
+        nav = []
+        if pages > 1:
+            nav.append(types.InlineKeyboardButton(text="«", callback_data=cb("p", (page - 1) % pages)))
+            nav.append(types.InlineKeyboardButton(text=f"{page + 1}/{pages}", callback_data=cb("p", page)))
+            nav.append(types.InlineKeyboardButton(text="»", callback_data=cb("p", (page + 1) % pages)))
+        if letter or len(values) > self.page_size:
+            nav.append(types.InlineKeyboardButton(text=f"🔎 {letter}" if letter else "🔎", callback_data=cb("s")))
+        if nav:
+            markup.row(*nav)
+
+        markup.row(types.InlineKeyboardButton(text="✅ Готово", callback_data=cb("d")))
+        return markup
+
+    def _letters_markup(self, values: Sequence[str], cb: Callable[..., str]) -> types.InlineKeyboardMarkup:
+        markup = types.InlineKeyboardMarkup()
+
+        letters = first_letters(values)
+        # буквы плотнее, чем значения: 6 в ряд
+        for i in range(0, len(letters), 6):
+            markup.row(*[
+                types.InlineKeyboardButton(text=ch, callback_data=cb("f", ch))
+                for ch in letters[i:i + 6]
+            ])
+
+        markup.row(types.InlineKeyboardButton(text="Все", callback_data=cb("f")))
+        markup.row(types.InlineKeyboardButton(text="✅ Готово", callback_data=cb("d")))
+        return markup
+
+
+_renderer: Optional[KeyboardRenderer] = None
+_renderer_lock = threading.Lock()
+
+
+def get_keyboard_renderer() -> KeyboardRenderer:
+    global _renderer
+    if _renderer is None:
+        with _renderer_lock:
+            if _renderer is None:
+                _renderer = KeyboardRenderer()
+    return _renderer
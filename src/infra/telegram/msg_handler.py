@@ -1,38 +1,33 @@
-from dataclasses import dataclass, field
 from datetime import datetime, timezone
 from zoneinfo import ZoneInfo
-from pathlib import Path
-from typing import Dict, List, Set, Optional
+from typing import List
 
 from telebot import TeleBot, types
 
-from src.config import log, ROOT
-from src.common.readers import txt_read
-from src.integrations.gas_client import get_gas_client
+from src.config import config, log, DATA
+from src.core.note_aggregates import get_note_aggregates
+from src.core.note_index import get_note_index
+from src.core.note_search import get_note_search
+from src.core.sessions import SessionKey, UserSession, get_session_store
+from src.core.user_constants import get_user_constants_cache
+from src.infra import metrics
+from src.infra.telegram import callbacks
+from src.infra.telegram.callbacks import CallbackData, get_router
+from src.infra.telegram.edit_coalescer import EditCoalescer
+from src.infra.telegram.keyboards import CachedMarkup, get_keyboard_renderer
+from src.integrations.gas_writer import get_gas_writer
 
 
 TZ = ZoneInfo("Asia/Yekaterinburg")
 
 
-@dataclass
-class UserSession:
-    text: str
-    first_message_ts: int  # message.date (unix)
-    emotions_idx: Set[int] = field(default_factory=set)
-    tags_idx: Set[int] = field(default_factory=set)
-    step: str = "emotions"  # emotions | tags
-    keyboard_message_id: Optional[int] = None
-    thread_id: Optional[int] = None
+def _message_session_key(message: types.Message) -> SessionKey:
+    return message.chat.id, message.from_user.id, getattr(message, "message_thread_id", None)
 
-    # ВАЖНО: теперь значения зависят от юзера
-    emotions_values: List[str] = field(default_factory=list)
-    tags_values: List[str] = field(default_factory=list)
 
-    # полезно для логов/отладки
-    user_folder: str = ""
-
-
-SESSIONS: Dict[int, UserSession] = {}
+def _callback_session_key(call: types.CallbackQuery) -> SessionKey:
+    # клавиатура отправлена в тот же тред, что и исходное сообщение
+    return call.message.chat.id, call.from_user.id, getattr(call.message, "message_thread_id", None)
 
 
 def _sanitize_folder_name(name: str) -> str:
@@ -64,199 +59,207 @@ def _user_folder_from_message(message: types.Message) -> str:
     return _sanitize_folder_name(combined)
 
 
-def _paths_for_user_folder(user_folder: str) -> Dict[str, Path]:
-    base = ROOT / "data" / user_folder
-    return {
-        "Эмоции": base / "emotions.txt",
-        "Теги": base / "tags.txt",
-    }
-
-
-def _load_user_constants(user_folder: str) -> tuple[List[str], List[str]]:
+def _load_user_constants(user_folder: str) -> tuple[List[str], List[str], int]:
     """
-    Читает эмоции/теги из папки пользователя.
-    Если файлов нет — кидаем понятную ошибку в лог и возвращаем пустые списки.
+    Эмоции/теги из папки пользователя (через кеш, без чтения диска на каждое сообщение).
+    Если файлов нет — ошибка в логе и пустые списки.
+
+    :return: (эмоции, теги, версия констант)
     """
-    paths = _paths_for_user_folder(user_folder)
-    emotions_path = paths["Эмоции"]
-    tags_path = paths["Теги"]
+    constants = get_user_constants_cache().get(user_folder)
+    return list(constants.emotions), list(constants.tags), constants.version
 
-    emotions: List[str] = []
-    tags: List[str] = []
 
-    try:
-        emotions = txt_read(emotions_path)
-    except Exception as e:
-        log.error(f"Can't read emotions file: {emotions_path} | {e}")
+def _format_dt(ts: int) -> str:
+    dt = datetime.fromtimestamp(ts, tz=timezone.utc).astimezone(TZ)
+    return dt.strftime("%Y-%m-%d %H:%M:%S")
 
-    try:
-        tags = txt_read(tags_path)
-    except Exception as e:
-        log.error(f"Can't read tags file: {tags_path} | {e}")
 
-    return emotions, tags
+def _new_session(message: types.Message) -> UserSession:
+    user_folder = _user_folder_from_message(message)
+    emotions_values, tags_values, version = _load_user_constants(user_folder)
+    return UserSession(
+        text=message.text or "",
+        first_message_ts=message.date,
+        step="emotions",
+        thread_id=getattr(message, "message_thread_id", None),
+        emotions_values=emotions_values,
+        tags_values=tags_values,
+        user_folder=user_folder,
+        constants_version=version,
+    )
 
 
-def _format_dt(ts: int) -> str:
-    dt = datetime.fromtimestamp(ts, tz=timezone.utc).astimezone(TZ)
-    return dt.strftime("%Y-%m-%d %H:%M:%S")
+STEP_HANDLERS = {"emotions": callbacks.EMOTIONS, "tags": callbacks.TAGS}
+
+
+def _step_markup(sess: UserSession) -> CachedMarkup:
+    """Клавиатура текущего шага (эмоции или теги) с учётом страницы и фильтра."""
+    if sess.step == "tags":
+        values, selected_idx = sess.tags_values, sess.tags_idx
+    else:
+        values, selected_idx = sess.emotions_values, sess.emotions_idx
+
+    return get_keyboard_renderer().render(
+        values=values,
+        version=sess.constants_version,
+        selected_idx=selected_idx,
+        handler=STEP_HANDLERS[sess.step],
+        page=sess.page,
+        letter=sess.letter,
+        picking_letter=sess.picking_letter,
+    )
 
 
-def _build_grid_keyboard(
-    values: List[str],
-    selected_idx: Set[int],
-    prefix: str,
-    done_cb: str,
-    cols: int = 3,
-) -> types.InlineKeyboardMarkup:
-    markup = types.InlineKeyboardMarkup()
+def _is_stale(sess: UserSession, data: CallbackData) -> bool:
+    """
+    Кнопка с клавиатуры другого шага или собранной из других констант:
+    индекс в ней указывает не на то значение.
+    """
+    return data.handler != STEP_HANDLERS.get(sess.step) or data.version != sess.constants_version
 
-    for i in range(0, len(values), cols):
-        row_btns = []
-        for idx in range(i, min(i + cols, len(values))):
-            text = values[idx]
-            if idx in selected_idx:
-                text = f"✅ {text}"
-            row_btns.append(types.InlineKeyboardButton(text=text, callback_data=f"{prefix}:{idx}"))
-        markup.row(*row_btns)
 
-    markup.row(types.InlineKeyboardButton(text="✅ Готово", callback_data=done_cb))
-    return markup
+def _apply_button(sess: UserSession, data: CallbackData) -> bool:
+    """
+    Применяет к сессии нажатие кнопки шага: выбор значения, страница, поиск по букве.
+
+    :return: False, если кнопку не удалось разобрать
+    """
+    if data.handler == callbacks.TAGS:
+        values, selected_idx = sess.tags_values, sess.tags_idx
+    else:
+        values, selected_idx = sess.emotions_values, sess.emotions_idx
+
+    if data.action == "s":
+        sess.picking_letter = True
+        return True
+    if data.action == "f":
+        sess.reset_view()
+        sess.letter = data.arg
+        return True
+    if data.action not in ("p", "x"):
+        return False
+
+    try:
+        number = int(data.arg)
+    except ValueError:
+        return False
+
+    if data.action == "p":
+        sess.page = number
+        sess.picking_letter = False
+        return True
+
+    if not 0 <= number < len(values):
+        return False
+    if number in selected_idx:
+        selected_idx.remove(number)
+    else:
+        selected_idx.add(number)
+    return True
 
 
 def register(bot: TeleBot) -> None:
+    edits = EditCoalescer(
+        bot,
+        delay=config.telegram.edit_debounce,
+        max_delay=config.telegram.edit_max_delay,
+    )
+    router = get_router(bot)
+    metrics.register_stats("edit_coalescer", lambda: edits.stats)
+
     @bot.message_handler(content_types=["text"], func=lambda m: True if not getattr(m, "reply_to_message", None) else False)
+    @metrics.timed("handler_seconds", handler="text")
     def handler(message: types.Message):
-        user = message.from_user
-        text = message.text or ""
         chat_id = message.chat.id
-        thread_id = getattr(message, "message_thread_id", None)
-
+        sess = _new_session(message)
 
-        user_folder = _user_folder_from_message(message)
-        emotions_values, tags_values = _load_user_constants(user_folder)
+        log.info("HANDLE | text=%s; from user: %s | folder=%s", sess.text, message.from_user, sess.user_folder)
 
-        log.info(f"HANDLE | text={text}; from user: {user} | folder={user_folder}")
-
-        SESSIONS[chat_id] = UserSession(
-            text=text,
-            first_message_ts=message.date,
-            step="emotions",
-            thread_id=thread_id,
-            emotions_values=emotions_values,
-            tags_values=tags_values,
-            user_folder=user_folder,
-        )
+        key = _message_session_key(message)
+        get_session_store().set(key, sess)
         bot.delete_message(chat_id=chat_id, message_id=message.message_id)
-        _send_emotions_step(bot, chat_id)
+        _send_emotions_step(bot, key, sess)
 
-    @bot.callback_query_handler(func=lambda call: call.data.startswith("e:") or call.data == "done:e")
-    def cb_emotions(call: types.CallbackQuery):
+    @router.route(callbacks.EMOTIONS)
+    @metrics.timed("handler_seconds", handler="cb_emotions")
+    def cb_emotions(call: types.CallbackQuery, data: CallbackData):
         chat_id = call.message.chat.id
-        sess = SESSIONS.get(chat_id)
+        key = _callback_session_key(call)
+        store = get_session_store()
+        sess = store.get(key)
         if not sess:
             bot.answer_callback_query(call.id, "Сессия не найдена. Пришли текст заново.")
             return
 
-        if call.data == "done:e":
+        if _is_stale(sess, data):
+            bot.answer_callback_query(call.id, callbacks.STALE_TEXT)
+            return
+
+        if data.action == "d":
+            edits.discard(chat_id, call.message.message_id)
             sess.step = "tags"
+            sess.reset_view()
+            store.set(key, sess)
             bot.answer_callback_query(call.id, "Ок, к тэгам.")
             bot.delete_message(chat_id=chat_id, message_id=call.message.message_id)
-            _send_tags_step(bot, chat_id)
+            _send_tags_step(bot, key, sess)
             return
 
-        try:
-            idx = int(call.data.split(":")[1])
-        except Exception:
+        if not _apply_button(sess, data):
             bot.answer_callback_query(call.id, "Не понял кнопку.")
             return
+        store.set(key, sess)
 
-        if idx in sess.emotions_idx:
-            sess.emotions_idx.remove(idx)
-        else:
-            sess.emotions_idx.add(idx)
-
-        markup = _build_grid_keyboard(
-            values=sess.emotions_values,
-            selected_idx=sess.emotions_idx,
-            prefix="e",
-            done_cb="done:e",
-            cols=3,
-        )
-        try:
-            bot.edit_message_reply_markup(
-                chat_id=chat_id,
-                message_id=call.message.message_id,
-                reply_markup=markup,
-            )
-        except Exception as e:
-            log.warning(f"edit_message_reply_markup failed: {e}")
-
+        # ответ сразу, а клавиатура обновится одной правкой, когда нажатия затихнут
         bot.answer_callback_query(call.id)
+        edits.submit(chat_id, call.message.message_id, _step_markup(sess))
 
-    @bot.callback_query_handler(func=lambda call: call.data.startswith("t:") or call.data == "done:t")
-    def cb_tags(call: types.CallbackQuery):
+    @router.route(callbacks.TAGS)
+    @metrics.timed("handler_seconds", handler="cb_tags")
+    def cb_tags(call: types.CallbackQuery, data: CallbackData):
         chat_id = call.message.chat.id
-        sess = SESSIONS.get(chat_id)
+        key = _callback_session_key(call)
+        store = get_session_store()
+        sess = store.get(key)
         if not sess:
             bot.answer_callback_query(call.id, "Сессия не найдена. Пришли текст заново.")
             return
 
-        if call.data == "done:t":
+        if _is_stale(sess, data):
+            bot.answer_callback_query(call.id, callbacks.STALE_TEXT)
+            return
+
+        if data.action == "d":
+            edits.discard(chat_id, call.message.message_id)
             bot.answer_callback_query(call.id, "Готово.")
             bot.delete_message(chat_id=chat_id, message_id=call.message.message_id)
-            _finish(bot, chat_id)
+            _finish(bot, key)
             return
 
-        try:
-            idx = int(call.data.split(":")[1])
-        except Exception:
+        if not _apply_button(sess, data):
             bot.answer_callback_query(call.id, "Не понял кнопку.")
             return
+        store.set(key, sess)
 
-        if idx in sess.tags_idx:
-            sess.tags_idx.remove(idx)
-        else:
-            sess.tags_idx.add(idx)
-
-        markup = _build_grid_keyboard(
-            values=sess.tags_values,
-            selected_idx=sess.tags_idx,
-            prefix="t",
-            done_cb="done:t",
-            cols=3,
-        )
-        try:
-            bot.edit_message_reply_markup(
-                chat_id=chat_id,
-                message_id=call.message.message_id,
-                reply_markup=markup,
-            )
-        except Exception as e:
-            log.warning(f"edit_message_reply_markup failed: {e}")
-
+        # ответ сразу, а клавиатура обновится одной правкой, когда нажатия затихнут
         bot.answer_callback_query(call.id)
+        edits.submit(chat_id, call.message.message_id, _step_markup(sess))
 
 
-def _send_emotions_step(bot: TeleBot, chat_id: int):
-    sess = SESSIONS[chat_id]
+def _send_emotions_step(bot: TeleBot, key: SessionKey, sess: UserSession):
+    chat_id = key[0]
 
     if not sess.emotions_values:
         bot.send_message(
             chat_id=chat_id,
             message_thread_id=sess.thread_id,
             text=f"Не нашёл эмоции для пользователя ({sess.user_folder}). "
-                 f"Проверь файл: {ROOT / 'data' / sess.user_folder / 'emotions.txt'}",
+                 f"Проверь файл: {DATA / sess.user_folder / 'emotions.txt'}",
         )
         return
 
-    markup = _build_grid_keyboard(
-        values=sess.emotions_values,
-        selected_idx=sess.emotions_idx,
-        prefix="e",
-        done_cb="done:e",
-        cols=3,
-    )
+    markup = _step_markup(sess)
     msg = bot.send_message(
         chat_id=chat_id,
         message_thread_id=sess.thread_id,
@@ -264,27 +267,22 @@ def _send_emotions_step(bot: TeleBot, chat_id: int):
         reply_markup=markup,
     )
     sess.keyboard_message_id = msg.message_id
+    get_session_store().set(key, sess)
 
 
-def _send_tags_step(bot: TeleBot, chat_id: int):
-    sess = SESSIONS[chat_id]
+def _send_tags_step(bot: TeleBot, key: SessionKey, sess: UserSession):
+    chat_id = key[0]
 
     if not sess.tags_values:
         bot.send_message(
             chat_id=chat_id,
             message_thread_id=sess.thread_id,
             text=f"Не нашёл теги для пользователя ({sess.user_folder}). "
-                 f"Проверь файл: {ROOT / 'data' / sess.user_folder / 'tags.txt'}",
+                 f"Проверь файл: {DATA / sess.user_folder / 'tags.txt'}",
         )
         return
 
-    markup = _build_grid_keyboard(
-        values=sess.tags_values,
-        selected_idx=sess.tags_idx,
-        prefix="t",
-        done_cb="done:t",
-        cols=3,
-    )
+    markup = _step_markup(sess)
     msg = bot.send_message(
         chat_id=chat_id,
         message_thread_id=sess.thread_id,
@@ -292,13 +290,13 @@ def _send_tags_step(bot: TeleBot, chat_id: int):
         reply_markup=markup,
     )
     sess.keyboard_message_id = msg.message_id
+    get_session_store().set(key, sess)
 
 
-def _finish(bot: TeleBot, chat_id: int):
-    sess = SESSIONS.get(chat_id)
-    if not sess:
-        return
-
+def _note_summary(sess: UserSession) -> tuple[List[str], List[str], str]:
+    """
+    :return: (выбранные эмоции, выбранные теги, текст итогового сообщения)
+    """
     emotions = [sess.emotions_values[i] for i in sorted(sess.emotions_idx) if i < len(sess.emotions_values)]
     tags = [sess.tags_values[i] for i in sorted(sess.tags_idx) if i < len(sess.tags_values)]
 
@@ -308,26 +306,59 @@ def _finish(bot: TeleBot, chat_id: int):
         f"Теги: {', '.join(tags) if tags else '—'}\n"
         f"{_format_dt(sess.first_message_ts)}"
     )
+    return emotions, tags, summary
 
-    log.info(
-        "RESULT | "
-        f"folder={sess.user_folder}; "
-        f"text={sess.text!r}; "
-        f"first_ts={sess.first_message_ts}; "
-        f"emotions={emotions}; "
-        f"tags={tags}"
-    )
 
-    result_msg = bot.send_message(chat_id=chat_id, message_thread_id=sess.thread_id, text=summary)
+def _store_note(sess: UserSession, chat_id: int, note_id: int, emotions: List[str], tags: List[str]) -> None:
+    when = _format_dt(sess.first_message_ts)
+    get_note_index().add(sess.user_folder, chat_id, note_id)
+    # локальная копия для /search: поиск не ходит в GAS
+    get_note_search().add_note(
+        user=sess.user_folder,
+        chat_id=chat_id,
+        msg_id=note_id,
+        when=when,
+        text=sess.text,
+        emotions=emotions,
+        tags=tags,
+    )
+    # счётчики /stats прибавляются здесь же, отчёт не пересчитывает записи
+    get_note_aggregates().add_note(
+        user=sess.user_folder,
+        msg_id=note_id,
+        when=when,
+        emotions=emotions,
+        tags=tags,
+    )
 
-    gas = get_gas_client()
-    gas.upsert_note(
+    # запись в таблицу уходит в фоновую очередь, хендлер не ждёт GAS
+    get_gas_writer().upsert_note(
         user=sess.user_folder,  # "SergeyAY"
-        msg_id=result_msg.message_id,  # это твой "id" в таблице
-        when=_format_dt(sess.first_message_ts),  # уже dd.mm...
+        msg_id=note_id,  # это твой "id" в таблице
+        when=when,  # уже dd.mm...
         what=sess.text,
         emotions=emotions,
         tags=tags,
     )
 
-    del SESSIONS[chat_id]
+
+@metrics.timed("handler_seconds", handler="finish")
+def _finish(bot: TeleBot, key: SessionKey):
+    chat_id = key[0]
+    store = get_session_store()
+    sess = store.get(key)
+    if not sess:
+        return
+
+    emotions, tags, summary = _note_summary(sess)
+
+    log.info(
+        "RESULT | folder=%s; text=%r; first_ts=%s; emotions=%s; tags=%s",
+        sess.user_folder, sess.text, sess.first_message_ts, emotions, tags,
+    )
+
+    result_msg = bot.send_message(chat_id=chat_id, message_thread_id=sess.thread_id, text=summary)
+
+    _store_note(sess, chat_id, result_msg.message_id, emotions, tags)
+
+    store.delete(key)
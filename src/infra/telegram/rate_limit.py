@@ -0,0 +1,439 @@
+import asyncio
+import functools
+import heapq
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional
+
+from telebot import TeleBot
+
+if TYPE_CHECKING:
+    from telebot.async_telebot import AsyncTeleBot
+
+from src.config import config, log
+
+
+# меньше — важнее: ответ на нажатие кнопки пользователь ждёт, удаление сообщения — косметика
+METHOD_PRIORITY = {
+    "answer_callback_query": 0,
+    "send_message": 1,
+    "edit_message_text": 1,
+    "edit_message_reply_markup": 1,
+    "set_message_reaction": 2,
+    "delete_message": 3,
+}
+
+# методы, которые не расходуют лимит чата (только общий)
+CHAT_EXEMPT = {"answer_callback_query", "delete_message", "set_message_reaction"}
+
+# результат этих вызовов хендлерам не нужен, лимит чата они не расходуют: после 429 повторяются из таймера
+FIRE_AND_FORGET = {"answer_callback_query", "delete_message", "set_message_reaction"}
+
+# сколько чатов помнить (LRU); забытый чат начинает с полным запасом
+MAX_CHATS = 10_000
+
+
+class TokenBucket:
+    """
+    rate токенов в секунду, не больше capacity про запас.
+    Запас может уходить в минус: это очередь уже выданных резервов.
+    """
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, now: float) -> float:
+        """
+        Забирает токен, даже если его ещё нет.
+
+        :return: сколько секунд подождать до того, как им пользоваться
+        """
+        self._refill(now)
+        self.tokens -= 1
+        return max(0.0, -self.tokens / self.rate)
+
+    def try_take(self, now: float) -> float:
+        """
+        Забирает токен, только если он есть.
+
+        :return: 0 — токен взят; иначе через сколько секунд он появится
+        """
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def block(self, now: float, seconds: float) -> None:
+        """Ничего не выдавать seconds секунд (после 429 retry_after)."""
+        self._refill(now)
+        self.tokens = min(self.tokens, -seconds * self.rate)
+
+
+@dataclass
+class LimiterStats:
+    """Счётчики ограничителя запросов к Bot API"""
+    calls: int = 0
+    throttled: int = 0  # сколько вызовов ждали
+    wait_total: float = 0.0
+    wait_max: float = 0.0
+    queued: int = 0  # сколько вызовов ждут прямо сейчас (общий лимит или отложены)
+    deferred: int = 0  # сколько FIRE_AND_FORGET после 429 отложено на таймер, а не ждали в потоке хендлера
+    retries: int = 0  # повторы после 429
+    rejected: int = 0  # 429, на которые повторы закончились
+
+    @property
+    def avg_wait(self) -> float:
+        return self.wait_total / self.calls if self.calls else 0.0
+
+
+def retry_after(e: Exception) -> Optional[float]:
+    """
+    :return: retry_after из ответа 429 или None, если это другая ошибка
+    """
+    if getattr(e, "error_code", None) != 429:
+        return None
+    params = (getattr(e, "result_json", None) or {}).get("parameters") or {}
+    return float(params.get("retry_after") or 1)
+
+
+def _chat_id(args: tuple, kwargs: dict) -> Optional[int]:
+    chat_id = kwargs.get("chat_id", args[0] if args else None)
+    return chat_id if isinstance(chat_id, int) else None
+
+
+class _LimiterBase:
+    """
+    Общий лимит на бота (~30 запросов/с) + лимит на чат (личка ~1/с, группа ~20/мин).
+
+    Общий лимит раздаётся по приоритету METHOD_PRIORITY, лимит чата — по очереди прихода.
+    На 429 чат блокируется на retry_after.
+    """
+
+    def __init__(
+        self,
+        global_rate: float = 30,
+        private_rate: float = 1,
+        private_burst: int = 5,
+        group_rate: float = 20 / 60,
+        group_burst: int = 20,
+        max_retries: int = 3,
+        max_block: float = 3.0,
+    ) -> None:
+        """
+        :param global_rate: запросов в секунду на бота
+        :param private_rate: запросов в секунду в личный чат
+        :param private_burst: сколько запросов в личный чат можно сделать подряд без ожидания
+        :param group_rate: запросов в секунду в группу
+        :param group_burst: сколько запросов в группу можно сделать подряд без ожидания
+        :param max_retries: сколько раз повторять запрос после 429
+        :param max_block: сколько один вызов может ждать лимит чата и retry_after в потоке хендлера, сек
+        """
+        self.private_rate = private_rate
+        self.private_burst = private_burst
+        self.group_rate = group_rate
+        self.group_burst = group_burst
+        self.max_retries = max_retries
+        self.max_block = max_block
+        self.stats = LimiterStats()
+        # счётчики меняются из нескольких потоков хендлеров и таймеров
+        self._stats_lock = threading.Lock()
+
+        self._global = TokenBucket(rate=global_rate, capacity=global_rate)
+        self._chats: OrderedDict[int, TokenBucket] = OrderedDict()
+        self._chats_lock = threading.Lock()
+        self._waiters: list[tuple[int, int]] = []  # куча (приоритет, номер)
+        self._seq = itertools.count()
+
+    @classmethod
+    def from_config(cls):
+        cfg = config.telegram.rate_limit
+        return cls(
+            global_rate=cfg.global_rate,
+            private_rate=cfg.private_rate,
+            private_burst=cfg.private_burst,
+            group_rate=cfg.group_rate,
+            group_burst=cfg.group_burst,
+            max_retries=cfg.max_retries,
+            max_block=cfg.max_block,
+        )
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            # отрицательные id — группы и каналы
+            if chat_id < 0:
+                bucket = TokenBucket(rate=self.group_rate, capacity=self.group_burst)
+            else:
+                bucket = TokenBucket(rate=self.private_rate, capacity=self.private_burst)
+            self._chats[chat_id] = bucket
+            while len(self._chats) > MAX_CHATS:
+                self._chats.popitem(last=False)
+        else:
+            self._chats.move_to_end(chat_id)
+        return bucket
+
+    def _reserve_chat(self, name: str, chat_id: Optional[int]) -> float:
+        if chat_id is None or name in CHAT_EXEMPT:
+            return 0.0
+        with self._chats_lock:
+            return self._chat_bucket(chat_id).reserve(time.monotonic())
+
+    def _block(self, chat_id: Optional[int], seconds: float) -> None:
+        now = time.monotonic()
+        if chat_id is None:
+            self._global.block(now, seconds)
+            return
+        with self._chats_lock:
+            self._chat_bucket(chat_id).block(now, seconds)
+
+    def _queued(self, delta: int) -> None:
+        with self._stats_lock:
+            self.stats.queued += delta
+
+    def _record(self, waited: float) -> None:
+        with self._stats_lock:
+            self.stats.calls += 1
+            if waited > 0:
+                self.stats.throttled += 1
+                self.stats.wait_total += waited
+                self.stats.wait_max = max(self.stats.wait_max, waited)
+
+    def _on_error(
+        self, name: str, chat_id: Optional[int], e: Exception, attempt: int, budget: Optional[float] = None,
+    ) -> Optional[float]:
+        """
+        :param budget: сколько ещё можно ждать; None — без ограничения
+        :return: сколько ждать перед повтором или None — пробросить ошибку
+        """
+        delay = retry_after(e)
+        if delay is None:
+            return None
+        self._block(chat_id, delay)
+        if attempt >= self.max_retries or (budget is not None and delay > budget):
+            with self._stats_lock:
+                self.stats.rejected += 1
+            log.warning(f"{name}: 429 in chat {chat_id}, blocked for {delay}s, not retried")
+            return None
+        with self._stats_lock:
+            self.stats.retries += 1
+        log.warning(f"{name}: 429 in chat {chat_id}, retry after {delay}s")
+        return delay
+
+
+@dataclass
+class _Deferred:
+    func: Callable
+    args: tuple
+    kwargs: dict
+    attempt: int
+    timer: threading.Timer
+
+
+class OutboundLimiter(_LimiterBase):
+    """
+    Ограничитель для TeleBot.
+
+    Поток хендлера общий для многих чатов, поэтому ждать в нём можно только недолго:
+    - FIRE_AND_FORGET после 429 повторяются из threading.Timer, поток хендлера их не ждёт
+    - send_message и правки ждут лимит чата и retry_after не дольше max_block в сумме;
+      лимит чата дольше — отправляются в долг (токен зарезервирован, долг отдадут следующие вызовы),
+      429 с retry_after дольше — пробрасывается: вызывающий всегда знает, дошёл ли вызов
+      (правки клавиатур повторяет EditCoalescer, запись остаётся в сессии — пользователь может повторить)
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._cond = threading.Condition()
+        self._deferred: Dict[tuple, _Deferred] = {}
+        self._deferred_lock = threading.Lock()
+
+    def _acquire_global(self, priority: int) -> float:
+        started = time.monotonic()
+        entry = (priority, next(self._seq))
+        waited = False
+        with self._cond:
+            heapq.heappush(self._waiters, entry)
+            while True:
+                if self._waiters[0] == entry:
+                    wait = self._global.try_take(time.monotonic())
+                    if wait == 0:
+                        heapq.heappop(self._waiters)
+                        self._cond.notify_all()
+                        return time.monotonic() - started if waited else 0.0
+                    self._cond.wait(wait)
+                else:
+                    self._cond.wait()
+                waited = True
+
+    def _deferred_key(self, name: str, chat_id: Optional[int]) -> tuple:
+        # удаления и ответы на нажатия не заменяют друг друга: у каждого свой ключ
+        return name, chat_id, next(self._seq)
+
+    def _defer(self, key: tuple, func: Callable, args: tuple, kwargs: dict, attempt: int, delay: float) -> None:
+        timer = threading.Timer(delay, self._run_deferred, args=(key,))
+        timer.daemon = True
+        with self._deferred_lock:
+            self._deferred[key] = _Deferred(func=func, args=args, kwargs=kwargs, attempt=attempt, timer=timer)
+        with self._stats_lock:
+            self.stats.deferred += 1
+            self.stats.queued += 1
+        timer.start()
+
+    def _run_deferred(self, key: tuple) -> None:
+        with self._deferred_lock:
+            item = self._deferred.pop(key, None)
+        if item is None:
+            return
+        self._queued(-1)
+        try:
+            self._send(key[0], key[1], item.func, item.args, item.kwargs, item.attempt)
+        except Exception as e:
+            # вызывавший хендлер давно завершился — ошибку некому пробросить
+            log.warning(f"{key[0]}: deferred call in chat {key[1]} failed: {e}")
+
+    def _send(self, name: str, chat_id: Optional[int], func: Callable, args: tuple, kwargs: dict, attempt: int) -> Any:
+        """FIRE_AND_FORGET: ждёт только общий лимит, на 429 откладывается на retry_after."""
+        self._queued(1)
+        try:
+            waited = self._acquire_global(METHOD_PRIORITY.get(name, 1))
+        finally:
+            self._queued(-1)
+        self._record(waited)
+
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            delay = self._on_error(name, chat_id, e, attempt)
+            if delay is None:
+                raise
+            self._defer(self._deferred_key(name, chat_id), func, args, kwargs, attempt + 1, delay)
+            return None
+
+    def _call_waiting(self, name: str, chat_id: Optional[int], func: Callable, args: tuple, kwargs: dict) -> Any:
+        """Вызов, результат которого нужен хендлеру: ждёт лимиты и retry_after в его потоке, не дольше max_block."""
+        deadline = time.monotonic() + self.max_block
+        attempt = 0
+        while True:
+            self._queued(1)
+            try:
+                waited = 0.0
+                if attempt == 0:
+                    # дальше срока не ждём: токен уже зарезервирован, перерасход отдадут следующие вызовы
+                    waited = min(self._reserve_chat(name, chat_id), self.max_block)
+                    if waited > 0:
+                        time.sleep(waited)
+                waited += self._acquire_global(METHOD_PRIORITY.get(name, 1))
+            finally:
+                self._queued(-1)
+            self._record(waited)
+
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                delay = self._on_error(name, chat_id, e, attempt, budget=deadline - time.monotonic())
+                if delay is None:
+                    raise
+                attempt += 1
+                time.sleep(delay)
+
+    def call(self, name: str, func: Callable, *args, **kwargs) -> Any:
+        chat_id = _chat_id(args, kwargs)
+        if name in FIRE_AND_FORGET:
+            return self._send(name, chat_id, func, args, kwargs, 0)
+        return self._call_waiting(name, chat_id, func, args, kwargs)
+
+
+class AsyncOutboundLimiter(_LimiterBase):
+    """
+    Ограничитель для AsyncTeleBot: ожидание не блокирует event loop, поэтому все методы
+    ждут лимит чата и после 429 — retry_after, повторяясь до max_retries раз.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._cond: Optional[asyncio.Condition] = None
+
+    async def _acquire_global(self, priority: int) -> float:
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        started = time.monotonic()
+        entry = (priority, next(self._seq))
+        waited = False
+        async with self._cond:
+            heapq.heappush(self._waiters, entry)
+            while True:
+                if self._waiters[0] == entry:
+                    wait = self._global.try_take(time.monotonic())
+                    if wait == 0:
+                        heapq.heappop(self._waiters)
+                        self._cond.notify_all()
+                        return time.monotonic() - started if waited else 0.0
+                    try:
+                        await asyncio.wait_for(self._cond.wait(), wait)
+                    except asyncio.TimeoutError:
+                        pass
+                else:
+                    await self._cond.wait()
+                waited = True
+
+    async def call(self, name: str, func: Callable, *args, **kwargs) -> Any:
+        chat_id = _chat_id(args, kwargs)
+        attempt = 0
+        while True:
+            self._queued(1)
+            try:
+                waited = self._reserve_chat(name, chat_id) if attempt == 0 else 0.0
+                if waited > 0:
+                    await asyncio.sleep(waited)
+                waited += await self._acquire_global(METHOD_PRIORITY.get(name, 1))
+            finally:
+                self._queued(-1)
+            self._record(waited)
+
+            try:
+                return await func(*args, **kwargs)
+            except Exception as e:
+                delay = self._on_error(name, chat_id, e, attempt)
+                if delay is None:
+                    raise
+                attempt += 1
+                await asyncio.sleep(delay)
+
+
+def install_rate_limiter(bot: "TeleBot | AsyncTeleBot", limiter: OutboundLimiter | AsyncOutboundLimiter) -> None:
+    """
+    Подменяет у экземпляра бота методы из METHOD_PRIORITY: все вызовы идут через limiter.
+    """
+    for name in METHOD_PRIORITY:
+        func = getattr(bot, name)
+        setattr(bot, name, functools.wraps(func)(functools.partial(limiter.call, name, func)))
+
+
+_limiter: Optional[_LimiterBase] = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter(asynchronous: bool = False) -> OutboundLimiter | AsyncOutboundLimiter:
+    """
+    Общий на процесс ограничитель (лимиты Telegram считаются на бота, а не на модуль).
+
+    :param asynchronous: нужен AsyncOutboundLimiter (для src.infra.telegram.aio)
+    """
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                cls = AsyncOutboundLimiter if asynchronous else OutboundLimiter
+                _limiter = cls.from_config()
+    return _limiter
@@ -1,11 +1,17 @@
 import re
-from typing import List
+from typing import Dict, List, Optional
 
 from telebot import TeleBot, types
 
 from src.config import log
+from src.core.note_index import get_note_index
+from src.core.note_search import get_note_search
+from src.core.playlists import PLAYLIST_HEADER, PlaylistPart, Track, get_playlist_store, visible_length
+from src.infra import metrics
+from src.infra.telegram.msg_handler import _user_folder_from_message
 from src.integrations.gas_client import get_gas_client
-from src.infra.yandex_music.get_info import get_track_meta
+from src.integrations.gas_writer import get_gas_writer
+from src.infra.yandex_music.get_info import expand_links, extract_track_id, get_tracks_meta
 
 YANDEX_MUSIC_RE = re.compile(
     r"https?://(?:music\.)?yandex\.(?:ru|com)/[^\s]+|https?://yandex\.(?:ru|com)/music/[^\s]+",
@@ -17,30 +23,150 @@ def extract_yandex_music_links(text: str) -> List[str]:
         return []
     return YANDEX_MUSIC_RE.findall(text)
 
-def _user_folder_from_message(message: types.Message) -> str:
-    # ВАЖНО: должен совпадать с тем, что используешь в msg_handler/edit_constants.
-    u = message.from_user
-    if getattr(u, "username", None):
-        return u.username  # если у тебя sanitize — используй тот же sanitize
-    first = getattr(u, "first_name", "") or ""
-    last = getattr(u, "last_name", "") or ""
-    return (first + last).strip() or first or "UnknownUser"
+def _lookup_note(message: types.Message, user_folder: str) -> Optional[bool]:
+    """
+    Это reply на нашу запись? Только локальные проверки.
+
+    :return: True/False — ответ известен; None — надо спросить GAS
+    """
+    replied = message.reply_to_message
+
+    # записи пишет только бот
+    if not getattr(replied.from_user, "is_bot", False):
+        return False
+
+    return get_note_index().lookup(user_folder, message.chat.id, replied.message_id)
+
+def _remember_note(message: types.Message, user_folder: str, exists: Optional[bool]) -> bool:
+    """
+    Ответ GAS — в индекс. Отрицательный кешируется только на явное exists=false:
+    сбой GAS (None) не кешируется, а reply обрабатывается как ответ на запись —
+    сообщение бота, а без индекса так и работал хендлер до сбоя.
+
+    :return: обрабатывать ли reply
+    """
+    index = get_note_index()
+    msg_id = message.reply_to_message.message_id
+    if exists is None:
+        log.warning("Note lookup failed: chat_id=%s id=%s, GAS did not answer", message.chat.id, msg_id)
+        return True
+    if exists:
+        index.add(user_folder, message.chat.id, msg_id)
+    else:
+        index.mark_missing(user_folder, message.chat.id, msg_id)
+    return exists
+
+def _is_note(message: types.Message, user_folder: str) -> bool:
+    """
+    Это reply на нашу запись?
+    Сначала локальные проверки, GAS — только если индекс не знает ответа.
+    """
+    known = _lookup_note(message, user_folder)
+    if known is not None:
+        return known
+
+    exists = get_gas_client().exists(user=user_folder, msg_id=message.reply_to_message.message_id)
+    return _remember_note(message, user_folder, exists)
+
+def _start_playlist(replied: types.Message) -> None:
+    """
+    Первое добавление в запись: её текущий текст и уже добавленные треки — в хранилище плейлистов.
+    Записи, дополненные раньше, разбираются по entities один раз; дальше текст только дописывается.
+    """
+    store = get_playlist_store()
+    chat_id = replied.chat.id
+    if store.is_started(chat_id, replied.message_id):
+        return
+
+    text = replied.html_text or ""
+    length = visible_length(replied.text or "")
+    if "Плейлист:" not in (replied.text or ""):
+        text += PLAYLIST_HEADER
+        length += visible_length(PLAYLIST_HEADER)
+    track_ids = [
+        extract_track_id(e.url) for e in replied.entities or [] if e.type == "text_link" and e.url
+    ]
+    store.start(chat_id, replied.message_id, text, length, [t for t in track_ids if t])
+
+def _link_by_track(
+    links: List[str], expanded: Dict[str, list],
+) -> tuple[Dict[int, str], Dict[str, tuple[str, str]]]:
+    """
+    :param expanded: треки альбомов/плейлистов/артистов из сообщения (expand_links)
+    :return: ({id трека: первая ссылка на него} в порядке сообщения, {ссылка: (artist, title)} —
+             метаданные, уже пришедшие вместе с коллекциями); ссылки не на трек и не на коллекцию пропускаются
+    """
+    result: Dict[int, str] = {}
+    metas: Dict[str, tuple[str, str]] = {}
+    for link in links:
+        items = expanded.get(link)
+        if items is None:
+            track_id = extract_track_id(link)
+            items = [(track_id, link, None)] if track_id else []
+        for track_id, track_link, meta in items:
+            if track_id in result:
+                continue
+            result[track_id] = track_link
+            if meta is not None:
+                metas[track_link] = meta
+    return result, metas
+
+def _new_tracks(new_links: Dict[int, str], metas: dict[str, tuple[str, str]]) -> List[Track]:
+    return [
+        Track(track_id=track_id, link=link, title=f"{metas[link][0]} - {metas[link][1]}")
+        for track_id, link in new_links.items()
+        if link in metas
+    ]
+
+def _track_items(tracks: List[Track]) -> List[dict[str, str]]:
+    return [{"link": t.link, "text": t.title} for t in tracks]
+
+def _store_tracks(user_folder: str, note_id: int, added: List[Track]) -> None:
+    """Добавленные треки — в журнал GAS и в локальный поиск (запись на диск: fsync журнала, commit SQLite)."""
+    # запись в таблицу уходит в фоновую очередь, хендлер не ждёт GAS
+    get_gas_writer().add_tracks(user=user_folder, msg_id=note_id, items=_track_items(added))
+    get_note_search().add_tracks(user=user_folder, msg_id=note_id, titles=[t.title for t in added])
+
+def _continuation_kwargs(replied: types.Message, part: PlaylistPart) -> dict:
+    """Аргументы send_message для нового сообщения-продолжения: ответом на запись, в том же треде."""
+    return dict(
+        chat_id=replied.chat.id,
+        message_thread_id=getattr(replied, "message_thread_id", None),
+        text=part.text,
+        reply_parameters=types.ReplyParameters(message_id=replied.message_id, allow_sending_without_reply=True),
+        disable_web_page_preview=True,
+        parse_mode="HTML",
+    )
+
+def _apply_parts(bot: TeleBot, replied: types.Message, parts: List[PlaylistPart]) -> None:
+    """
+    Изменённые сообщения плейлиста: обычно одна правка последнего; при переполнении — ещё новое сообщение.
+    Ошибка Telegram пробрасывается: состояние плейлиста тогда не сохраняется. Ограничитель запросов
+    правки не откладывает — вернувшийся вызов значит, что Telegram её принял.
+    """
+    chat_id = replied.chat.id
+    for part in parts:
+        if part.message_id is not None:
+            bot.edit_message_text(chat_id=chat_id, message_id=part.message_id, text=part.text, disable_web_page_preview=True, parse_mode='HTML')
+            continue
+        sent = bot.send_message(**_continuation_kwargs(replied, part))
+        # сохранится вместе с текстом в commit_append
+        part.message_id = sent.message_id
 
 def register(bot: TeleBot) -> None:
     @bot.message_handler(
         content_types=["text"],
         func=lambda m: getattr(m, "reply_to_message", None) is not None
     )
+    @metrics.timed("handler_seconds", handler="on_reply")
     def on_reply(message: types.Message):
         chat_id = message.chat.id
         replied_mid = message.reply_to_message.message_id
         text = message.text or ""
 
         user_folder = _user_folder_from_message(message)
-        gas = get_gas_client()
 
-        # Это reply на нашу запись?
-        if not gas.exists(user=user_folder, msg_id=replied_mid):
+        if not _is_note(message, user_folder):
             return
 
         links = extract_yandex_music_links(text)
@@ -48,33 +174,34 @@ def register(bot: TeleBot) -> None:
             bot.reply_to(message, "Ссылок Яндекс.Музыки не вижу.")
             return
 
-        items_links = []
-        for l in links:
-            track_meta = get_track_meta(l)
-            items_links.append({"link": l, "text": f"{track_meta[0]} - {track_meta[1]}"})
-        resp = gas.add_tracks(user=user_folder, msg_id=replied_mid, items=items_links)
-        if not resp.get("ok"):
-            bot.reply_to(message, f"Не смог записать в таблицу: {resp.get('error')}")
+        _start_playlist(message.reply_to_message)
+        # альбомы и плейлисты раскрываются в треки вместе с метаданными (состав кешируется)
+        link_by_track, metas = _link_by_track(links, expand_links(links))
+        # дубли отсекаются по id трека — в Яндекс Музыку идут только новые
+        new_ids = get_playlist_store().new_track_ids(chat_id, replied_mid, list(link_by_track))
+        if link_by_track and not new_ids:
+            bot.reply_to(message, "Эти треки уже в плейлисте.")
             return
+        new_links = {track_id: link_by_track[track_id] for track_id in new_ids}
 
-        added = int(resp.get("added", 0))
-
-        reply_text = message.reply_to_message.text or ""
-
-        msg_links = []
-        if message.reply_to_message.any_entities:
-            for e in message.reply_to_message.entities:
-                if e.type == "text_link":
-                    e_text = message.reply_to_message.text[e.offset:e.offset + e.length]
-                    msg_links.append(f'<a href="{e.url}">{e_text}</a>')
-        for l in links:
-            track_meta = get_track_meta(l)
-            msg_links.append(f'<a href="{l}">{track_meta[0]} - {track_meta[1]}</a>')
-        if 'Плейлист' in reply_text:
-            reply_text = reply_text.split('\n\nПлейлист:')[0]
-        reply_text += f'\n\nПлейлист:\n{'\n'.join(msg_links)}'
-        bot.edit_message_text(chat_id=chat_id, message_id=replied_mid, text=reply_text, disable_web_page_preview=True, parse_mode='HTML')
-        bot.delete_message(chat_id=chat_id, message_id=message.message_id)
+        # один запрос к Яндекс Музыке на все новые ссылки на треки из сообщения
+        unknown = [link for link in new_links.values() if link not in metas]
+        if unknown:
+            metas.update(get_tracks_meta(unknown))
+        tracks = _new_tracks(new_links, metas)
+        if not tracks:
+            bot.reply_to(message, "Не смог найти эти треки в Яндекс.Музыке.")
+            return
 
+        store = get_playlist_store()
+        with store.editing(chat_id, replied_mid):
+            parts, added = store.prepare_append(chat_id, replied_mid, tracks)
+            if added:
+                # сначала Telegram: если правка не прошла, треки не считаются добавленными и их можно прислать снова
+                _apply_parts(bot, message.reply_to_message, parts)
+                store.commit_append(chat_id, replied_mid, parts, added)
+        if added:
+            _store_tracks(user_folder, replied_mid, added)
+        bot.delete_message(chat_id=chat_id, message_id=message.message_id)
 
-        log.info(f"PLAYLIST_ADD | chat_id={chat_id} id={replied_mid} links={links} added={added}")
+        log.info("PLAYLIST_ADD | chat_id=%s id=%s links=%s added=%s parts=%s", chat_id, replied_mid, links, len(added), len(parts))
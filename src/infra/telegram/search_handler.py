@@ -0,0 +1,127 @@
+import html
+from typing import Optional
+
+from telebot import TeleBot, types
+
+from src.config import config, log
+from src.core.note_search import SearchPage, get_note_search
+from src.infra import metrics
+from src.infra.telegram import callbacks
+from src.infra.telegram.callbacks import CallbackData, callback_data, get_router
+from src.infra.telegram.edit_constants import _user_folder_from_user
+from src.infra.telegram.msg_handler import _user_folder_from_message
+
+
+# первая строка сообщения с результатами; по ней кнопки страниц узнают запрос
+HEADER = "🔎 "
+
+USAGE_TEXT = "Что искать? Например: /search море отпуск"
+
+
+def query_from_command(text: str) -> str:
+    """'/search@bot море  отпуск' -> 'море отпуск'"""
+    parts = (text or "").split(maxsplit=1)
+    return " ".join(parts[1].split()) if len(parts) > 1 else ""
+
+
+def query_from_results(message: types.Message) -> str:
+    """Запрос из первой строки сообщения с результатами (Telegram отдаёт его без HTML)."""
+    first_line = (message.text or "").split("\n", 1)[0]
+    return first_line[len(HEADER):] if first_line.startswith(HEADER) else ""
+
+
+def search_page(user_folder: str, query: str, page: int) -> SearchPage:
+    page_size = config.search.page_size
+    return get_note_search().search(user_folder, query, offset=max(page, 0) * page_size, limit=page_size)
+
+
+def render_results(page: SearchPage) -> tuple[str, Optional[types.InlineKeyboardMarkup]]:
+    """
+    :return: (HTML-текст страницы результатов, кнопки страниц или None)
+    """
+    header = HEADER + html.escape(page.query)
+    if not page.hits:
+        return f"{header}\n\nНичего не нашлось.", None
+
+    lines = [header, ""]
+    for number, hit in enumerate(page.hits, start=page.offset + 1):
+        lines.append(f"{number}. <i>{html.escape(hit.when)}</i>\n{hit.snippet}")
+        labels = hit.emotions + hit.tags
+        if labels:
+            lines.append(html.escape(", ".join(labels)))
+        lines.append("")
+    lines.append(f"{page.offset + 1}–{page.offset + len(page.hits)} из {page.total}")
+
+    page_size = config.search.page_size
+    current = page.offset // page_size
+    pages = (page.total + page_size - 1) // page_size
+    if pages <= 1:
+        return "\n".join(lines), None
+
+    nav = []
+    if current > 0:
+        nav.append(types.InlineKeyboardButton(
+            text="«", callback_data=callback_data(callbacks.SEARCH, action="p", arg=current - 1)
+        ))
+    nav.append(types.InlineKeyboardButton(
+        text=f"{current + 1}/{pages}", callback_data=callback_data(callbacks.SEARCH, action="n")
+    ))
+    if current + 1 < pages:
+        nav.append(types.InlineKeyboardButton(
+            text="»", callback_data=callback_data(callbacks.SEARCH, action="p", arg=current + 1)
+        ))
+    markup = types.InlineKeyboardMarkup()
+    markup.row(*nav)
+    return "\n".join(lines), markup
+
+
+def register(bot: TeleBot) -> None:
+    @bot.message_handler(commands=["search"])
+    @metrics.timed("handler_seconds", handler="search")
+    def search(message: types.Message):
+        user_folder = _user_folder_from_message(message)
+        query = query_from_command(message.text)
+
+        log.info("HANDLE search | folder=%s; query=%r", user_folder, query)
+
+        if not query:
+            bot.reply_to(message, USAGE_TEXT)
+            return
+
+        text, markup = render_results(search_page(user_folder, query, 0))
+        bot.send_message(
+            chat_id=message.chat.id,
+            message_thread_id=getattr(message, "message_thread_id", None),
+            text=text,
+            reply_markup=markup,
+            parse_mode="HTML",
+            disable_web_page_preview=True,
+        )
+
+    @get_router(bot).route(callbacks.SEARCH)
+    @metrics.timed("handler_seconds", handler="cb_search")
+    def cb_search(call: types.CallbackQuery, data: CallbackData):
+        if data.action == "n":
+            # номер текущей страницы
+            bot.answer_callback_query(call.id)
+            return
+        query = query_from_results(call.message)
+        try:
+            page = int(data.arg)
+        except ValueError:
+            page = -1
+        if not query or data.action != "p" or page < 0:
+            bot.answer_callback_query(call.id, callbacks.STALE_TEXT)
+            return
+
+        # записи того, кто нажал: в группе чужие кнопки не показывают чужие записи
+        text, markup = render_results(search_page(_user_folder_from_user(call.from_user), query, page))
+        bot.answer_callback_query(call.id)
+        bot.edit_message_text(
+            chat_id=call.message.chat.id,
+            message_id=call.message.message_id,
+            text=text,
+            reply_markup=markup,
+            parse_mode="HTML",
+            disable_web_page_preview=True,
+        )
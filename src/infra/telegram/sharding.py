@@ -0,0 +1,475 @@
+import bisect
+import hashlib
+import json
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from multiprocessing.connection import Connection
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+import requests.exceptions
+from telebot import TeleBot, apihelper
+
+from src.config import config, log
+from src.infra import metrics
+
+
+# сколько раз отдавать воркеру апдейт, на котором он упал, прежде чем выбросить
+MAX_UPDATE_ATTEMPTS = 2
+# воркер, проживший меньше, считается упавшим на старте: пауза перед перезапуском растёт
+FAST_CRASH_SECONDS = 10.0
+MAX_RESTART_BACKOFF = 6
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """
+    Consistent hashing: ключ -> номер воркера.
+    При изменении числа воркеров переезжает только ~1/N чатов, а не почти все, как при key % N.
+    """
+
+    def __init__(self, nodes: int, replicas: int = 64) -> None:
+        """
+        :param nodes: число воркеров
+        :param replicas: точек на кольце у каждого воркера (больше — равномернее)
+        """
+        points = sorted((_hash(f"{node}:{r}"), node) for node in range(nodes) for r in range(replicas))
+        self._keys = [p[0] for p in points]
+        self._nodes = [p[1] for p in points]
+
+    def node(self, key: int) -> int:
+        i = bisect.bisect(self._keys, _hash(str(key))) % len(self._keys)
+        return self._nodes[i]
+
+
+def chat_id_of(update: Dict[str, Any]) -> int:
+    """
+    Чат апдейта (сырого JSON): по нему выбирается воркер — все апдейты чата идут в один процесс.
+    Если чата нет (inline_query, poll_answer, ...) — id пользователя; совсем ничего — 0.
+    """
+    for key, value in update.items():
+        if not isinstance(value, dict):
+            continue
+        message = value.get("message") if key == "callback_query" else value
+        if isinstance(message, dict) and isinstance(message.get("chat"), dict):
+            return message["chat"]["id"]
+        user = value.get("from") or value.get("user")
+        if isinstance(user, dict):
+            return user["id"]
+    return 0
+
+
+class ChatSerialExecutor:
+    """
+    Пул потоков, в котором задачи одного чата выполняются строго по очереди, а разных чатов — параллельно:
+    медленный запрос к GAS или Яндекс Музыке в одном чате не задерживает остальные чаты воркера.
+    """
+
+    def __init__(self, threads: int, name: str = "chat") -> None:
+        self._pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        # чат -> задачи, ждущие своей очереди; ключ есть, пока чат обрабатывается
+        self._queues: Dict[int, Deque[Callable[[], None]]] = {}
+
+    def submit(self, chat_id: int, task: Callable[[], None]) -> None:
+        with self._lock:
+            queue = self._queues.get(chat_id)
+            if queue is not None:
+                # чат уже обрабатывается: задачу возьмёт тот же поток после текущей
+                queue.append(task)
+                return
+            self._queues[chat_id] = deque([task])
+        self._pool.submit(self._drain, chat_id)
+
+    def _drain(self, chat_id: int) -> None:
+        while True:
+            with self._lock:
+                queue = self._queues[chat_id]
+                if not queue:
+                    del self._queues[chat_id]
+                    return
+                task = queue.popleft()
+            try:
+                task()
+            except Exception:
+                log.error(f"Chat {chat_id}: task failed", exc_info=True)
+
+    def shutdown(self) -> None:
+        """Дождаться всех принятых задач"""
+        self._pool.shutdown(wait=True)
+
+
+@dataclass
+class WorkerStats:
+    pid: int = 0
+    alive: bool = False
+    restarts: int = 0
+    dispatched: int = 0
+    processed: int = 0
+    failed: int = 0
+    in_flight: int = 0
+    redelivered: int = 0
+    dropped: int = 0
+    busy_seconds: float = 0.0
+
+    @property
+    def avg_busy(self) -> float:
+        return self.busy_seconds / self.processed if self.processed else 0.0
+
+
+def _worker_main(index: int, conn: Connection, workers: int, threads: int) -> None:
+    """
+    Процесс-воркер: свой бот с хендлерами, апдейты приходят из канала от супервизора.
+    Апдейты разных чатов обрабатываются параллельно в threads потоках, одного чата — по очереди.
+    """
+    os.environ["TGBOTNOTES_WORKER"] = str(index)
+    # Ctrl+C ловит супервизор и закрывает канал: воркер доделывает апдейт и выходит по EOF
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    from telebot import types
+
+    from src.infra.telegram import build_bot, register_metrics
+    from src.integrations.gas_writer import get_gas_writer
+
+    # лимит Bot API общий на бота — делим между воркерами; лимиты чатов не делим: чат живёт в одном воркере
+    config.telegram.rate_limit.global_rate /= workers
+    writer = get_gas_writer()
+    bot = build_bot(commands=False)
+    # хендлеры выполняются в потоке executor: пул TeleBot мог бы переставить апдейты одного чата
+    bot.threaded = False
+    executor = ChatSerialExecutor(threads, name=f"w{index}-chat")
+    # подтверждения шлют потоки executor, а Connection не потокобезопасен
+    send_lock = threading.Lock()
+    # хендлеры и запросы к API меряются здесь, а не в супервизоре: у воркера свой /metrics
+    register_metrics(worker=index)
+    log.info(f"Worker {index} started, pid={os.getpid()}")
+
+    def process(data: Dict[str, Any]) -> None:
+        started = time.perf_counter()
+        ok = True
+        try:
+            bot.process_new_updates([types.Update.de_json(data)])
+        except Exception:
+            ok = False
+            log.error(f"Worker {index}: update {data.get('update_id')} failed", exc_info=True)
+        with send_lock:
+            try:
+                conn.send((data["update_id"], time.perf_counter() - started, ok))
+            except (OSError, ValueError):
+                # супервизор уже закрыл канал: апдейт обработан, подтверждать некому
+                pass
+
+    try:
+        while True:
+            try:
+                raw = conn.recv_bytes()
+            except EOFError:
+                break
+            data = json.loads(raw)
+            executor.submit(chat_id_of(data), lambda data=data: process(data))
+    finally:
+        # принятые апдейты доделываются до остановки GasWriter: их записи должны попасть в журнал
+        executor.shutdown()
+        writer.stop()
+        log.info(f"Worker {index} stopped")
+
+
+class _Shard:
+    """
+    Воркер со стороны супервизора: процесс, канал к нему и апдейты, которые он ещё не подтвердил.
+    """
+
+    def __init__(self, index: int, workers: int, ctx, max_pending: int, threads: int) -> None:
+        self.index = index
+        self.workers = workers
+        self.threads = threads
+        self.max_pending = max_pending
+        self.stats = WorkerStats()
+        self.process = None
+        self.started_at = 0.0
+        self.fast_crashes = 0
+        self.restart_at: Optional[float] = None
+
+        self._ctx = ctx
+        self._conn: Optional[Connection] = None
+        self._reader: Optional[threading.Thread] = None
+        # _lock — состояние, _send_lock — запись в канал: чтение подтверждений не ждёт заблокированную отправку
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        # update_id -> (JSON, попыток)
+        self._pending: OrderedDict[int, tuple[bytes, int]] = OrderedDict()
+
+    def start(self) -> None:
+        parent, child = self._ctx.Pipe(duplex=True)
+        process = self._ctx.Process(
+            target=_worker_main, args=(self.index, child, self.workers, self.threads), name=f"worker-{self.index}",
+        )
+        process.start()
+        child.close()
+
+        with self._send_lock:
+            with self._lock:
+                self._conn = parent
+                self.process = process
+                self.started_at = time.monotonic()
+                self.restart_at = None
+                self.stats.pid = process.pid
+                self.stats.alive = True
+                resend = [raw for raw, _ in self._pending.values()]
+            # то, что упавший воркер не успел подтвердить
+            for raw in resend:
+                parent.send_bytes(raw)
+            self.stats.redelivered += len(resend)
+
+        self._reader = threading.Thread(target=self._read_acks, args=(parent,), name=f"acks-{self.index}", daemon=True)
+        self._reader.start()
+
+    def dispatch(self, update_id: int, raw: bytes) -> None:
+        with self._send_lock:
+            with self._lock:
+                self._pending[update_id] = (raw, 1)
+                if len(self._pending) > self.max_pending:
+                    # не держим бесконечно: самый старый не будет переотправлен после падения
+                    self._pending.popitem(last=False)
+                self.stats.dispatched += 1
+                self.stats.in_flight = len(self._pending)
+                conn = self._conn
+            try:
+                conn.send_bytes(raw)
+            except (OSError, ValueError):
+                # воркер упал: апдейт остался в _pending и уйдёт новому процессу
+                pass
+
+    def _read_acks(self, conn: Connection) -> None:
+        while True:
+            try:
+                update_id, busy, ok = conn.recv()
+            except (EOFError, OSError):
+                return
+            with self._lock:
+                self._pending.pop(update_id, None)
+                self.stats.in_flight = len(self._pending)
+                self.stats.processed += 1
+                self.stats.busy_seconds += busy
+                if not ok:
+                    self.stats.failed += 1
+
+    def on_exit(self, restart_delay: float) -> None:
+        """
+        Процесс завершился: решить судьбу апдейта, на котором он упал, и назначить перезапуск.
+        """
+        process = self.process
+        lived = time.monotonic() - self.started_at
+        log.error(f"Worker {self.index} (pid={process.pid}) exited with code {process.exitcode} after {lived:.1f}s")
+        # подтверждения, которые воркер успел отправить перед падением, ещё лежат в канале
+        self._reader.join(5)
+
+        with self._lock:
+            self.stats.alive = False
+            self._conn.close()
+            if self._pending:
+                # самый старый неподтверждённый точно обрабатывался в момент падения
+                # (остальные могли ещё ждать своей очереди — их отдаём без штрафа)
+                update_id, (raw, attempts) = next(iter(self._pending.items()))
+                if attempts >= MAX_UPDATE_ATTEMPTS:
+                    self._pending.pop(update_id)
+                    self.stats.dropped += 1
+                    log.error(f"Worker {self.index}: drop update {update_id} after {attempts} crashes")
+                else:
+                    self._pending[update_id] = (raw, attempts + 1)
+
+        self.fast_crashes = self.fast_crashes + 1 if lived < FAST_CRASH_SECONDS else 0
+        self.stats.restarts += 1
+        self.restart_at = time.monotonic() + restart_delay * 2 ** min(self.fast_crashes, MAX_RESTART_BACKOFF)
+
+    def close(self) -> None:
+        """Закрыть канал: воркер доделает текущий апдейт, остановит GasWriter и выйдет"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+
+    def join(self, timeout: float) -> None:
+        if self.process is None:
+            return
+        self.process.join(timeout)
+        if self.process.is_alive():
+            log.warning(f"Worker {self.index} did not stop in time, terminating")
+            self.process.terminate()
+            self.process.join(1)
+
+
+class Supervisor:
+    """
+    Один приёмник апдейтов (polling или webhook) и N процессов-воркеров.
+    Апдейт уходит воркеру по consistent hash от chat_id: порядок апдейтов чата и его сессия — в одном процессе.
+    Внутри воркера чаты обрабатываются параллельно (ChatSerialExecutor), апдейты одного чата — по очереди.
+    Упавший воркер перезапускается и получает неподтверждённые апдейты заново.
+    """
+
+    def __init__(
+        self, workers: int, replicas: int = 64, max_pending: int = 1000, restart_delay: float = 1.0, threads: int = 4,
+    ) -> None:
+        """
+        :param workers: число процессов-воркеров
+        :param threads: потоков-обработчиков в каждом воркере
+        :param replicas: точек каждого воркера на кольце
+        :param max_pending: сколько неподтверждённых апдейтов воркера хранить для переотправки
+        :param restart_delay: пауза перед перезапуском упавшего воркера, сек
+        """
+        # spawn: у супервизора уже есть потоки, fork их состояние не переносит
+        ctx = multiprocessing.get_context("spawn")
+        self.ring = HashRing(workers, replicas)
+        self.shards: List[_Shard] = [_Shard(i, workers, ctx, max_pending, threads) for i in range(workers)]
+        self.restart_delay = restart_delay
+        self._stop = threading.Event()
+
+    @classmethod
+    def from_config(cls) -> "Supervisor":
+        cfg = config.sharding
+        return cls(
+            workers=cfg.workers or os.cpu_count() or 1,
+            replicas=cfg.replicas,
+            max_pending=cfg.max_pending,
+            restart_delay=cfg.restart_delay,
+            threads=cfg.threads,
+        )
+
+    def start(self) -> None:
+        for shard in self.shards:
+            shard.start()
+        threading.Thread(target=self._monitor, name="workers-monitor", daemon=True).start()
+
+    def stop(self, timeout: float = 15.0) -> None:
+        self._stop.set()
+        for shard in self.shards:
+            shard.close()
+        # воркеры останавливаются параллельно, общий срок на всех
+        deadline = time.monotonic() + timeout
+        for shard in self.shards:
+            shard.join(max(0.0, deadline - time.monotonic()))
+
+    def dispatch(self, update: Dict[str, Any]) -> None:
+        shard = self.shards[self.ring.node(chat_id_of(update))]
+        shard.dispatch(update["update_id"], json.dumps(update, ensure_ascii=False).encode("utf-8"))
+
+    def dispatch_raw(self, body: str) -> None:
+        """Для webhook: JSON апдейта как пришёл"""
+        try:
+            update = json.loads(body)
+        except json.JSONDecodeError as e:
+            log.warning(f"Webhook: can't parse update: {e}")
+            return
+        self.dispatch(update)
+
+    def _monitor(self) -> None:
+        while not self._stop.wait(0.5):
+            now = time.monotonic()
+            for shard in self.shards:
+                if self._stop.is_set():
+                    return
+                if shard.restart_at is None and not shard.process.is_alive():
+                    shard.on_exit(self.restart_delay)
+                if shard.restart_at is not None and now >= shard.restart_at:
+                    log.info(f"Restarting worker {shard.index}")
+                    shard.start()
+
+    def summary(self) -> str:
+        return "; ".join(
+            f"w{s.index} pid={s.stats.pid} alive={s.stats.alive} processed={s.stats.processed} "
+            f"failed={s.stats.failed} in_flight={s.stats.in_flight} restarts={s.stats.restarts} "
+            f"avg={s.stats.avg_busy * 1000:.1f}ms"
+            for s in self.shards
+        )
+
+    def poll(self, token: str) -> None:
+        """
+        Long polling в этом процессе; апдейты не разбираются, а сразу уходят воркерам.
+        """
+        # webhook, оставшийся от webhook-режима, снимаем (без drop_pending_updates), иначе getUpdates — 409
+        apihelper.delete_webhook(token)
+        # skip_pending, как в run_polling: старые апдейты не обрабатываем
+        offset = None
+        last = apihelper.get_updates(token, offset=-1, timeout=10, long_polling_timeout=1)
+        if last:
+            offset = last[-1]["update_id"] + 1
+
+        log.info(f"Bot started with {len(self.shards)} workers. Polling...")
+        while not self._stop.is_set():
+            try:
+                updates = apihelper.get_updates(token, offset=offset, timeout=40, long_polling_timeout=30)
+            except requests.exceptions.ReadTimeout:
+                continue
+            except requests.exceptions.ConnectionError:
+                log.warning("ConnectionError: retry...")
+                time.sleep(5)
+                continue
+            except Exception:
+                log.error("getUpdates failed, retrying...", exc_info=True)
+                time.sleep(3)
+                continue
+            for update in updates:
+                offset = update["update_id"] + 1
+                self.dispatch(update)
+
+
+def _stats_loop(supervisor: Supervisor, interval: float) -> None:
+    while True:
+        time.sleep(interval)
+        log.info("WORKERS | %s", supervisor.summary())
+
+
+def run_supervisor() -> None:
+    """
+    Точка входа многопроцессного режима (sharding.workers != 1 в конфиге).
+    """
+    from src.core.constants_store import migrate
+    from src.core.note_index import start_warmup
+    from src.core.note_search import start_backfill
+    from src.infra.telegram import _set_commands_background, use_api_url
+    from src.infra.telegram.webhook import run_webhook
+    from src.integrations.gas_writer import drain_orphan_journals
+
+    supervisor = Supervisor.from_config()
+    workers = len(supervisor.shards)
+
+    # общее для всех воркеров делается один раз здесь
+    migrate()
+    start_warmup()
+    start_backfill()
+    threading.Thread(target=drain_orphan_journals, args=(workers,), name="drain-journals", daemon=True).start()
+    for shard in supervisor.shards:
+        metrics.register_stats(f"worker{shard.index}", lambda s=shard: s.stats)
+    metrics.start()
+    if config.sharding.stats_interval > 0:
+        threading.Thread(
+            target=_stats_loop, args=(supervisor, config.sharding.stats_interval), name="workers-stats", daemon=True,
+        ).start()
+
+    if config.telegram.api_url:
+        use_api_url(config.telegram.api_url)
+    # хендлеров у этого бота нет — только команды меню и регистрация webhook
+    bot = TeleBot(config.telegram.bot.token)
+    threading.Thread(target=_set_commands_background, args=(bot,), name="set-commands", daemon=True).start()
+
+    supervisor.start()
+    try:
+        if config.telegram.mode == "webhook":
+            run_webhook(bot, on_update=supervisor.dispatch_raw)
+        else:
+            supervisor.poll(bot.token)
+    except KeyboardInterrupt:
+        log.info("Stopped by Ctrl+C.")
+    finally:
+        supervisor.stop()
+
+
+if __name__ == "__main__":
+    run_supervisor()
@@ -0,0 +1,121 @@
+import html
+from datetime import datetime
+from typing import List
+
+from telebot import TeleBot, types
+
+from src.config import config, log
+from src.core.note_aggregates import WINDOWS, Count, StatsReport, get_note_aggregates
+from src.infra import metrics
+from src.infra.telegram import callbacks
+from src.infra.telegram.callbacks import CallbackData, callback_data, get_router
+from src.infra.telegram.edit_constants import _user_folder_from_user
+from src.infra.telegram.msg_handler import TZ, _user_folder_from_message
+
+
+WINDOW_TITLES = {"day": "День", "week": "Неделя", "month": "Месяц"}
+
+# /stats месяц — то же, что /stats month
+WINDOW_ALIASES = {
+    "day": "day", "день": "day", "сегодня": "day",
+    "week": "week", "неделя": "week",
+    "month": "month", "месяц": "month",
+}
+
+
+def window_from_command(text: str) -> str:
+    """'/stats месяц' -> 'month'; без аргумента или с непонятным — окно из конфига."""
+    parts = (text or "").split(maxsplit=1)
+    arg = parts[1].strip().lower() if len(parts) > 1 else ""
+    return WINDOW_ALIASES.get(arg, config.stats.window)
+
+
+def build_report(user_folder: str, window: str) -> StatsReport:
+    cfg = config.stats
+    return get_note_aggregates().report(
+        user_folder, datetime.now(TZ).date(), WINDOWS[window], top=cfg.top, pairs=cfg.pairs,
+    )
+
+
+def _delta(count: int, previous: int) -> str:
+    diff = count - previous
+    return f" ({diff:+d})" if diff else ""
+
+
+def _counts(title: str, counts: List[Count]) -> List[str]:
+    if not counts:
+        return []
+    lines = ["", f"<b>{title}</b>"]
+    lines += [f"{html.escape(c.label)} — {c.count}{_delta(c.count, c.previous)}" for c in counts]
+    return lines
+
+
+def render_report(report: StatsReport, window: str) -> tuple[str, types.InlineKeyboardMarkup]:
+    """
+    :return: (HTML-текст отчёта, кнопки окон)
+    """
+    period = report.end.strftime("%d.%m.%Y")
+    if report.start != report.end:
+        period = f"{report.start.strftime('%d.%m')}–{period}"
+    lines = [
+        f"📊 {WINDOW_TITLES[window]}, {period}",
+        f"Записей: {report.notes}{_delta(report.notes, report.previous_notes)}",
+    ]
+    lines += _counts("Эмоции", report.emotions)
+    lines += _counts("Теги", report.tags)
+    if report.pairs:
+        lines += ["", "<b>Чаще всего вместе</b>"]
+        lines += [f"{html.escape(e)} + {html.escape(t)} — {n}" for e, t, n in report.pairs]
+    if report.notes:
+        lines += ["", "В скобках — разница с предыдущим таким же периодом."]
+
+    markup = types.InlineKeyboardMarkup()
+    markup.row(*[
+        types.InlineKeyboardButton(
+            text=f"• {title}" if name == window else title,
+            callback_data=callback_data(callbacks.STATS, action="n" if name == window else "w", arg=name),
+        )
+        for name, title in WINDOW_TITLES.items()
+    ])
+    return "\n".join(lines), markup
+
+
+def register(bot: TeleBot) -> None:
+    @bot.message_handler(commands=["stats"])
+    @metrics.timed("handler_seconds", handler="stats")
+    def stats(message: types.Message):
+        user_folder = _user_folder_from_message(message)
+        window = window_from_command(message.text)
+
+        log.info("HANDLE stats | folder=%s; window=%s", user_folder, window)
+
+        text, markup = render_report(build_report(user_folder, window), window)
+        bot.send_message(
+            chat_id=message.chat.id,
+            message_thread_id=getattr(message, "message_thread_id", None),
+            text=text,
+            reply_markup=markup,
+            parse_mode="HTML",
+        )
+
+    @get_router(bot).route(callbacks.STATS)
+    @metrics.timed("handler_seconds", handler="cb_stats")
+    def cb_stats(call: types.CallbackQuery, data: CallbackData):
+        if data.action == "n":
+            # окно, которое уже показано
+            bot.answer_callback_query(call.id)
+            return
+        if data.action != "w" or data.arg not in WINDOWS:
+            bot.answer_callback_query(call.id, callbacks.STALE_TEXT)
+            return
+
+        # отчёт того, кто нажал
+        text, markup = render_report(build_report(_user_folder_from_user(call.from_user), data.arg), data.arg)
+        bot.answer_callback_query(call.id)
+        bot.edit_message_text(
+            chat_id=call.message.chat.id,
+            message_id=call.message.message_id,
+            text=text,
+            reply_markup=markup,
+            parse_mode="HTML",
+        )
@@ -0,0 +1,166 @@
+import hmac
+import secrets
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Optional
+
+from telebot import TeleBot, types
+
+from src.config import log, config
+from src.infra import metrics
+
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+# Telegram не присылает апдейты больше нескольких сотен КБ
+MAX_BODY_SIZE = 1024 * 1024
+
+
+class WebhookServer(ThreadingHTTPServer):
+    """HTTP-сервер, который принимает апдейты Telegram и отдаёт их зарегистрированным хендлерам бота."""
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: tuple[str, int],
+        bot: TeleBot,
+        path: str,
+        secret_token: str,
+        on_update: Optional[Callable[[str], None]] = None,
+    ) -> None:
+        """
+        :param address: (host, port); port=0 — любой свободный (удобно для тестов)
+        :param bot: бот с зарегистрированными хендлерами
+        :param path: путь, на который приходят апдейты
+        :param secret_token: ожидаемое значение заголовка X-Telegram-Bot-Api-Secret-Token; обязателен —
+            без него апдейты мог бы прислать любой, кто достучался до порта
+        :param on_update: получает JSON апдейта как есть вместо bot.process_new_updates (супервизор воркеров)
+        """
+        if not secret_token:
+            raise ValueError("Webhook server needs a secret_token")
+        super().__init__(address, WebhookHandler)
+        self.bot = bot
+        self.webhook_path = path
+        self.secret_token = secret_token
+        self.on_update = on_update
+
+
+class WebhookHandler(BaseHTTPRequestHandler):
+    server: WebhookServer
+
+    def do_GET(self) -> None:
+        if self.path == "/healthz":
+            self._reply(200, b"ok")
+        elif self.path == "/metrics" and metrics.enabled():
+            self._reply(200, metrics.get_registry().render_prometheus().encode("utf-8"))
+        else:
+            self._reply(404, b"not found")
+
+    def do_POST(self) -> None:
+        if self.path != self.server.webhook_path:
+            self._reply(404, b"not found")
+            return
+
+        if not hmac.compare_digest(self.headers.get(SECRET_HEADER, ""), self.server.secret_token):
+            log.warning(f"Webhook: bad secret token from {self.client_address[0]}")
+            self._reply(403, b"forbidden")
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = 0
+        if length <= 0 or length > MAX_BODY_SIZE:
+            self._reply(400, b"bad request")
+            return
+
+        body = self.rfile.read(length).decode("utf-8")
+        if self.server.on_update is not None:
+            self._reply(200, b"ok")
+            self.server.on_update(body)
+            return
+
+        try:
+            update = types.Update.de_json(body)
+        except Exception as e:
+            log.warning(f"Webhook: can't parse update: {e}")
+            self._reply(400, b"bad request")
+            return
+
+        # отвечаем сразу: TeleBot (threaded=True) выполняет хендлеры в своём пуле потоков
+        self._reply(200, b"ok")
+        self.server.bot.process_new_updates([update])
+
+    def _reply(self, status: int, body: bytes) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        # access-лог http.server пишет в stderr на каждый апдейт
+        pass
+
+
+def make_server(
+    bot: TeleBot,
+    host: Optional[str] = None,
+    port: Optional[int] = None,
+    path: Optional[str] = None,
+    secret_token: Optional[str] = None,
+    on_update: Optional[Callable[[str], None]] = None,
+) -> WebhookServer:
+    """
+    Создаёт сервер без регистрации webhook в Telegram (параметры по умолчанию — из конфига).
+    """
+    cfg = config.telegram.webhook
+    return WebhookServer(
+        address=(host if host is not None else cfg.host, port if port is not None else cfg.port),
+        bot=bot,
+        path=path or cfg.path,
+        secret_token=secret_token if secret_token is not None else cfg.secret_token,
+        on_update=on_update,
+    )
+
+
+def run_webhook(bot: TeleBot, on_update: Optional[Callable[[str], None]] = None) -> None:
+    """
+    Регистрирует webhook (если задан url) и обслуживает апдейты до Ctrl+C.
+    При остановке webhook не снимается: апдейты, пришедшие, пока бот лежит, Telegram придержит
+    до перезапуска, а другие экземпляры за тем же url продолжат их получать.
+
+    Без secret_token в конфиге url регистрируется со случайным секретом на этот запуск:
+    иначе апдейты мог бы подсунуть любой, кто узнал url. Без url (webhook регистрирует кто-то другой,
+    например прокси) случайный секрет никто не узнает — тогда secret_token обязателен, иначе ValueError.
+
+    :param on_update: см. WebhookServer
+    """
+    cfg = config.telegram.webhook
+    secret_token = cfg.secret_token
+    if not secret_token:
+        if not cfg.url:
+            raise ValueError(
+                "Webhook mode without telegram.webhook.url needs telegram.webhook.secret_token: "
+                "set it to the secret the webhook is registered with"
+            )
+        secret_token = secrets.token_urlsafe(32)
+        log.warning("Webhook: telegram.webhook.secret_token is not set, using a random one for this run")
+    server = make_server(bot, secret_token=secret_token, on_update=on_update)
+
+    if cfg.url:
+        # set_webhook заменяет прежнюю регистрацию, remove_webhook перед ним не нужен
+        bot.set_webhook(
+            url=cfg.url,
+            secret_token=secret_token,
+            max_connections=cfg.max_connections,
+            drop_pending_updates=cfg.drop_pending_updates,
+        )
+
+    host, port = server.server_address[:2]
+    log.info(f"Bot started. Webhook on {host}:{port}{cfg.path}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        log.info("Stopped by Ctrl+C.")
+    finally:
+        server.server_close()
@@ -0,0 +1,246 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+TrackMeta = tuple[str, str]  # (artist, title)
+
+
+@dataclass
+class CacheStats:
+    """Счётчики попаданий/промахов кеша"""
+    memory_hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+    @property
+    def hits(self) -> int:
+        return self.memory_hits + self.disk_hits
+
+
+class TrackMetaCache:
+    """
+    Двухуровневый кеш метаданных треков: LRU в памяти + SQLite на диске.
+
+    Ключ — id трека (см. get_info.extract_track_id).
+    Записи старше ttl считаются промахом и удаляются.
+    Если на диске больше disk_size записей — удаляются самые старые.
+    """
+
+    def __init__(
+        self,
+        path: Optional[Path | str] = None,
+        memory_size: int = 1024,
+        disk_size: int = 50_000,
+        ttl: int = 30 * 24 * 3600,
+    ) -> None:
+        """
+        :param path: путь к SQLite-файлу; None — только память
+        :param memory_size: размер LRU в памяти
+        :param disk_size: максимум записей на диске
+        :param ttl: время жизни записи, сек
+        """
+        self.memory_size = memory_size
+        self.disk_size = disk_size
+        self.ttl = ttl
+        self.stats = CacheStats()
+
+        self._lock = threading.Lock()
+        self._memory: OrderedDict[int, tuple[float, TrackMeta]] = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        self._writes_since_trim = 0
+
+        if path is not None:
+            path = Path(path)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(path), check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS tracks ("
+                " track_id INTEGER PRIMARY KEY,"
+                " artist TEXT NOT NULL,"
+                " title TEXT NOT NULL,"
+                " created_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS tracks_created_at ON tracks(created_at)")
+            self._db.commit()
+
+    def get(self, track_id: int) -> Optional[TrackMeta]:
+        now = time.time()
+        with self._lock:
+            item = self._memory.get(track_id)
+            if item is not None:
+                created_at, meta = item
+                if now - created_at < self.ttl:
+                    self._memory.move_to_end(track_id)
+                    self.stats.memory_hits += 1
+                    return meta
+                del self._memory[track_id]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT artist, title, created_at FROM tracks WHERE track_id = ?",
+                    (track_id,),
+                ).fetchone()
+                if row is not None:
+                    artist, title, created_at = row
+                    if now - created_at < self.ttl:
+                        meta = (artist, title)
+                        self._remember(track_id, created_at, meta)
+                        self.stats.disk_hits += 1
+                        return meta
+                    self._db.execute("DELETE FROM tracks WHERE track_id = ?", (track_id,))
+                    self._db.commit()
+
+            self.stats.misses += 1
+            return None
+
+    def set(self, track_id: int, meta: TrackMeta) -> None:
+        now = time.time()
+        with self._lock:
+            self._remember(track_id, now, meta)
+            if self._db is None:
+                return
+            self._db.execute(
+                "INSERT OR REPLACE INTO tracks (track_id, artist, title, created_at) VALUES (?, ?, ?, ?)",
+                (track_id, meta[0], meta[1], now),
+            )
+            self._db.commit()
+
+            # чистим диск не на каждую запись, а раз в ~1% от лимита
+            self._writes_since_trim += 1
+            if self._writes_since_trim >= max(1, self.disk_size // 100):
+                self._writes_since_trim = 0
+                self._trim_disk(now)
+
+    def set_many(self, metas: dict[int, TrackMeta]) -> None:
+        """Как set(), но одной транзакцией — для треков раскрытого альбома/плейлиста."""
+        if not metas:
+            return
+        now = time.time()
+        with self._lock:
+            for track_id, meta in metas.items():
+                self._remember(track_id, now, meta)
+            if self._db is None:
+                return
+            self._db.executemany(
+                "INSERT OR REPLACE INTO tracks (track_id, artist, title, created_at) VALUES (?, ?, ?, ?)",
+                [(track_id, meta[0], meta[1], now) for track_id, meta in metas.items()],
+            )
+            self._db.commit()
+
+            self._writes_since_trim += len(metas)
+            if self._writes_since_trim >= max(1, self.disk_size // 100):
+                self._writes_since_trim = 0
+                self._trim_disk(now)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM tracks")
+                self._db.commit()
+
+    def _remember(self, track_id: int, created_at: float, meta: TrackMeta) -> None:
+        self._memory[track_id] = (created_at, meta)
+        self._memory.move_to_end(track_id)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+            self.stats.evictions += 1
+
+    def _trim_disk(self, now: float) -> None:
+        cur = self._db.execute("DELETE FROM tracks WHERE created_at < ?", (now - self.ttl,))
+        self.stats.evictions += cur.rowcount
+
+        (count,) = self._db.execute("SELECT COUNT(*) FROM tracks").fetchone()
+        if count > self.disk_size:
+            cur = self._db.execute(
+                "DELETE FROM tracks WHERE track_id IN "
+                "(SELECT track_id FROM tracks ORDER BY created_at LIMIT ?)",
+                (count - self.disk_size,),
+            )
+            self.stats.evictions += cur.rowcount
+        self._db.commit()
+
+
+CollectionTracks = list[tuple[int, str]]  # [(track_id, ссылка на трек)]
+
+
+class CollectionCache:
+    """
+    Кеш раскрытых альбомов/плейлистов/артистов: ключ (см. get_info.collection_key) -> список треков.
+    Метаданные самих треков лежат в TrackMetaCache.
+    Альбомы почти не меняются, плейлисты меняются — поэтому ttl короче, чем у треков.
+    """
+
+    def __init__(self, path: Optional[Path | str] = None, memory_size: int = 256, ttl: int = 24 * 3600) -> None:
+        """
+        :param path: путь к SQLite-файлу (можно тот же, что у TrackMetaCache); None — только память
+        :param memory_size: сколько коллекций держать в памяти (LRU)
+        :param ttl: время жизни записи, сек
+        """
+        self.memory_size = memory_size
+        self.ttl = ttl
+        self.stats = CacheStats()
+
+        self._lock = threading.Lock()
+        self._memory: OrderedDict[str, tuple[float, CollectionTracks]] = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+
+        if path is not None:
+            path = Path(path)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(path), check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS collections ("
+                " key TEXT PRIMARY KEY,"
+                " tracks TEXT NOT NULL,"
+                " created_at REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    def get(self, key: str) -> Optional[CollectionTracks]:
+        now = time.time()
+        with self._lock:
+            item = self._memory.get(key)
+            if item is not None and now - item[0] < self.ttl:
+                self._memory.move_to_end(key)
+                self.stats.memory_hits += 1
+                return item[1]
+            if self._db is not None:
+                row = self._db.execute("SELECT created_at, tracks FROM collections WHERE key = ?", (key,)).fetchone()
+                if row is not None and now - row[0] < self.ttl:
+                    tracks = [(int(t), str(link)) for t, link in json.loads(row[1])]
+                    self._remember(key, row[0], tracks)
+                    self.stats.disk_hits += 1
+                    return tracks
+            self.stats.misses += 1
+            return None
+
+    def set(self, key: str, tracks: CollectionTracks) -> None:
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, tracks)
+            if self._db is None:
+                return
+            self._db.execute(
+                "INSERT OR REPLACE INTO collections (key, tracks, created_at) VALUES (?, ?, ?)",
+                (key, json.dumps(tracks), now),
+            )
+            self._db.execute("DELETE FROM collections WHERE created_at < ?", (now - self.ttl,))
+            self._db.commit()
+
+    def _remember(self, key: str, created_at: float, tracks: CollectionTracks) -> None:
+        self._memory[key] = (created_at, tracks)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+            self.stats.evictions += 1
@@ -1,8 +1,109 @@
+import asyncio
 import re
-from yandex_music import Client
+import threading
+from typing import TYPE_CHECKING
+
+from src.config import config, log, DATA
+from src.infra import metrics
+from src.infra.yandex_music.cache import CollectionCache, CollectionTracks, TrackMetaCache
+
+if TYPE_CHECKING:
+    # yandex_music (и aiohttp за ним) импортируется при первом запросе, а не при старте бота
+    from yandex_music import Client, ClientAsync
 
 TRACK_RE = re.compile(r"/track/(\d+)")
 ALBUM_TRACK_RE = re.compile(r"/album/(\d+)/track/(\d+)")
+# ссылки, которые раскрываются в несколько треков
+ALBUM_RE = re.compile(r"/album/(\d+)")
+ARTIST_RE = re.compile(r"/artist/(\d+)")
+PLAYLIST_RE = re.compile(r"/users/([^/?#\s]+)/playlists/(\d+)")
+
+# сколько id отправлять в один запрос client.tracks([...])
+TRACKS_CHUNK_SIZE = 100
+# сколько треков артиста запрашивать за страницу client.artists_tracks
+ARTIST_PAGE_SIZE = 100
+
+_cache: TrackMetaCache | None = None
+_cache_lock = threading.Lock()
+
+_collections: CollectionCache | None = None
+_collections_lock = threading.Lock()
+
+_client: "Client | None" = None
+_client_lock = threading.Lock()
+
+_async_client: "ClientAsync | None" = None
+# создаётся в первом вызове get_async_client — внутри работающего event loop
+_async_client_lock: asyncio.Lock | None = None
+
+
+def _new_client(token: str) -> "Client":
+    from yandex_music import Client
+
+    return Client(token).init()
+
+
+def get_client() -> "Client":
+    """
+    Общий на процесс клиент Яндекс Музыки.
+    Client.init() (запрос аккаунта) выполняется один раз — при первом обращении.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = _new_client(config.yandex_music.token)
+    return _client
+
+
+async def get_async_client() -> "ClientAsync":
+    """
+    Общий асинхронный клиент (для asyncio-рантайма), init() — один раз,
+    даже если первые запросы пришли одновременно.
+    """
+    global _async_client, _async_client_lock
+    if _async_client is None:
+        if _async_client_lock is None:
+            _async_client_lock = asyncio.Lock()
+        async with _async_client_lock:
+            if _async_client is None:
+                from yandex_music import ClientAsync
+
+                _async_client = await ClientAsync(config.yandex_music.token).init()
+    return _async_client
+
+
+def get_track_cache() -> TrackMetaCache:
+    """
+    Общий на процесс кеш метаданных треков: DATA/cache/yandex_music.sqlite3
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                cfg = config.yandex_music.cache
+                _cache = TrackMetaCache(
+                    path=DATA / "cache" / "yandex_music.sqlite3",
+                    memory_size=cfg.memory_size,
+                    disk_size=cfg.disk_size,
+                    ttl=cfg.ttl,
+                )
+    return _cache
+
+
+def get_collection_cache() -> CollectionCache:
+    """
+    Общий на процесс кеш раскрытых альбомов/плейлистов (в том же файле, что и кеш треков).
+    """
+    global _collections
+    if _collections is None:
+        with _collections_lock:
+            if _collections is None:
+                _collections = CollectionCache(
+                    path=DATA / "cache" / "yandex_music.sqlite3",
+                    ttl=config.yandex_music.cache.collections_ttl,
+                )
+    return _collections
 
 
 def extract_track_id(url: str) -> int | None:
@@ -17,19 +118,328 @@ def extract_track_id(url: str) -> int | None:
     return None
 
 
-def get_track_meta(url: str, token: str=None) -> tuple[str, str] | None:
-    track_id = extract_track_id(url)
-    if not track_id:
+def collection_key(url: str) -> str | None:
+    """
+    Ссылка на альбом, плейлист пользователя или артиста -> ключ вида "album:<id>",
+    "playlist:<login>:<kind>", "artist:<id>"; ссылка на трек и всё остальное -> None.
+    """
+    if extract_track_id(url):
+        return None
+    m = PLAYLIST_RE.search(url)
+    if m:
+        return f"playlist:{m.group(1)}:{m.group(2)}"
+    m = ALBUM_RE.search(url)
+    if m:
+        return f"album:{m.group(1)}"
+    m = ARTIST_RE.search(url)
+    if m:
+        return f"artist:{m.group(1)}"
+    return None
+
+
+def _track_link(track) -> str:
+    albums = getattr(track, "albums", None) or []
+    if albums and albums[0].id:
+        return f"https://music.yandex.ru/album/{albums[0].id}/track/{track.id}"
+    return f"https://music.yandex.ru/track/{track.id}"
+
+
+def _track_short_id(short) -> int | None:
+    # TrackShort.id бывает "<track_id>:<album_id>"
+    try:
+        return int(str(short.id).split(":")[0])
+    except (TypeError, ValueError):
         return None
 
-    client = Client(token).init()
-    track = client.tracks([track_id])[0]
 
+def _track_to_meta(track) -> tuple[str, str]:
     title = track.title
     artist = ", ".join(a.name for a in track.artists) if track.artists else "Unknown"
-
     return artist, title
 
 
+def _fetch_tracks_meta(track_ids: list[int], client: "Client") -> dict[int, tuple[str, str]]:
+    """
+    Запрашивает метаданные пачкой: один client.tracks([...]) на TRACKS_CHUNK_SIZE id.
+    """
+    result: dict[int, tuple[str, str]] = {}
+    for i in range(0, len(track_ids), TRACKS_CHUNK_SIZE):
+        chunk = track_ids[i:i + TRACKS_CHUNK_SIZE]
+        with metrics.timer("yandex_request_seconds"):
+            tracks = client.tracks(chunk) or []
+        for track in tracks:
+            try:
+                track_id = int(track.id)
+            except (TypeError, ValueError):
+                continue
+            result[track_id] = _track_to_meta(track)
+    return result
+
+
+async def _fetch_tracks_meta_async(track_ids: list[int], client: "ClientAsync") -> dict[int, tuple[str, str]]:
+    result: dict[int, tuple[str, str]] = {}
+    for i in range(0, len(track_ids), TRACKS_CHUNK_SIZE):
+        chunk = track_ids[i:i + TRACKS_CHUNK_SIZE]
+        with metrics.timer("yandex_request_seconds"):
+            tracks = await client.tracks(chunk) or []
+        for track in tracks:
+            try:
+                track_id = int(track.id)
+            except (TypeError, ValueError):
+                continue
+            result[track_id] = _track_to_meta(track)
+    return result
+
+
+def _fetch_collection(key: str, client: "Client", limit: int) -> list:
+    """
+    Треки коллекции (объекты Track, не больше limit) за несколько запросов:
+    альбом — один albums_with_tracks; артист — artists_tracks постранично;
+    плейлист — users_playlists, а треки без данных — пачками client.tracks([...]).
+    """
+    kind, _, ref = key.partition(":")
+    with metrics.timer("yandex_request_seconds"):
+        if kind == "album":
+            album = client.albums_with_tracks(ref)
+            return [t for volume in (album.volumes or []) for t in volume][:limit] if album else []
+
+        if kind == "artist":
+            tracks: list = []
+            page = 0
+            while len(tracks) < limit:
+                result = client.artists_tracks(ref, page=page, page_size=ARTIST_PAGE_SIZE)
+                if not result or not result.tracks:
+                    break
+                tracks += result.tracks
+                pager = result.pager
+                if pager is None or (page + 1) * pager.per_page >= pager.total:
+                    break
+                page += 1
+            return tracks[:limit]
+
+        login, _, playlist_kind = ref.partition(":")
+        playlist = client.users_playlists(playlist_kind, user_id=login)
+        shorts = (playlist.tracks or [])[:limit] if playlist else []
+
+    full = {_track_short_id(s): s.track for s in shorts if s.track is not None}
+    missing = [i for i in (_track_short_id(s) for s in shorts) if i is not None and i not in full]
+    for i in range(0, len(missing), TRACKS_CHUNK_SIZE):
+        with metrics.timer("yandex_request_seconds"):
+            for track in client.tracks(missing[i:i + TRACKS_CHUNK_SIZE]) or []:
+                full[_track_short_id(track)] = track
+    return [full[i] for i in (_track_short_id(s) for s in shorts) if i in full]
+
+
+async def _fetch_collection_async(key: str, client: "ClientAsync", limit: int) -> list:
+    kind, _, ref = key.partition(":")
+    with metrics.timer("yandex_request_seconds"):
+        if kind == "album":
+            album = await client.albums_with_tracks(ref)
+            return [t for volume in (album.volumes or []) for t in volume][:limit] if album else []
+
+        if kind == "artist":
+            tracks: list = []
+            page = 0
+            while len(tracks) < limit:
+                result = await client.artists_tracks(ref, page=page, page_size=ARTIST_PAGE_SIZE)
+                if not result or not result.tracks:
+                    break
+                tracks += result.tracks
+                pager = result.pager
+                if pager is None or (page + 1) * pager.per_page >= pager.total:
+                    break
+                page += 1
+            return tracks[:limit]
+
+        login, _, playlist_kind = ref.partition(":")
+        playlist = await client.users_playlists(playlist_kind, user_id=login)
+        shorts = (playlist.tracks or [])[:limit] if playlist else []
+
+    full = {_track_short_id(s): s.track for s in shorts if s.track is not None}
+    missing = [i for i in (_track_short_id(s) for s in shorts) if i is not None and i not in full]
+    for i in range(0, len(missing), TRACKS_CHUNK_SIZE):
+        with metrics.timer("yandex_request_seconds"):
+            for track in await client.tracks(missing[i:i + TRACKS_CHUNK_SIZE]) or []:
+                full[_track_short_id(track)] = track
+    return [full[i] for i in (_track_short_id(s) for s in shorts) if i in full]
+
+
+def _store_collection(key: str, tracks: list) -> CollectionTracks:
+    """
+    Кладёт состав коллекции и метаданные её треков в кеши.
+    """
+    items: CollectionTracks = []
+    metas: dict[int, tuple[str, str]] = {}
+    for track in tracks:
+        try:
+            track_id = int(track.id)
+        except (TypeError, ValueError):
+            continue
+        if track_id in metas:
+            continue
+        metas[track_id] = _track_to_meta(track)
+        items.append((track_id, _track_link(track)))
+    get_track_cache().set_many(metas)
+    get_collection_cache().set(key, items)
+    return items
+
+
+def _split_cached_collections(urls: list[str]) -> tuple[dict[str, str], dict[str, CollectionTracks], list[str]]:
+    """
+    :return: ({url: ключ}, {ключ: треки} из кеша, ключи, которых нет в кеше)
+    """
+    cache = get_collection_cache()
+    keys_by_url: dict[str, str] = {}
+    resolved: dict[str, CollectionTracks] = {}
+    missing: dict[str, None] = {}
+    for url in urls:
+        key = collection_key(url)
+        if key is None:
+            continue
+        keys_by_url[url] = key
+        if key in resolved or key in missing:
+            continue
+        items = cache.get(key)
+        if items is not None:
+            resolved[key] = items
+        else:
+            missing[key] = None
+    return keys_by_url, resolved, list(missing)
+
+
+def _collection_result(
+    keys_by_url: dict[str, str], resolved: dict[str, CollectionTracks],
+) -> dict[str, list[tuple[int, str, tuple[str, str]]]]:
+    """
+    Метаданные треков — из кеша треков; вытесненные оттуда запрашиваются одним get_tracks_meta.
+    """
+    links = [link for items in resolved.values() for _, link in items]
+    metas = get_tracks_meta(links) if links else {}
+    return {
+        url: [(track_id, link, metas[link]) for track_id, link in resolved.get(key, []) if link in metas]
+        for url, key in keys_by_url.items()
+    }
+
+
+def expand_links(urls: list[str]) -> dict[str, list[tuple[int, str, tuple[str, str]]]]:
+    """
+    Раскрывает ссылки на альбомы, плейлисты пользователей и артистов в треки.
+    Состав коллекций кешируется; треки каждой — не больше yandex_music.expand_limit.
+
+    :return: {url: [(id трека, ссылка на трек, (artist, title))]}; ссылки на треки и прочие — отсутствуют
+    """
+    keys_by_url, resolved, missing = _split_cached_collections(urls)
+    if missing:
+        from yandex_music.exceptions import YandexMusicError
+
+        client = get_client()
+        for key in missing:
+            try:
+                tracks = _fetch_collection(key, client, config.yandex_music.expand_limit)
+            except YandexMusicError as e:
+                # битая/закрытая коллекция не роняет остальные ссылки и не кешируется
+                log.warning(f"Yandex Music: can't expand {key}: {e}")
+                continue
+            resolved[key] = _store_collection(key, tracks)
+    return _collection_result(keys_by_url, resolved)
+
+
+async def expand_links_async(urls: list[str]) -> dict[str, list[tuple[int, str, tuple[str, str]]]]:
+    """
+    Асинхронный вариант expand_links (общий ClientAsync).
+    Кеши на SQLite читаются и пишутся в потоке, чтобы не останавливать event loop.
+    """
+    keys_by_url, resolved, missing = await asyncio.to_thread(_split_cached_collections, urls)
+    if missing:
+        from yandex_music.exceptions import YandexMusicError
+
+        client = await get_async_client()
+        for key in missing:
+            try:
+                tracks = await _fetch_collection_async(key, client, config.yandex_music.expand_limit)
+            except YandexMusicError as e:
+                log.warning(f"Yandex Music: can't expand {key}: {e}")
+                continue
+            resolved[key] = await asyncio.to_thread(_store_collection, key, tracks)
+    links = [link for items in resolved.values() for _, link in items]
+    metas = await get_tracks_meta_async(links) if links else {}
+    return {
+        url: [(track_id, link, metas[link]) for track_id, link in resolved.get(key, []) if link in metas]
+        for url, key in keys_by_url.items()
+    }
+
+
+def _split_cached(urls: list[str]) -> tuple[dict[str, int], dict[int, tuple[str, str]], list[int]]:
+    """
+    :return: ({url: track_id}, {track_id: meta} из кеша, id, которых нет в кеше)
+    """
+    cache = get_track_cache()
+
+    ids_by_url: dict[str, int] = {}
+    resolved: dict[int, tuple[str, str]] = {}
+    missing: dict[int, None] = {}  # упорядоченное множество
+    for url in urls:
+        track_id = extract_track_id(url)
+        if not track_id:
+            continue
+        ids_by_url[url] = track_id
+        if track_id in resolved or track_id in missing:
+            continue
+        meta = cache.get(track_id)
+        if meta is not None:
+            resolved[track_id] = meta
+        else:
+            missing[track_id] = None
+
+    return ids_by_url, resolved, list(missing)
+
+
+def _merge_fetched(
+    ids_by_url: dict[str, int],
+    resolved: dict[int, tuple[str, str]],
+    fetched: dict[int, tuple[str, str]],
+) -> dict[str, tuple[str, str]]:
+    # одной транзакцией SQLite на все треки запроса
+    get_track_cache().set_many(fetched)
+    resolved.update(fetched)
+    return {url: resolved[track_id] for url, track_id in ids_by_url.items() if track_id in resolved}
+
+
+def get_tracks_meta(urls: list[str], token: str=None) -> dict[str, tuple[str, str]]:
+    """
+    Метаданные сразу для нескольких ссылок.
+    Кеш проверяется для каждого id, остальные id уходят одним запросом.
+
+    :param urls: ссылки на треки
+    :param token: токен; если передан — используется отдельный клиент, а не общий
+    :return: {url: (artist, title)}; ссылки без трека/не найденные в ответе отсутствуют
+    """
+    ids_by_url, resolved, missing = _split_cached(urls)
+
+    fetched: dict[int, tuple[str, str]] = {}
+    if missing:
+        client = _new_client(token) if token else get_client()
+        fetched = _fetch_tracks_meta(missing, client)
+
+    return _merge_fetched(ids_by_url, resolved, fetched)
+
+
+async def get_tracks_meta_async(urls: list[str]) -> dict[str, tuple[str, str]]:
+    """
+    Асинхронный вариант get_tracks_meta (общий ClientAsync); кеш — в потоке, как в expand_links_async.
+    """
+    ids_by_url, resolved, missing = await asyncio.to_thread(_split_cached, urls)
+
+    fetched: dict[int, tuple[str, str]] = {}
+    if missing:
+        fetched = await _fetch_tracks_meta_async(missing, await get_async_client())
+
+    return await asyncio.to_thread(_merge_fetched, ids_by_url, resolved, fetched)
+
+
+def get_track_meta(url: str, token: str=None) -> tuple[str, str] | None:
+    return get_tracks_meta([url], token=token).get(url)
+
+
 if __name__ == "__main__":
-    print(get_track_meta('https://music.yandex.ru/album/474096/track/35487142?ref_id=336D5361-BECC-4F18-9777-95767EB09DF4&utm_medium=copy_link'))
\ No newline at end of file
+    print(get_track_meta('https://music.yandex.ru/album/474096/track/35487142?ref_id=336D5361-BECC-4F18-9777-95767EB09DF4&utm_medium=copy_link'))
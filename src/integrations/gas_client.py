@@ -1,35 +1,175 @@
-from dataclasses import dataclass
+import random
+import threading
+import time
+from dataclasses import dataclass, field
 from typing import Any, Dict, List, Optional
 
 import requests
+from requests.adapters import HTTPAdapter
 
 from src.config import config, log
+from src.infra import metrics
+
+
+# Действия, которые безопасно повторять: повтор не меняет результат
+IDEMPOTENT_ACTIONS = frozenset({"exists", "list_ids", "list_notes", "upsert_note"})
+
+# HTTP-статусы, при которых имеет смысл повторить запрос
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class _RetryableError(Exception):
+    pass
+
+
+def error_page(status: int, content_type: str) -> bool:
+    # под нагрузкой GAS отвечает HTML-страницей ошибки или квоты (часто с кодом 200) — это сбой сервера,
+    # а не ответ скрипта: такой запрос можно повторить
+    return not 200 <= status < 300 or "html" in (content_type or "").lower()
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    # экспоненциальная пауза с "full jitter"
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def note_record(*, msg_id: int, when: str, what: str, emotions: List[str], tags: List[str]) -> Dict[str, Any]:
+    return {
+        "id": str(msg_id),
+        "when": when,       # dd.mm.YYYY HH:MM:SS
+        "what": what,
+        "emotions": emotions,
+        "tags": tags,
+    }
+
+
+def parse_exists(resp: Dict[str, Any]) -> Optional[bool]:
+    # ok=false — это не "записи нет", а "не знаю": такой ответ нельзя кешировать как отрицательный
+    if not resp.get("ok"):
+        return None
+    return resp.get("exists") is True
+
+
+def clean_track_items(items: List[dict[str, str]]) -> List[dict[str, str]]:
+    clean_items: List[dict[str, str]] = []
+    for it in items:
+        link = (it.get("link") or "").strip()
+        text = (it.get("text") or "").strip()
+        if link and text:
+            clean_items.append({"link": link, "text": text})
+    return clean_items
 
 
 @dataclass(frozen=True)
 class GasClient:
     deployment_id: str
-    timeout: int = 15
+    timeout: float = 15
+    pool_size: int = 10
+    retries: int = 3
+    backoff: float = 0.5
+    backoff_max: float = 8
+    session: requests.Session = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        # Один Session на клиента: keep-alive соединения к script.google.com
+        # и к script.googleusercontent.com (куда GAS редиректит ответ) переиспользуются.
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=self.pool_size, max_retries=0)
+        session.mount("https://", adapter)
+        object.__setattr__(self, "session", session)
 
     @property
     def url(self) -> str:
         return f"https://script.google.com/macros/s/{self.deployment_id}/exec"
 
-    def post(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+    def _post_once(self, payload: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+        try:
+            r = self.session.post(self.url, json=payload, timeout=timeout)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            raise _RetryableError(str(e)) from e
+
+        if r.status_code in RETRY_STATUSES:
+            raise _RetryableError(f"HTTP {r.status_code}")
+        r.raise_for_status()
+
         try:
-            r = requests.post(self.url, json=payload, timeout=self.timeout)
-            r.raise_for_status()
             data = r.json()
-            if not isinstance(data, dict):
-                return {"ok": False, "error": "Bad response JSON"}
-            return data
-        except Exception as e:
-            log.error(f"GAS request failed: {e}", exc_info=True)
-            return {"ok": False, "error": str(e)}
+        except ValueError as e:
+            if error_page(r.status_code, r.headers.get("Content-Type", "")):
+                raise _RetryableError(f"HTTP {r.status_code}: not a JSON response") from e
+            raise
+        if not isinstance(data, dict):
+            return {"ok": False, "error": "Bad response JSON"}
+        return data
+
+    def post(self, payload: Dict[str, Any], timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        :param payload: тело запроса (action, user, ...)
+        :param timeout: таймаут этого вызова; по умолчанию self.timeout
+        """
+        timeout = self.timeout if timeout is None else timeout
+        attempts = 1 + (self.retries if payload.get("action") in IDEMPOTENT_ACTIONS else 0)
+
+        action = payload.get("action", "")
+        attempt = 0
+        while True:
+            try:
+                with metrics.timer("gas_request_seconds", action=action):
+                    return self._post_once(payload, timeout)
+            except _RetryableError as e:
+                metrics.inc("gas_errors_total", action=action)
+                attempt += 1
+                if attempt >= attempts:
+                    log.error(f"GAS request failed: {e}")
+                    # retryable: сбой сети/сервера, а не ответ скрипта — запрос можно повторить позже
+                    return {"ok": False, "error": str(e), "retryable": True}
+                delay = backoff_delay(attempt - 1, self.backoff, self.backoff_max)
+                log.warning(f"GAS request failed ({e}), retry {attempt}/{attempts - 1} in {delay:.2f}s")
+                time.sleep(delay)
+            except Exception as e:
+                metrics.inc("gas_errors_total", action=action)
+                log.error(f"GAS request failed: {e}", exc_info=True)
+                return {"ok": False, "error": str(e)}
+
+    def exists(self, *, user: str, msg_id: int, timeout: Optional[float] = None) -> Optional[bool]:
+        """
+        :return: True/False — ответ скрипта; None — GAS не ответил (сбой сети, 5xx, ошибка скрипта)
+        """
+        resp = self.post({"action": "exists", "user": user, "id": str(msg_id)}, timeout=timeout)
+        return parse_exists(resp)
+
+    def list_ids(self, *, user: str, timeout: Optional[float] = None) -> Optional[List[int]]:
+        """
+        Все id записей пользователя; None — если GAS не ответил.
+        """
+        resp = self.post({"action": "list_ids", "user": user}, timeout=timeout)
+        if not resp.get("ok"):
+            return None
+        ids: List[int] = []
+        for raw in resp.get("ids") or []:
+            try:
+                ids.append(int(raw))
+            except (TypeError, ValueError):
+                continue
+        return ids
 
-    def exists(self, *, user: str, msg_id: int) -> bool:
-        resp = self.post({"action": "exists", "user": user, "id": str(msg_id)})
-        return bool(resp.get("ok") and resp.get("exists") is True)
+    def list_notes(
+        self, *, user: str, offset: int = 0, limit: int = 500, timeout: Optional[float] = None,
+    ) -> Optional[tuple[List[Dict[str, Any]], int]]:
+        """
+        Строки таблицы пользователя с offset (0 — первая после заголовка), не больше limit.
+
+        :return: ([{id, when, what, emotions, tags, tracks}], с какой строки продолжить); None — если GAS не ответил
+        """
+        resp = self.post({"action": "list_notes", "user": user, "offset": offset, "limit": limit}, timeout=timeout)
+        if not resp.get("ok"):
+            return None
+        notes = [n for n in resp.get("notes") or [] if isinstance(n, dict)]
+        try:
+            next_row = int(resp.get("next", offset + len(notes)))
+        except (TypeError, ValueError):
+            next_row = offset + len(notes)
+        return notes, next_row
 
     def upsert_note(
         self,
@@ -40,37 +180,64 @@ class GasClient:
         what: str,
         emotions: List[str],
         tags: List[str],
+        timeout: Optional[float] = None,
     ) -> Dict[str, Any]:
         return self.post(
             {
                 "action": "upsert_note",
                 "user": user,
-                "record": {
-                    "id": str(msg_id),
-                    "when": when,       # dd.mm.YYYY HH:MM:SS
-                    "what": what,
-                    "emotions": emotions,
-                    "tags": tags,
-                },
-            }
+                "record": note_record(msg_id=msg_id, when=when, what=what, emotions=emotions, tags=tags),
+            },
+            timeout=timeout,
         )
 
-    def add_tracks(self, *, user: str, msg_id: int, items: List[dict[str, str]]) -> Dict[str, Any]:
-        clean_items: List[dict[str, str]] = []
-        for it in items:
-            link = (it.get("link") or "").strip()
-            text = (it.get("text") or "").strip()
-            if link and text:
-                clean_items.append({"link": link, "text": text})
-
+    def add_tracks(
+        self,
+        *,
+        user: str,
+        msg_id: int,
+        items: List[dict[str, str]],
+        timeout: Optional[float] = None,
+    ) -> Dict[str, Any]:
         return self.post(
             {
                 "action": "add_track",
                 "user": user,
                 "id": str(msg_id),
-                "items": clean_items,
-            }
+                "items": clean_track_items(items),
+            },
+            timeout=timeout,
         )
 
+    def batch(self, *, user: str, ops: List[Dict[str, Any]], timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Несколько upsert_note/add_track одним запросом.
+
+        :param ops: [{"action": "upsert_note", "record": {...}}, {"action": "add_track", "id": ..., "items": [...]}]
+        :return: {"ok": True, "results": [...]} — results в том же порядке, что и ops
+        """
+        return self.post({"action": "batch", "user": user, "ops": ops}, timeout=timeout)
+
+
+_client: Optional[GasClient] = None
+_client_lock = threading.Lock()
+
+
 def get_gas_client() -> GasClient:
-    return GasClient(deployment_id=config.gas.token)
+    """
+    Общий на процесс клиент GAS (один пул соединений на все хендлеры).
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                cfg = config.gas
+                _client = GasClient(
+                    deployment_id=cfg.token,
+                    timeout=cfg.timeout,
+                    pool_size=cfg.pool_size,
+                    retries=cfg.retries,
+                    backoff=cfg.backoff,
+                    backoff_max=cfg.backoff_max,
+                )
+    return _client
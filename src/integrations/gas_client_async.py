@@ -0,0 +1,171 @@
+import asyncio
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import aiohttp
+
+from src.config import config, log
+from src.infra import metrics
+from src.integrations.gas_client import (
+    IDEMPOTENT_ACTIONS,
+    RETRY_STATUSES,
+    backoff_delay,
+    clean_track_items,
+    error_page,
+    note_record,
+    parse_exists,
+)
+
+
+class _RetryableError(Exception):
+    pass
+
+
+@dataclass
+class AsyncGasClient:
+    """
+    Асинхронный клиент GAS для asyncio-рантайма (src.infra.telegram.aio).
+    Повторы, таймауты и формат ответов — как у GasClient.
+    """
+    deployment_id: str
+    timeout: float = 15
+    pool_size: int = 10
+    retries: int = 3
+    backoff: float = 0.5
+    backoff_max: float = 8
+    _session: Optional[aiohttp.ClientSession] = field(default=None, init=False, repr=False, compare=False)
+
+    @property
+    def url(self) -> str:
+        return f"https://script.google.com/macros/s/{self.deployment_id}/exec"
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # сессия создаётся внутри работающего event loop
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit_per_host=self.pool_size)
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    async def _post_once(self, payload: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+        try:
+            async with self._get_session().post(
+                self.url,
+                json=payload,
+                timeout=aiohttp.ClientTimeout(total=timeout),
+            ) as r:
+                if r.status in RETRY_STATUSES:
+                    raise _RetryableError(f"HTTP {r.status}")
+                r.raise_for_status()
+                try:
+                    data = await r.json(content_type=None)
+                except ValueError as e:
+                    if error_page(r.status, r.content_type):
+                        raise _RetryableError(f"HTTP {r.status}: not a JSON response") from e
+                    raise
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+            raise _RetryableError(str(e) or type(e).__name__) from e
+
+        if not isinstance(data, dict):
+            return {"ok": False, "error": "Bad response JSON"}
+        return data
+
+    async def post(self, payload: Dict[str, Any], timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        :param payload: тело запроса (action, user, ...)
+        :param timeout: таймаут этого вызова; по умолчанию self.timeout
+        """
+        timeout = self.timeout if timeout is None else timeout
+        attempts = 1 + (self.retries if payload.get("action") in IDEMPOTENT_ACTIONS else 0)
+
+        action = payload.get("action", "")
+        attempt = 0
+        while True:
+            try:
+                with metrics.timer("gas_request_seconds", action=action):
+                    return await self._post_once(payload, timeout)
+            except _RetryableError as e:
+                metrics.inc("gas_errors_total", action=action)
+                attempt += 1
+                if attempt >= attempts:
+                    log.error(f"GAS request failed: {e}")
+                    return {"ok": False, "error": str(e), "retryable": True}
+                delay = backoff_delay(attempt - 1, self.backoff, self.backoff_max)
+                log.warning(f"GAS request failed ({e}), retry {attempt}/{attempts - 1} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+            except Exception as e:
+                metrics.inc("gas_errors_total", action=action)
+                log.error(f"GAS request failed: {e}", exc_info=True)
+                return {"ok": False, "error": str(e)}
+
+    async def exists(self, *, user: str, msg_id: int, timeout: Optional[float] = None) -> Optional[bool]:
+        """
+        :return: True/False — ответ скрипта; None — GAS не ответил
+        """
+        resp = await self.post({"action": "exists", "user": user, "id": str(msg_id)}, timeout=timeout)
+        return parse_exists(resp)
+
+    async def upsert_note(
+        self,
+        *,
+        user: str,
+        msg_id: int,
+        when: str,
+        what: str,
+        emotions: List[str],
+        tags: List[str],
+        timeout: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        return await self.post(
+            {
+                "action": "upsert_note",
+                "user": user,
+                "record": note_record(msg_id=msg_id, when=when, what=what, emotions=emotions, tags=tags),
+            },
+            timeout=timeout,
+        )
+
+    async def add_tracks(
+        self,
+        *,
+        user: str,
+        msg_id: int,
+        items: List[dict[str, str]],
+        timeout: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        return await self.post(
+            {
+                "action": "add_track",
+                "user": user,
+                "id": str(msg_id),
+                "items": clean_track_items(items),
+            },
+            timeout=timeout,
+        )
+
+    async def batch(self, *, user: str, ops: List[Dict[str, Any]], timeout: Optional[float] = None) -> Dict[str, Any]:
+        return await self.post({"action": "batch", "user": user, "ops": ops}, timeout=timeout)
+
+
+_client: Optional[AsyncGasClient] = None
+
+
+def get_async_gas_client() -> AsyncGasClient:
+    """
+    Общий на процесс асинхронный клиент GAS (используется из одного event loop).
+    """
+    global _client
+    if _client is None:
+        cfg = config.gas
+        _client = AsyncGasClient(
+            deployment_id=cfg.token,
+            timeout=cfg.timeout,
+            pool_size=cfg.pool_size,
+            retries=cfg.retries,
+            backoff=cfg.backoff,
+            backoff_max=cfg.backoff_max,
+        )
+    return _client
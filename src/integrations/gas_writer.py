@@ -0,0 +1,409 @@
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from src.config import config, log, DATA, worker_id
+from src.integrations.gas_client import GasClient, get_gas_client, note_record, clean_track_items
+
+
+# после стольких ack-записей журнал переписывается, чтобы не рос бесконечно
+COMPACT_EVERY = 1000
+
+# максимальная пауза между повторами упавшего batch, сек
+MAX_RETRY_DELAY = 60.0
+
+# журнал воркера; gas_journal.w<N>.dead.jsonl под него не подходит — dead-letter не досылается и не удаляется
+WORKER_JOURNAL_RE = re.compile(r"gas_journal\.w(\d+)\.jsonl")
+
+
+@dataclass
+class WriterStats:
+    """Счётчики фоновой записи в GAS"""
+    enqueued: int = 0
+    flushed: int = 0
+    dead: int = 0
+    batches: int = 0
+    failed_batches: int = 0
+    last_flush_latency: float = 0.0
+    max_flush_latency: float = 0.0
+    total_flush_latency: float = 0.0
+
+    @property
+    def avg_flush_latency(self) -> float:
+        return self.total_flush_latency / self.batches if self.batches else 0.0
+
+
+@dataclass
+class _Entry:
+    seq: int
+    user: str
+    op: Dict[str, Any]
+    attempts: int = field(default=0, compare=False)
+
+
+class GasWriter:
+    """
+    Write-behind очередь для записи в GAS.
+
+    Что делает:
+    - upsert_note/add_tracks только дописывают операцию в журнал (JSON lines) и сразу возвращаются
+    - фоновый поток отправляет операции пачками через action=batch
+    - успешно отправленные операции помечаются в журнале записью {"ack": [...]}
+    - при старте неотправленные операции из журнала отправляются заново
+    - операции, которые GAS отклонил max_attempts раз, уходят в <journal>.dead.jsonl
+    - у каждой операции свой op_id (хранится в журнале): пачку, которую GAS применил, но ответ
+      потерялся, отправляем заново, а GAS пропускает уже применённые op_id — треки не дублируются
+    - пачки пользователя, которого GAS не принимает, откладываются с растущей паузой,
+      остальные пользователи тем временем отправляются
+    """
+
+    def __init__(
+        self,
+        client: GasClient,
+        journal_path: Path | str,
+        batch_size: int = 50,
+        flush_interval: float = 1.0,
+        max_attempts: int = 10,
+        fsync: bool = True,
+    ) -> None:
+        """
+        :param client: клиент GAS
+        :param journal_path: путь к журналу
+        :param batch_size: максимум операций в одном batch-запросе
+        :param flush_interval: как часто проверять очередь, сек
+        :param max_attempts: сколько раз повторять отклонённую операцию
+        :param fsync: делать fsync после каждой записи в журнал
+        """
+        self.client = client
+        self.journal_path = Path(journal_path)
+        self.dead_path = self.journal_path.with_suffix(".dead.jsonl")
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        self.fsync = fsync
+        self.stats = WriterStats()
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self._pending: OrderedDict[int, _Entry] = OrderedDict()
+        # пользователь -> (неудач подряд, когда пробовать снова)
+        self._backoff: Dict[str, tuple[int, float]] = {}
+        self._next_seq = 1
+        self._acks_since_compact = 0
+
+        self.journal_path.parent.mkdir(parents=True, exist_ok=True)
+        self._replay()
+        self._journal = open(self.journal_path, "a", encoding="utf-8")
+
+    # ---------- публичное API ----------
+
+    @property
+    def depth(self) -> int:
+        """Сколько операций ждёт отправки"""
+        with self._lock:
+            return len(self._pending)
+
+    def upsert_note(self, *, user: str, msg_id: int, when: str, what: str, emotions: List[str], tags: List[str]) -> int:
+        record = note_record(msg_id=msg_id, when=when, what=what, emotions=emotions, tags=tags)
+        return self._enqueue(user, {"action": "upsert_note", "record": record})
+
+    def add_tracks(self, *, user: str, msg_id: int, items: List[dict[str, str]]) -> int:
+        return self._enqueue(user, {"action": "add_track", "id": str(msg_id), "items": clean_track_items(items)})
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="GasWriter", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """
+        Останавливает поток; перед выходом он пробует отправить всё, что накопилось.
+        Не отправленное остаётся в журнале до следующего старта.
+        """
+        self._stop.set()
+        with self._wakeup:
+            self._wakeup.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        with self._lock:
+            if not self._journal.closed:
+                self._journal.close()
+
+    # ---------- журнал ----------
+
+    def _replay(self) -> None:
+        if not self.journal_path.exists():
+            return
+
+        with open(self.journal_path, encoding="utf-8") as f:
+            for line_no, line in enumerate(f, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    rec = json.loads(line)
+                except json.JSONDecodeError:
+                    # оборванная при падении последняя строка
+                    log.warning(f"GasWriter: skip broken journal line {line_no}")
+                    continue
+
+                if "ack" in rec:
+                    for seq in rec["ack"]:
+                        self._pending.pop(seq, None)
+                    continue
+
+                seq = int(rec["seq"])
+                self._pending[seq] = _Entry(seq=seq, user=rec["user"], op=rec["op"])
+                self._next_seq = max(self._next_seq, seq + 1)
+
+        if self._pending:
+            log.info(f"GasWriter: replay {len(self._pending)} pending ops from {self.journal_path}")
+        self._rewrite_journal()
+
+    def _rewrite_journal(self) -> None:
+        """Переписывает журнал, оставляя только неотправленные операции."""
+        tmp = self.journal_path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            for entry in self._pending.values():
+                f.write(json.dumps({"seq": entry.seq, "user": entry.user, "op": entry.op}, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.journal_path)
+        self._acks_since_compact = 0
+
+    def _write_line(self, rec: Dict[str, Any]) -> None:
+        self._journal.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        self._journal.flush()
+        if self.fsync:
+            os.fsync(self._journal.fileno())
+
+    def _enqueue(self, user: str, op: Dict[str, Any]) -> int:
+        op["op_id"] = uuid.uuid4().hex
+        with self._wakeup:
+            seq = self._next_seq
+            self._next_seq += 1
+            self._write_line({"seq": seq, "user": user, "op": op})
+            self._pending[seq] = _Entry(seq=seq, user=user, op=op)
+            self.stats.enqueued += 1
+            self._wakeup.notify()
+        return seq
+
+    def _ack(self, entries: List[_Entry]) -> None:
+        if not entries:
+            return
+        with self._lock:
+            if self._journal.closed:
+                # stop() не дождался потока: операции останутся в журнале и будут досланы
+                return
+            self._write_line({"ack": [e.seq for e in entries]})
+            for e in entries:
+                self._pending.pop(e.seq, None)
+            self._acks_since_compact += 1
+            if self._acks_since_compact >= COMPACT_EVERY or not self._pending:
+                self._journal.close()
+                self._rewrite_journal()
+                self._journal = open(self.journal_path, "a", encoding="utf-8")
+
+    def _bury(self, entry: _Entry, error: str) -> None:
+        log.error(f"GasWriter: drop op seq={entry.seq} user={entry.user} after {entry.attempts} attempts: {error}")
+        with open(self.dead_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"seq": entry.seq, "user": entry.user, "op": entry.op, "error": error}, ensure_ascii=False) + "\n")
+        self.stats.dead += 1
+
+    # ---------- фоновый поток ----------
+
+    def _next_batch(self) -> List[_Entry]:
+        """
+        Самые старые операции одного пользователя (порядок внутри пользователя сохраняется).
+        Пользователи, чья пауза после неудачи ещё не истекла, пропускаются.
+        """
+        now = time.monotonic()
+        with self._lock:
+            user = next(
+                (e.user for e in self._pending.values() if self._backoff.get(e.user, (0, 0.0))[1] <= now), None,
+            )
+            if user is None:
+                return []
+            batch = []
+            for entry in self._pending.values():
+                if entry.user != user:
+                    continue
+                batch.append(entry)
+                if len(batch) >= self.batch_size:
+                    break
+            return batch
+
+    def _flush(self, batch: List[_Entry]) -> bool:
+        """
+        :return: True, если все операции пачки обработаны
+        """
+        t0 = time.perf_counter()
+        resp = self.client.batch(user=batch[0].user, ops=[e.op for e in batch])
+        latency = time.perf_counter() - t0
+
+        self.stats.batches += 1
+        self.stats.last_flush_latency = latency
+        self.stats.max_flush_latency = max(self.stats.max_flush_latency, latency)
+        self.stats.total_flush_latency += latency
+
+        results = resp.get("results")
+        if resp.get("ok") and isinstance(results, list) and len(results) == len(batch):
+            done: List[_Entry] = []
+            for entry, result in zip(batch, results):
+                if isinstance(result, dict) and result.get("ok"):
+                    done.append(entry)
+                    continue
+                entry.attempts += 1
+                if entry.attempts >= self.max_attempts:
+                    self._bury(entry, str((result or {}).get("error")))
+                    done.append(entry)
+            self.stats.flushed += sum(1 for e in done if e.attempts < self.max_attempts)
+            self._ack(done)
+            if len(done) == len(batch):
+                return True
+            self.stats.failed_batches += 1
+            return False
+
+        self.stats.failed_batches += 1
+        error = str(resp.get("error"))
+        log.warning(f"GasWriter: batch of {len(batch)} failed: {error}")
+        if resp.get("retryable"):
+            # сеть/сервер недоступны — ждём, сколько потребуется, ничего не теряя
+            return False
+
+        dead: List[_Entry] = []
+        for entry in batch:
+            entry.attempts += 1
+            if entry.attempts >= self.max_attempts:
+                self._bury(entry, error)
+                dead.append(entry)
+        self._ack(dead)
+        return False
+
+    def _backoff_wait(self) -> float:
+        """Сколько ждать, пока истечёт ближайшая пауза пользователя с неотправленными операциями"""
+        now = time.monotonic()
+        with self._lock:
+            users = {e.user for e in self._pending.values()}
+            retry_at = [self._backoff[u][1] for u in users if u in self._backoff]
+        return max(0.0, min(retry_at) - now) if retry_at else self.flush_interval
+
+    def _run(self) -> None:
+        while True:
+            with self._wakeup:
+                if not self._pending and not self._stop.is_set():
+                    self._wakeup.wait(self.flush_interval)
+
+            batch = self._next_batch()
+            if not batch:
+                if self._stop.is_set():
+                    return
+                if self.depth:
+                    # все ждут паузы после неудачи; новая операция другого пользователя разбудит раньше
+                    delay = self._backoff_wait()
+                    with self._wakeup:
+                        self._wakeup.wait(delay)
+                continue
+
+            user = batch[0].user
+            try:
+                ok = self._flush(batch)
+            except Exception:
+                log.error("GasWriter: flush crashed", exc_info=True)
+                ok = False
+
+            if ok:
+                with self._lock:
+                    self._backoff.pop(user, None)
+                continue
+
+            if self._stop.is_set():
+                # при остановке не ждём восстановления GAS: остальное отправится после рестарта
+                return
+
+            # пауза только для этого пользователя: остальные отправляются дальше
+            failures = self._backoff.get(user, (0, 0.0))[0] + 1
+            delay = min(MAX_RETRY_DELAY, self.flush_interval * (2 ** failures))
+            with self._lock:
+                self._backoff[user] = (failures, time.monotonic() + delay)
+
+
+_writer: Optional[GasWriter] = None
+_writer_lock = threading.Lock()
+
+
+def journal_path(worker: Optional[int] = None) -> Path:
+    """
+    :param worker: номер воркера; у каждого процесса-воркера свой журнал, None — общий
+    """
+    return DATA / ("gas_journal.jsonl" if worker is None else f"gas_journal.w{worker}.jsonl")
+
+
+def _new_writer(path: Path) -> GasWriter:
+    cfg = config.gas.writer
+    return GasWriter(
+        client=get_gas_client(),
+        journal_path=path,
+        batch_size=cfg.batch_size,
+        flush_interval=cfg.flush_interval,
+        max_attempts=cfg.max_attempts,
+        fsync=cfg.fsync,
+    )
+
+
+def get_gas_writer() -> GasWriter:
+    """
+    Общий на процесс GasWriter: DATA/gas_journal.jsonl (у воркера — gas_journal.w<N>.jsonl).
+    При первом обращении досылает то, что осталось в журнале, и запускает фоновый поток.
+    """
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                writer = _new_writer(journal_path(worker_id()))
+                writer.start()
+                _writer = writer
+    return _writer
+
+
+def drain_orphan_journals(workers: Optional[int]) -> None:
+    """
+    Досылает журналы, которые больше никто не ведёт: общий — при переходе на воркеры,
+    gas_journal.w<N>.jsonl — при уменьшении их числа или возврате к одному процессу.
+    Пустой после отправки журнал удаляется; неотправленное остаётся до следующего запуска.
+
+    :param workers: сколько воркеров будет; None — один процесс без воркеров
+    """
+    journals = {}
+    for path in DATA.glob("gas_journal.w*.jsonl"):
+        m = WORKER_JOURNAL_RE.fullmatch(path.name)
+        if m:
+            journals[path] = int(m.group(1))
+    paths = sorted(journals)
+    if workers is None:
+        orphans = paths
+    else:
+        orphans = [p for p in paths if journals[p] >= workers]
+        orphans.append(journal_path())
+
+    for path in orphans:
+        if not path.exists() or not path.stat().st_size:
+            continue
+        writer = _new_writer(path)
+        writer.start()
+        writer.stop()
+        if not writer.depth:
+            path.unlink(missing_ok=True)
+            log.info(f"GasWriter: drained orphan journal {path.name}")